@@ -1,15 +1,12 @@
 import asyncio
-import json
 import logging
 import os
 import time
-import urllib.request
+from collections.abc import Callable
 from typing import Any
 
 from dotenv import load_dotenv
-from openai.types.beta.realtime.session import TurnDetection
 
-from livekit import api as lk_api
 from livekit.agents import (
     Agent,
     AgentServer,
@@ -20,47 +17,40 @@ from livekit.agents import (
     function_tool,
     room_io,
 )
-from livekit.plugins import openai
-from livekit.protocol.sip import CreateSIPParticipantRequest
+from livekit import rtc
 
+# the local modules read their settings from the environment on import
 load_dotenv(".env.local")
 
+from dispatch import acquire_livekit_api, release_livekit_api  # noqa: E402
+import metrics  # noqa: E402
+from engine import DISPATCH_SOURCES, LOCAL_DISPATCH_SOURCES, TriggerEngine  # noqa: E402
+from events import acquire_events_client, release_events_client  # noqa: E402
+from kws import KWS_CHUNK_MS, KWS_ENABLED, SAMPLE_RATE, KeywordSpotter, ProvisionalTracker  # noqa: E402
+from local_stt import LocalSTT, backend_for, load_model  # noqa: E402
+from outbox import acquire_outbox, release_outbox  # noqa: E402
+from phrases import TRIGGER_PHRASES, TRIGGER_PHRASES_SOURCE, PhraseReloader  # noqa: E402
+from pool import REALTIME_POOL_SIZE, PooledRealtimeModel, RealtimeConnectionPool  # noqa: E402
+from streams import TextStreamQueue, TextTail  # noqa: E402
+from tasks import TaskSupervisor  # noqa: E402
+from tracing import AlertTrace  # noqa: E402
+from turns import TURN_ADAPT_INTERVAL, TURN_ADAPTIVE, TurnSettings, TurnTuner  # noqa: E402
+from vad import VAD_GATE, VAD_HANGOVER_MS, GatedAudioInput, SpeechGate  # noqa: E402
+
 logger = logging.getLogger("voice-transcriber")
 logger.setLevel(logging.INFO)
 
-OUTBOUND_PHONE_NUMBER = "+14083103927"
-EVENTS_API_BASE_URL = os.getenv("CLEARANCE_API_BASE_URL", "https://clearance-phi.vercel.app")
-EVENTS_API_PATH = "/api/events"
-
-TRIGGER_PHRASES: dict[str, str] = {
-    "weapon drawn": "weapon_drawn",
-    "weapon out": "weapon_drawn",
-    "gun drawn": "weapon_drawn",
-    "shots fired": "shots_fired",
-    "man down": "man_down",
-    "officer down": "officer_down",
-    "suspect down": "suspect_down",
-    "camera blocked": "camera_blocked",
-    "camera obscured": "camera_blocked",
-}
-
-
-def _extract_trigger_events(text: str) -> set[str]:
-    lowered = text.lower()
-    return {event for phrase, event in TRIGGER_PHRASES.items() if phrase in lowered}
-
-
-def _post_event_sync(url: str, payload: dict[str, Any]) -> tuple[int, str]:
-    data = json.dumps(payload).encode("utf-8")
-    request = urllib.request.Request(
-        url,
-        data=data,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(request, timeout=10) as response:
-        body = response.read().decode("utf-8")
-        return response.status, body
+# only the tail of a text stream is kept for event transcripts and logs
+TEXT_STREAM_MAX_RETAINED_BYTES = int(os.getenv("TEXT_STREAM_MAX_RETAINED_BYTES", "16384"))
+
+# shared by the transcript and text stream paths of every job in the process
+trigger_engine = TriggerEngine(TRIGGER_PHRASES)
+
+if TRIGGER_PHRASES_SOURCE:
+    # loads the configured phrases in the background; until then the
+    # built-in ones apply
+    _phrase_reloader = PhraseReloader(TRIGGER_PHRASES_SOURCE, trigger_engine.swap_phrases)
+    _phrase_reloader.start()
 
 
 class TranscriberAgent(Agent):
@@ -97,75 +87,80 @@ class TranscriberAgent(Agent):
         context: RunContext,
         transcript: str,
     ) -> dict[str, Any]:
-        return await _dispatch_outbound_call(
-            transcript=transcript,
-            room_name=self.room_name,
-        )
+        return await trigger_engine.dispatch_call(transcript, self.room_name)
+
+
+def _create_session(backend: str = "realtime") -> AgentSession:
+    if backend == "local":
+        # transcription only: there is no LLM, and the STT endpoint ends the turn
+        return AgentSession(stt=LocalSTT(), turn_detection="stt")
+    model = PooledRealtimeModel(
+        model="gpt-realtime",
+        voice="alloy",
+        modalities=["text"],
+        turn_detection=TurnSettings().turn_detection(),
+    )
+    if REALTIME_POOL_SIZE > 0:
+        model.pool = RealtimeConnectionPool(model)
+    return AgentSession(llm=model)
 
 
-async def _dispatch_outbound_call(
-    transcript: str,
-    room_name: str | None,
-) -> dict[str, Any]:
-    trunk_id = os.getenv("LIVEKIT_SIP_TRUNK_ID")
-    if not trunk_id:
-        raise RuntimeError("Missing LIVEKIT_SIP_TRUNK_ID for outbound SIP calls.")
-    target_room = room_name or os.getenv("LIVEKIT_SIP_ROOM_NAME", "sip-alerts")
-    participant_identity = f"sip-alert-{int(time.time())}"
-
-    request = CreateSIPParticipantRequest(
-        sip_trunk_id=trunk_id,
-        sip_call_to=OUTBOUND_PHONE_NUMBER,
-        room_name=target_room,
-        participant_identity=participant_identity,
-        participant_name="Shots Fired Alert",
-        krisp_enabled=True,
-        wait_until_answered=False,
-    )
+def _fmt(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:.2f}"
+
 
-    livekit_api = lk_api.LiveKitAPI()
-    try:
-        participant = await livekit_api.sip.create_sip_participant(request)
-    finally:
-        await livekit_api.aclose()
-
-    logger.warning(
-        "Outbound call dispatched to %s (room=%s, participant=%s) for: %s",
-        OUTBOUND_PHONE_NUMBER,
-        target_room,
-        participant_identity,
-        transcript,
+async def _release_shared_clients() -> None:
+    # the outbox drains through the events client, so it has to close first
+    await asyncio.gather(
+        release_outbox(),
+        release_livekit_api(),
     )
-    return {"participant": str(participant)}
+    await release_events_client()
+
 
-server = AgentServer()
+server = AgentServer(prometheus_port=metrics.METRICS_PORT)
 
 
 @server.rtc_session(agent_name="clearance-agent-gemini")
 async def entrypoint(ctx: JobContext):
     ctx.log_context_fields = {"room": ctx.room.name}
 
+    backend = backend_for(ctx.room.name)
+    metrics.TRANSCRIPTION_ROOMS.labels(backend).inc()
+    if backend == "local":
+        # loads once per process, off the event loop
+        await asyncio.to_thread(load_model)
+    session = _create_session(backend)
+    # the local backend has no realtime model to place calls from transcripts
+    dispatch_sources = LOCAL_DISPATCH_SOURCES if backend == "local" else DISPATCH_SOURCES
+    pool = getattr(session.llm, "pool", None)
+    if pool is not None:
+        # dial the realtime API while the rest of the job sets up and joins
+        pool.start()
+        ctx.add_shutdown_callback(pool.aclose)
+
+    tasks = TaskSupervisor()
+    # run on shutdown, before the background tasks drain
+    on_disconnect: list[Callable[[], None]] = []
+
+    async def _drain_and_release() -> None:
+        # livekit-agents does not await the entrypoint on disconnect: it runs
+        # the shutdown callbacks and exits the process. Event posts and
+        # dispatches finish here, within the drain deadline, before the
+        # clients they go through are released.
+        for callback in on_disconnect:
+            callback()
+        await tasks.aclose()
+        await _release_shared_clients()
+
+    acquire_events_client()
+    acquire_outbox(trigger_engine.post)
+    acquire_livekit_api()
+    ctx.add_shutdown_callback(_drain_and_release)
+
     agent = TranscriberAgent()
     agent.room_name = ctx.room.name
 
-    session = AgentSession(
-        llm=openai.realtime.RealtimeModel(
-            model="gpt-realtime",
-            voice="alloy",
-            modalities=["text"],
-            turn_detection=TurnDetection(
-                type="server_vad",
-                threshold=0.5,
-                prefix_padding_ms=300,
-                silence_duration_ms=500,
-                create_response=True,
-                interrupt_response=False,
-            ),
-        ),
-    )
-
-    active_text_tasks: set[asyncio.Task] = set()
-
     async def _handle_text_stream(reader, participant_identity: str) -> None:
         info = reader.info
         stream_id = getattr(info, "id", None)
@@ -178,78 +173,218 @@ async def entrypoint(ctx: JobContext):
             stream_id,
             size,
         )
+        matcher = trigger_engine.stream_matcher()
+        tail = TextTail(TEXT_STREAM_MAX_RETAINED_BYTES)
+        received = AlertTrace(source="video.description", room=ctx.room.name)
+        received.mark("stream_opened")
+        started_at = time.monotonic()
+
+        def _on_events(events: set[str]) -> None:
+            for event in events:
+                fuzzy = event in matcher.fuzzy_fired
+                alert = received.fork(event=event)
+                alert.mark("matched")
+                match = trigger_engine.matched(
+                    event,
+                    room=ctx.room.name,
+                    source="video.description",
+                    text=tail.text(),
+                    latency=time.monotonic() - started_at,
+                    phrases_version=matcher.matcher.version,
+                    trace=alert,
+                    fuzzy=fuzzy,
+                )
+                tasks.spawn(trigger_engine.handle(match, dispatch_sources=dispatch_sources), kind="event")
+
         try:
-            text = await reader.read_all()
+            async for chunk in reader:
+                tail.append(chunk)
+                _on_events(matcher.feed(chunk))
         except Exception as exc:
             logger.warning("Text stream read failed: %s", exc)
             return
-        if text:
+        if tail:
+            text = tail.text()
             logger.info("Text stream content: %s", text)
-            matched_events = _extract_trigger_events(text)
-            if matched_events:
-                for event in matched_events:
-                    if event == "shots_fired":
-                        continue
-                    asyncio.create_task(
-                        _send_event_to_chain(
-                            event=event,
-                            transcript=text,
-                            room_name=ctx.room.name,
-                        )
-                    )
-            if "shots_fired" in matched_events:
-                logger.warning(
-                    "Audio trigger detected in text stream (room=%s): %s",
-                    ctx.room.name,
-                    text,
-                )
-                await _send_event_to_chain(
-                    event="shots_fired",
-                    transcript=text,
-                    room_name=ctx.room.name,
-                )
-                asyncio.create_task(
-                    _dispatch_outbound_call(
-                        transcript=text,
-                        room_name=ctx.room.name,
-                    )
+            _on_events(matcher.finish(text))
+            suppressed = matcher.suppressed - matcher.fired
+            if suppressed:
+                trigger_engine.suppressed(
+                    suppressed, room=ctx.room.name, source="video.description", text=text
                 )
 
-    def _register_text_stream(reader, participant_identity: str) -> None:
-        task = asyncio.create_task(_handle_text_stream(reader, participant_identity))
-        active_text_tasks.add(task)
-        task.add_done_callback(lambda t: active_text_tasks.discard(t))
+    async def _match_dropped_stream(reader, participant_identity: str) -> None:
+        # the queue had no room for this stream; one exact pass over its
+        # text, without fuzzy matching or content logs, keeps its triggers
+        received = AlertTrace(source="video.description", room=ctx.room.name)
+        received.mark("stream_opened")
+        started_at = time.monotonic()
+        text = await reader.read_all()
+        matcher = trigger_engine.matcher
+        events = matcher.events(text)
+        if not events:
+            return
+        tail = TextTail(TEXT_STREAM_MAX_RETAINED_BYTES)
+        tail.append(text)
+        text = tail.text()
+        logger.warning(
+            "Trigger found in dropped text stream from %s: %s: %s",
+            participant_identity,
+            ", ".join(sorted(events)),
+            text,
+        )
+        for event in events:
+            alert = received.fork(event=event)
+            alert.mark("matched")
+            match = trigger_engine.matched(
+                event,
+                room=ctx.room.name,
+                source="video.description",
+                text=text,
+                latency=time.monotonic() - started_at,
+                phrases_version=matcher.version,
+                trace=alert,
+            )
+            tasks.spawn(trigger_engine.handle(match, dispatch_sources=dispatch_sources), kind="event")
+
+    text_streams = TextStreamQueue(
+        _handle_text_stream,
+        spawn=lambda coro: tasks.spawn(coro, kind="text_stream"),
+        on_drop=_match_dropped_stream,
+    )
 
     ctx.room.register_text_stream_handler(
         "video.description",
-        _register_text_stream,
+        text_streams.submit,
     )
 
+    transcript_matcher = trigger_engine.transcript_matcher()
+    provisional = ProvisionalTracker()
+
+    def _resolve_provisional(events: set[str], state: str) -> None:
+        for event in events:
+            tasks.spawn(
+                trigger_engine.provisional(event, room=ctx.room.name, state=state),
+                kind="event",
+            )
+
+    async def _spot_keywords(track: rtc.Track, participant_identity: str) -> None:
+        stream = rtc.AudioStream(
+            track,
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            frame_size_ms=KWS_CHUNK_MS,
+        )
+        spotter: KeywordSpotter | None = None
+        try:
+            async for frame_event in stream:
+                pcm = frame_event.frame.data.tobytes()
+                if spotter is None or spotter.version != trigger_engine.matcher.version:
+                    # reloaded phrases take effect at the next chunk
+                    spotter = await asyncio.to_thread(KeywordSpotter, trigger_engine.matcher)
+                for event in await asyncio.to_thread(spotter.process, pcm):
+                    if provisional.add(event):
+                        tasks.spawn(
+                            trigger_engine.provisional(
+                                event,
+                                room=ctx.room.name,
+                                state="provisional",
+                                text=f"spotted in audio from {participant_identity}",
+                            ),
+                            kind="event",
+                        )
+        finally:
+            await stream.aclose()
+            if spotter is not None:
+                spotter.close()
+
+    if KWS_ENABLED:
+
+        @ctx.room.on("track_subscribed")
+        def _on_track_subscribed(track: rtc.Track, _publication, participant) -> None:
+            if track.kind == rtc.TrackKind.KIND_AUDIO:
+                tasks.spawn(_spot_keywords(track, participant.identity), kind="kws")
+
+    # monotonic stamps of the current user turn, reset when speech starts
+    turn_stamps: dict[str, int] = {}
+    # number of the current user turn, for the transcript matcher
+    user_turn = 0
+    # tunes the realtime model's server VAD, which the local backend lacks
+    turn_tuner = None
+    if TURN_ADAPTIVE and backend == "realtime":
+        turn_tuner = TurnTuner(hangover_ms=VAD_HANGOVER_MS if VAD_GATE else None)
+
+    @session.on("user_state_changed")
+    def _on_user_state_changed(ev) -> None:
+        nonlocal user_turn
+        if ev.new_state == "speaking":
+            user_turn += 1
+            turn_stamps.clear()
+            turn_stamps["turn_started"] = time.monotonic_ns()
+        elif ev.old_state == "speaking":
+            turn_stamps["turn_ended"] = time.monotonic_ns()
+            if turn_tuner is not None and "turn_started" in turn_stamps:
+                turn_tuner.turn((turn_stamps["turn_ended"] - turn_stamps["turn_started"]) / 1e9)
+
     @session.on("user_input_transcribed")
     def _on_transcript(transcript) -> None:
+        transcribed_ns = time.monotonic_ns()
         text = (transcript.transcript or "").strip()
         if not text:
             return
         is_final = bool(getattr(transcript, "is_final", False))
         logger.info("Transcript%s: %s", " (final)" if is_final else "", text)
-        if not is_final:
+        if is_final and "turn_ended" in turn_stamps:
+            to_final = (transcribed_ns - turn_stamps["turn_ended"]) / 1e9
+            metrics.TURN_TO_FINAL.observe(to_final)
+            if turn_tuner is not None:
+                turn_tuner.time_to_final(to_final)
+
+        speaker_id = getattr(transcript, "speaker_id", None)
+        # new turns pick up reloaded phrases
+        transcript_matcher.matcher = trigger_engine.matcher
+        transcript_matcher.fuzzy = trigger_engine.fuzzy
+        matched_events = transcript_matcher.update(speaker_id, text, is_final, user_turn)
+        if is_final and transcript_matcher.suppressed:
+            trigger_engine.suppressed(
+                transcript_matcher.suppressed, room=ctx.room.name, source="transcript", text=text
+            )
+        if provisional:
+            confirmed = provisional.confirm(matched_events)
+            for lead in confirmed.values():
+                metrics.KWS_LEAD.observe(lead)
+            _resolve_provisional(set(confirmed), "confirmed")
+            if is_final:
+                turn_ended = turn_stamps.get("turn_ended", transcribed_ns) / 1e9
+                _resolve_provisional(provisional.settle(matched_events, turn_ended), "retracted")
+        if not matched_events:
             return
-
-        matched_events = _extract_trigger_events(text)
+        created_at = getattr(transcript, "created_at", None) or time.time()
+        latency = max(time.time() - created_at, 0.0)
+        matched_ns = time.monotonic_ns()
+        received = AlertTrace(source="transcript", room=ctx.room.name, final=is_final)
+        for stage, at_ns in turn_stamps.items():
+            received.mark(stage, at_ns)
+        received.mark("transcribed", transcribed_ns)
+        received.mark("matched", matched_ns)
+        if matched_events and not is_final:
+            logger.warning(
+                "Trigger matched in interim transcript (room=%s): %s",
+                ctx.room.name,
+                ", ".join(sorted(matched_events)),
+            )
         for event in matched_events:
-            asyncio.create_task(
-                _send_event_to_chain(
-                    event=event,
-                    transcript=text,
-                    room_name=ctx.room.name,
-                )
+            match = trigger_engine.matched(
+                event,
+                room=ctx.room.name,
+                source="transcript",
+                text=text,
+                latency=latency,
+                phrases_version=transcript_matcher.version,
+                trace=received.fork(event=event),
+                fuzzy=event in transcript_matcher.fuzzy_fired,
             )
-
-    disconnected = asyncio.Event()
-
-    @ctx.room.on("disconnected")
-    def _on_disconnected() -> None:
-        disconnected.set()
+            tasks.spawn(trigger_engine.handle(match, dispatch_sources=dispatch_sources), kind="event")
 
     await session.start(
         room=ctx.room,
@@ -262,35 +397,83 @@ async def entrypoint(ctx: JobContext):
             video_input=False,
         ),
     )
+
+    def _observe_frame(gate: SpeechGate, duration_ms: float) -> None:
+        turn_tuner.observe(gate.speech, duration_ms, gate.noise_floor_db)
+
+    gated_audio = None
+    if (VAD_GATE or turn_tuner is not None) and session.input.audio is not None:
+        # with VAD_GATE only speech and its padding reach the realtime model;
+        # the turn tuner only needs the gate's speech decisions
+        gated_audio = GatedAudioInput(
+            session.input.audio,
+            passthrough=not VAD_GATE,
+            on_frame=_observe_frame if turn_tuner is not None else None,
+        )
+        session.input.audio = gated_audio
+
+    async def _report_cleared_events() -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            _resolve_provisional(provisional.expire(), "retracted")
+            for room_name, event, transcript in trigger_engine.expire():
+                tasks.spawn(
+                    trigger_engine.publish(event, transcript, room_name, state="cleared"),
+                    kind="event",
+                )
+
+    tasks.spawn(_report_cleared_events(), kind="sweeper")
+
+    async def _adapt_turn_detection(tuner: TurnTuner) -> None:
+        while True:
+            await asyncio.sleep(TURN_ADAPT_INTERVAL)
+            previous = tuner.settings
+            settings = tuner.adapt()
+            if settings is None:
+                continue
+            stats = tuner.stats()
+            logger.info(
+                "Turn detection adapted: threshold %.2f -> %.2f, silence %d -> %d ms "
+                "(noise floor %s dBFS, pause p90 %s ms, turns %d, turn p50 %s s, time to final p50 %s s)",
+                previous.threshold,
+                settings.threshold,
+                previous.silence_duration_ms,
+                settings.silence_duration_ms,
+                _fmt(stats["noise_floor_db"]),
+                _fmt(stats["pause_p90_ms"]),
+                stats["turns"],
+                _fmt(stats["turn_p50_s"]),
+                _fmt(stats["time_to_final_p50_s"]),
+            )
+            session.llm.update_options(turn_detection=settings.turn_detection())
+
+    if turn_tuner is not None:
+        tasks.spawn(_adapt_turn_detection(turn_tuner), kind="sweeper")
+
+    def _end_room() -> None:
+        if gated_audio is not None:
+            gate = gated_audio.gate
+            logger.info(
+                "Speech gate forwarded %d of %d audio bytes (%.1f%% saved, %d turns)",
+                gate.bytes_out,
+                gate.bytes_in,
+                gate.saved * 100,
+                len(gate.onset_delays),
+            )
+        # no more text can arrive once the room is gone; event posts and
+        # dispatches drain after this
+        tasks.cancel("sweeper")
+        tasks.cancel("text_stream")
+        tasks.cancel("kws")
+        _resolve_provisional(provisional.clear(), "retracted")
+        for room_name, event, transcript in trigger_engine.clear_room(ctx.room.name):
+            tasks.spawn(
+                trigger_engine.publish(event, transcript, room_name, state="cleared"),
+                kind="event",
+            )
+
+    on_disconnect.append(_end_room)
     await ctx.connect()
-    await disconnected.wait()
-
-
-async def _send_event_to_chain(
-    event: str,
-    transcript: str,
-    room_name: str,
-) -> None:
-    if not EVENTS_API_BASE_URL:
-        logger.warning("Missing CLEARANCE_API_BASE_URL; skipping event publish.")
-        return
-
-    url = f"{EVENTS_API_BASE_URL.rstrip('/')}{EVENTS_API_PATH}"
-    payload = {
-        "event": event,
-        "cameraDetails": room_name,
-        "roomName": room_name,
-        "transcript": transcript,
-        "source": "livekit-voice-agent",
-    }
-    try:
-        status, body = await asyncio.to_thread(_post_event_sync, url, payload)
-        if status >= 300:
-            logger.warning("Event publish failed (%s): %s", status, body)
-        else:
-            logger.info("Event published (%s): %s", status, body)
-    except Exception as exc:
-        logger.warning("Event publish error: %s", exc)
 
 
 if __name__ == "__main__":
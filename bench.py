@@ -0,0 +1,480 @@
+"""Micro-benchmarks for the trigger pipeline.
+
+Run with `uv run python bench.py <name>`; see `--help` for the list.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import tempfile
+import time
+import wave
+from collections import deque
+
+import numpy as np
+from outbox import Outbox
+from phrases import TRIGGER_PHRASES
+from triggers import FuzzyMatcher, StreamingMatcher, TokenMatcher
+
+
+class CharMatcher:
+    """Character-level Aho-Corasick automaton, the baseline for `TokenMatcher`.
+
+    It matches substrings of a lowercase copy of the text, so it also finds
+    "man down" in "woman downstairs" and knows nothing of negation cues.
+    """
+
+    def __init__(self, phrases: dict[str, str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[str, ...]] = [()]
+
+        for phrase, event in phrases.items():
+            key = phrase.strip().lower()
+            if not key:
+                continue
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            if event not in self._out[state]:
+                self._out[state] += (event,)
+
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = [e for e in self._out[self._fail[nxt]] if e not in self._out[nxt]]
+                if inherited:
+                    self._out[nxt] += tuple(inherited)
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def events(self, text: str) -> set[str]:
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        found: set[str] = set()
+        state = 0
+        for ch in text.lower():
+            while True:
+                nxt = goto[state].get(ch)
+                if nxt is not None:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+
+
+def _synthetic_phrases(rng: random.Random, count: int) -> dict[str, str]:
+    phrases: dict[str, str] = {}
+    while len(phrases) < count:
+        words = [_random_word(rng) for _ in range(rng.randint(2, 3))]
+        phrases[" ".join(words)] = f"event_{len(phrases) % 64}"
+    return phrases
+
+
+def _synthetic_texts(
+    rng: random.Random,
+    phrases: list[str],
+    count: int,
+    words_per_text: int,
+) -> list[str]:
+    texts = []
+    for _ in range(count):
+        words = [_random_word(rng) for _ in range(words_per_text)]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(phrases).upper())
+        texts.append(" ".join(words))
+    return texts
+
+
+def bench_triggers(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    print(f"{'matcher':>8} {'phrases':>8} {'states':>8} {'build ms':>9} {'texts/s':>10} {'matches/s':>11}")
+    for count in args.phrases:
+        phrases = _synthetic_phrases(rng, count)
+        texts = _synthetic_texts(rng, list(phrases), args.texts, args.words)
+
+        for name, cls in (("char", CharMatcher), ("token", TokenMatcher)):
+            started = time.perf_counter()
+            matcher = cls(phrases)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            matches = 0
+            started = time.perf_counter()
+            for text in texts:
+                matches += len(matcher.events(text))
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name:>8} {count:>8} {len(matcher):>8} {build_ms:>9.1f} "
+                f"{len(texts) / elapsed:>10.0f} {matches / elapsed:>11.0f}"
+            )
+
+
+# words of ordinary radio and body-cam chatter, none of them trigger words
+_FILLER_WORDS = (
+    "dispatch unit twelve copy that we are on scene with the driver vehicle "
+    "is a blue sedan plate checks out subject is calm and cooperative "
+    "requesting backup at fifth and main traffic stop heading north on "
+    "route nine witness says he saw someone running toward the park "
+    "all clear here stand by for update showing me back in service "
+    "shooting range downtown fire station drawing board doorway window"
+).split()
+
+
+def _asr_noise(rng: random.Random, phrase: str) -> str:
+    """Perturb one word of `phrase` the way realtime ASR tends to."""
+    words = phrase.split()
+    index = rng.randrange(len(words))
+    word = words[index]
+    choice = rng.randrange(4)
+    if choice == 0 and word.endswith("s"):
+        word = word[:-1]
+    elif choice == 1 and word.endswith(("ed", "wn")):
+        word = word[:-2] + ("ing" if word.endswith("wn") else "e")
+    elif choice == 2 and len(word) >= 5:
+        pos = rng.randrange(1, len(word))
+        word = word[:pos] + rng.choice("aeiou") + word[pos + 1 :]
+    else:
+        word += "s"
+    words[index] = word
+    return " ".join(words)
+
+
+def bench_fuzzy(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    exact = TokenMatcher(TRIGGER_PHRASES)
+    fuzzy = FuzzyMatcher(exact)
+    phrases = list(TRIGGER_PHRASES)
+
+    clean, noisy = [], []
+    for _ in range(args.texts):
+        words = rng.choices(_FILLER_WORDS, k=args.words)
+        clean.append(" ".join(words))
+        phrase = rng.choice(phrases)
+        words.insert(rng.randrange(len(words) + 1), _asr_noise(rng, phrase))
+        noisy.append((" ".join(words), TRIGGER_PHRASES[phrase]))
+
+    def recall(matcher: TokenMatcher | FuzzyMatcher) -> float:
+        return sum(event in matcher.events(text) for text, event in noisy) / len(noisy)
+
+    false_positives = sum(bool(fuzzy.events(text)) for text in clean)
+
+    texts = clean + [text for text, _ in noisy]
+    words = sum(len(text.split()) for text in texts)
+    print(f"{'matcher':>8} {'recall':>7} {'words/s':>10} {'rooms/core':>11}")
+    for name, matcher in (("exact", exact), ("fuzzy", fuzzy)):
+        started = time.perf_counter()
+        for text in texts:
+            matcher.events(text)
+        words_per_s = words / (time.perf_counter() - started)
+        # every room speaking without pause at `--words-per-second`
+        rooms = words_per_s / args.words_per_second
+        print(f"{name:>8} {recall(matcher):>7.3f} {words_per_s:>10.0f} {rooms:>11.0f}")
+    print(f"fuzzy false positives on {len(clean)} trigger-free texts: {false_positives}")
+
+
+def bench_precision(args: argparse.Namespace) -> None:
+    with open(args.corpus) as file:
+        corpus = [json.loads(line) for line in file if line.strip()]
+    plain = TokenMatcher(TRIGGER_PHRASES, context_window=0)
+    cued = TokenMatcher(TRIGGER_PHRASES)
+    fuzzy = FuzzyMatcher(cued)
+
+    def with_fuzzy(text: str) -> set[str]:
+        stream = StreamingMatcher(cued, fuzzy)
+        return stream.feed(text) | stream.finish(text)
+
+    matchers = (
+        ("char", CharMatcher(TRIGGER_PHRASES).events),
+        ("token", plain.events),
+        ("token+cues", cued.events),
+        ("+fuzzy", with_fuzzy),
+    )
+    print(f"{'matcher':>10} {'precision':>10} {'recall':>7} {'tp':>4} {'fp':>4} {'fn':>4}")
+    for name, events in matchers:
+        tp = fp = fn = 0
+        for row in corpus:
+            found = events(row["text"])
+            expected = set(row["events"])
+            tp += len(found & expected)
+            fp += len(found - expected)
+            fn += len(expected - found)
+            if args.verbose and found != expected:
+                print(f"  {name}: {row['text']!r} -> {sorted(found)}, expected {sorted(expected)}")
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        print(f"{name:>10} {precision:>10.3f} {recall:>7.3f} {tp:>4} {fp:>4} {fn:>4}")
+
+    rng = random.Random(args.seed)
+    texts = [
+        " ".join(rng.choices(_FILLER_WORDS, k=args.words) + [row["text"]])
+        for row in rng.choices(corpus, k=args.texts)
+    ]
+    for name, matcher in (("window 0", plain), (f"window {cued.context_window}", cued)):
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            for text in texts:
+                matcher.events(text)
+            best = min(best, time.perf_counter() - started)
+        print(f"{name:>10} {len(texts) / best:>10.0f} texts/s")
+
+
+def _bench_audio(args: argparse.Namespace, sample_rate: int) -> bytes:
+    """16-bit mono PCM from `--wav`, or street-like noise with quiet gaps."""
+    if args.wav:
+        with wave.open(args.wav, "rb") as file:
+            if file.getframerate() != sample_rate or file.getnchannels() != 1 or file.getsampwidth() != 2:
+                raise SystemExit(f"--wav must be {sample_rate} Hz mono 16-bit")
+            return file.readframes(file.getnframes())
+    rng = np.random.default_rng(args.seed)
+    samples = rng.normal(0, 800, int(args.seconds * sample_rate))
+    # one second in three near silent
+    envelope = np.where((np.arange(samples.size) // sample_rate) % 3 == 2, 0.05, 1.0)
+    return (samples * envelope).astype(np.int16).tobytes()
+
+
+def bench_kws(args: argparse.Namespace) -> None:
+    from kws import SAMPLE_RATE, KeywordSpotter
+
+    pcm = _bench_audio(args, SAMPLE_RATE)
+    seconds = len(pcm) / 2 / SAMPLE_RATE
+    chunk = SAMPLE_RATE * args.chunk_ms // 1000 * 2
+    matcher = TokenMatcher(TRIGGER_PHRASES)
+
+    started = time.perf_counter()
+    spotter = KeywordSpotter(matcher, threshold=args.threshold)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    hits = 0
+    started = time.perf_counter()
+    for offset in range(0, len(pcm), chunk):
+        hits += len(spotter.process(pcm[offset : offset + chunk]))
+    elapsed = time.perf_counter() - started
+    spotter.close()
+
+    # 10 ms frames, the unit LiveKit delivers audio in
+    frames_per_s = seconds * 100 / elapsed
+    print(f"audio            {seconds:.1f} s in {args.chunk_ms} ms chunks")
+    print(f"build            {build_ms:.1f} ms")
+    print(f"frames/s/core    {frames_per_s:.0f}")
+    print(f"real-time factor {elapsed / seconds:.4f}")
+    print(f"tracks/core      {frames_per_s / 100:.0f}")
+    print(f"spotted          {hits} ({hits / seconds * 60:.1f}/min)")
+
+
+def _speech_scene(args: argparse.Namespace, sample_rate: int) -> tuple[np.ndarray, list[tuple[float, float]]]:
+    """Street noise with voiced bursts; returns int16 samples and (start, end) of each burst."""
+    rng = np.random.default_rng(args.seed)
+    total = int(args.seconds * sample_rate)
+    # traffic rumble: integrated white noise, plus a little hiss
+    rumble = np.cumsum(rng.normal(0, 1, total))
+    rumble -= np.convolve(rumble, np.ones(400) / 400, mode="same")
+    noise = rumble / rumble.std() + 0.3 * rng.normal(0, 1, total)
+    audio = noise / noise.std() * 10 ** (args.noise_db / 20)
+
+    bursts = []
+    t = rng.uniform(1, args.gap)
+    while t + 4 < args.seconds:
+        length = rng.uniform(0.8, 4.0)
+        n = int(length * sample_rate)
+        time_axis = np.arange(n) / sample_rate
+        f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * time_axis))
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        # harmonics shaped by two formants, around 500 and 1500 Hz
+        formants = lambda hz: 1 + 4 * np.exp(-(((hz - 500) / 250) ** 2)) + 2 * np.exp(-(((hz - 1500) / 400) ** 2))
+        voice = sum(np.sin(k * phase) * formants(k * f0.mean()) / k for k in range(1, 25))
+        # syllables at ~4 Hz
+        voice *= 0.55 + 0.45 * np.sin(2 * np.pi * rng.uniform(3, 5) * time_axis)
+        start = int(t * sample_rate)
+        audio[start : start + n] += voice / voice.std() * 10 ** (args.speech_db / 20)
+        bursts.append((t, t + length))
+        t += length + rng.uniform(1, 2 * args.gap)
+    return np.clip(audio * 32768, -32768, 32767).astype(np.int16), bursts
+
+
+def bench_vad(args: argparse.Namespace) -> None:
+    from livekit import rtc
+
+    from vad import SpeechGate
+
+    sample_rate = 24000
+    samples, bursts = _speech_scene(args, sample_rate)
+    frame_samples = sample_rate * args.frame_ms // 1000
+    gate = SpeechGate(padding_ms=args.padding_ms, hangover_ms=args.hangover_ms)
+
+    forwarded_speech = speech_frames = 0
+    started = time.perf_counter()
+    for index in range(0, samples.size - frame_samples + 1, frame_samples):
+        frame = rtc.AudioFrame(samples[index : index + frame_samples].tobytes(), sample_rate, 1, frame_samples)
+        out = gate.push(frame)
+        at = index / sample_rate
+        if any(start <= at < end for start, end in bursts):
+            speech_frames += 1
+            # frames released from the padding are counted when they arrive
+            forwarded_speech += bool(out)
+    elapsed = time.perf_counter() - started
+    frames = samples.size // frame_samples
+
+    extra = len(gate.onset_delays) - len(bursts)
+    print(f"audio           {args.seconds:.0f} s, {len(bursts)} speech bursts, noise {args.noise_db} dBFS, speech {args.speech_db} dBFS")
+    print(f"bytes in        {gate.bytes_in}")
+    print(f"bytes forwarded {gate.bytes_out} ({gate.saved:.1%} saved)")
+    print(f"speech frames   {forwarded_speech}/{speech_frames} released while speaking")
+    print(f"turns opened    {len(gate.onset_delays)} ({extra:+d} vs bursts)")
+    delays = [delay * 1000 for delay in gate.onset_delays]
+    print(f"onset delay     p50 {_percentile(delays, 50):.0f} ms  p99 {_percentile(delays, 99):.0f} ms")
+    print(f"frames/s/core   {frames / elapsed:.0f} ({args.frame_ms} ms frames)")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def _outbox_burst(args: argparse.Namespace, directory: str) -> None:
+    delivered_at: dict[int, float] = {}
+    fail_every = args.fail_every
+
+    async def deliver(payload: dict, _context: object) -> bool:
+        await asyncio.sleep(args.deliver_ms / 1000)
+        if fail_every and payload["seq"] % fail_every == 0 and payload["seq"] not in delivered_at:
+            delivered_at[payload["seq"]] = -1.0
+            return False
+        delivered_at[payload["seq"]] = time.perf_counter()
+        return True
+
+    outbox = Outbox(directory, deliver, base_backoff=0.05, max_in_flight=args.in_flight)
+    outbox.start()
+
+    total = int(args.rate * args.seconds)
+    appended_at: list[float] = []
+    append_cost: list[float] = []
+    payload = {"event": "weapon_drawn", "roomName": "bench-room", "transcript": "x" * args.payload_bytes}
+    started = time.perf_counter()
+    for seq in range(total):
+        # pace the burst at the target rate
+        delay = started + seq / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        t0 = time.perf_counter()
+        outbox.append({**payload, "seq": seq})
+        append_cost.append(time.perf_counter() - t0)
+        appended_at.append(t0)
+
+    while outbox.pending:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await outbox.aclose()
+
+    latencies = [(delivered_at[seq] - appended_at[seq]) * 1000 for seq in range(total)]
+    print(f"events            {total}")
+    print(f"offered rate      {args.rate:.0f}/s")
+    print(f"drained in        {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    print(f"append p50/p99    {_percentile(append_cost, 50) * 1e6:.1f} / {_percentile(append_cost, 99) * 1e6:.1f} us")
+    print(f"delivery p50/p99  {_percentile(latencies, 50):.1f} / {_percentile(latencies, 99):.1f} ms")
+
+    # raw append throughput without pacing or delivery
+    async def never(_payload: dict, _context: object) -> bool:
+        await asyncio.Event().wait()
+        return False
+
+    raw = Outbox(directory, never, max_in_flight=1)
+    raw.start()
+    t0 = time.perf_counter()
+    for seq in range(args.raw):
+        raw.append({**payload, "seq": seq})
+    raw_elapsed = time.perf_counter() - t0
+    await raw.aclose(timeout=0)
+    print(f"raw append        {args.raw / raw_elapsed:.0f}/s")
+
+
+def bench_outbox(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(_outbox_burst(args, directory))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=7)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    triggers = sub.add_parser("triggers", help="character and word level matcher throughput")
+    triggers.add_argument("--phrases", type=int, nargs="+", default=[10, 1_000, 10_000])
+    triggers.add_argument("--texts", type=int, default=2_000)
+    triggers.add_argument("--words", type=int, default=40)
+    triggers.set_defaults(func=bench_triggers)
+
+    fuzzy = sub.add_parser("fuzzy", help="fuzzy matcher recall and throughput on ASR-style noise")
+    fuzzy.add_argument("--texts", type=int, default=2_000)
+    fuzzy.add_argument("--words", type=int, default=20)
+    fuzzy.add_argument("--words-per-second", type=float, default=2.5, help="speech rate of one room")
+    fuzzy.set_defaults(func=bench_fuzzy)
+
+    precision = sub.add_parser("precision", help="precision and recall on the labelled trigger corpus")
+    precision.add_argument("--corpus", default="corpus/triggers.jsonl")
+    precision.add_argument("--texts", type=int, default=20_000, help="texts for the throughput comparison")
+    precision.add_argument("--words", type=int, default=20, help="filler words added to each throughput text")
+    precision.add_argument("--verbose", action="store_true", help="print every mismatch")
+    precision.set_defaults(func=bench_precision)
+
+    kws = sub.add_parser("kws", help="keyword spotter frames per second on one core")
+    kws.add_argument("--wav", help="16 kHz mono 16-bit WAV to spot in instead of synthetic noise")
+    kws.add_argument("--seconds", type=float, default=60, help="length of the synthetic audio")
+    kws.add_argument("--chunk-ms", type=int, default=100)
+    kws.add_argument("--threshold", type=float, default=1e-20)
+    kws.set_defaults(func=bench_kws)
+
+    vad = sub.add_parser("vad", help="speech gate bytes saved and onset delay on a synthetic street scene")
+    vad.add_argument("--seconds", type=float, default=600)
+    vad.add_argument("--gap", type=float, default=10, help="mean seconds of noise between speech bursts")
+    vad.add_argument("--noise-db", type=float, default=-45)
+    vad.add_argument("--speech-db", type=float, default=-25)
+    vad.add_argument("--frame-ms", type=int, default=50)
+    vad.add_argument("--padding-ms", type=float, default=300)
+    vad.add_argument("--hangover-ms", type=float, default=1000)
+    vad.set_defaults(func=bench_vad)
+
+    outbox = sub.add_parser("outbox", help="outbox log under a paced event burst")
+    outbox.add_argument("--rate", type=float, default=1_000)
+    outbox.add_argument("--seconds", type=float, default=5)
+    outbox.add_argument("--payload-bytes", type=int, default=256)
+    outbox.add_argument("--deliver-ms", type=float, default=20)
+    outbox.add_argument("--in-flight", type=int, default=32)
+    outbox.add_argument("--fail-every", type=int, default=0, help="fail the first attempt of every Nth event")
+    outbox.add_argument("--raw", type=int, default=50_000)
+    outbox.set_defaults(func=bench_outbox)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
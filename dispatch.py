@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+import aiohttp
+from livekit import api as lk_api
+from livekit.api.sip_service import SipService
+
+logger = logging.getLogger("voice-transcriber")
+
+LIVEKIT_API_TOKEN_TTL = float(os.getenv("LIVEKIT_API_TOKEN_TTL", "600"))
+SIP_DISPATCH_COOLDOWN = float(os.getenv("LIVEKIT_SIP_DISPATCH_COOLDOWN", "120"))
+# server for outbound SIP calls when it differs from LIVEKIT_URL, e.g. a local stub
+LIVEKIT_SIP_API_URL = os.getenv("LIVEKIT_SIP_API_URL") or None
+# refresh cached tokens this long before they expire
+_TOKEN_REFRESH_MARGIN = 30.0
+
+T = TypeVar("T")
+
+
+class CachedTokenSipService(SipService):
+    """SIP service that reuses its signed token until it nears expiry.
+
+    The livekit-api services sign a fresh JWT for every request in
+    `_auth_header`; the grants only vary by call type, so one token per grant
+    set is enough. `_auth_header` is not public API, so livekit-api is pinned
+    to the minor version this override was written against.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        api_key: str,
+        api_secret: str,
+        *,
+        ttl: float = LIVEKIT_API_TOKEN_TTL,
+    ) -> None:
+        super().__init__(session, url, api_key, api_secret)
+        self._ttl = ttl
+        self._tokens: dict[str, tuple[dict[str, str], float]] = {}
+
+    def _auth_header(
+        self,
+        grants: lk_api.VideoGrants | None,
+        sip: lk_api.SIPGrants | None = None,
+    ) -> dict[str, str]:
+        key = f"{grants!r}|{sip!r}"
+        cached = self._tokens.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        token = lk_api.AccessToken(self.api_key, self.api_secret).with_ttl(
+            datetime.timedelta(seconds=self._ttl)
+        )
+        if grants:
+            token.with_grants(grants)
+        if sip is not None:
+            token.with_sip_grants(sip)
+        headers = {"authorization": f"Bearer {token.to_jwt()}"}
+        self._tokens[key] = (headers, now + max(self._ttl - _TOKEN_REFRESH_MARGIN, 0.0))
+        return headers
+
+
+class DispatchDeduper(Generic[T]):
+    """Single-flight table with a cooldown per key.
+
+    Concurrent `run()` calls for the same key share one in-flight call, and a
+    call that succeeded is reused for `cooldown` seconds instead of being
+    repeated. Failed calls are forgotten so the next caller retries. Expired
+    entries are evicted as new calls come in.
+    """
+
+    def __init__(self, cooldown: float) -> None:
+        self._cooldown = cooldown
+        # key -> (task, monotonic expiry); insertion order follows expiry
+        self._entries: dict[Hashable, tuple[asyncio.Task[T], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Return the call's result and whether it was shared with an earlier call."""
+        self._evict(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is not None:
+            return await asyncio.shield(entry[0]), True
+
+        task = asyncio.ensure_future(call())
+        self._entries[key] = (task, float("inf"))
+        task.add_done_callback(lambda t: self._on_done(key, t))
+        return await asyncio.shield(task), False
+
+    def _on_done(self, key: Hashable, task: asyncio.Task[T]) -> None:
+        del self._entries[key]
+        if not task.cancelled() and task.exception() is None and self._cooldown > 0:
+            self._entries[key] = (task, time.monotonic() + self._cooldown)
+
+    def _evict(self, now: float) -> None:
+        for key, (_, expires_at) in list(self._entries.items()):
+            if expires_at > now:
+                # in-flight entries never expire, completed ones are appended in
+                # expiry order, so stop at the first live completed entry
+                if expires_at != float("inf"):
+                    break
+                continue
+            del self._entries[key]
+
+
+# one SIP client per event loop, created on first use and closed when the
+# last job on that loop shuts down
+_sip_clients: dict[asyncio.AbstractEventLoop, tuple[aiohttp.ClientSession, CachedTokenSipService]] = {}
+_api_users: dict[asyncio.AbstractEventLoop, int] = {}
+
+
+def get_sip_service() -> CachedTokenSipService:
+    loop = asyncio.get_running_loop()
+    client = _sip_clients.get(loop)
+    if client is None:
+        url = LIVEKIT_SIP_API_URL or os.getenv("LIVEKIT_URL")
+        api_key = os.getenv("LIVEKIT_API_KEY")
+        api_secret = os.getenv("LIVEKIT_API_SECRET")
+        if not url:
+            raise ValueError("LIVEKIT_URL must be set")
+        if not api_key or not api_secret:
+            raise ValueError("LIVEKIT_API_KEY and LIVEKIT_API_SECRET must be set")
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+        client = _sip_clients[loop] = (session, CachedTokenSipService(session, url, api_key, api_secret))
+        logger.info("LiveKit SIP client created")
+    return client[1]
+
+
+def acquire_livekit_api() -> None:
+    loop = asyncio.get_running_loop()
+    _api_users[loop] = _api_users.get(loop, 0) + 1
+
+
+async def release_livekit_api() -> None:
+    loop = asyncio.get_running_loop()
+    users = _api_users.get(loop, 0) - 1
+    if users > 0:
+        _api_users[loop] = users
+        return
+    _api_users.pop(loop, None)
+    client = _sip_clients.pop(loop, None)
+    if client is not None:
+        await client[0].close()
@@ -0,0 +1,368 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from livekit import rtc
+from livekit.protocol.sip import CreateSIPParticipantRequest
+
+import metrics
+from dispatch import SIP_DISPATCH_COOLDOWN, DispatchDeduper, get_sip_service
+from events import EventDebouncer, get_events_client
+from outbox import get_outbox
+from phrases import TRIGGER_CONTEXT_WINDOW
+from tracing import AlertTrace, export_trace
+from triggers import FuzzyMatcher, StreamingMatcher, TokenMatcher, TranscriptMatcher
+
+logger = logging.getLogger("voice-transcriber")
+
+OUTBOUND_PHONE_NUMBER = "+14083103927"
+EVENTS_API_BASE_URL = os.getenv("CLEARANCE_API_BASE_URL", "https://clearance-phi.vercel.app")
+EVENTS_API_PATH = "/api/events"
+# events that bypass batching and are posted as soon as they are detected
+CRITICAL_EVENTS = frozenset({"shots_fired", "officer_down"})
+# events that place an outbound call, and the inputs they do it from; calls
+# from transcripts are placed by the realtime model's tool instead, except
+# in rooms on the local backend, which has no model to call it
+DISPATCH_EVENTS = frozenset({"shots_fired"})
+DISPATCH_SOURCES = frozenset({"video.description"})
+LOCAL_DISPATCH_SOURCES = DISPATCH_SOURCES | {"transcript"}
+# tolerant matching of final transcripts and complete text streams
+TRIGGER_FUZZY = os.getenv("TRIGGER_FUZZY", "1") != "0"
+TRIGGER_FUZZY_MAX_COST = int(os.getenv("TRIGGER_FUZZY_MAX_COST", "4096"))
+
+EngineEventTypes = Literal[
+    "trigger_matched",
+    "trigger_provisional",
+    "event_published",
+    "call_dispatched",
+]
+
+
+@dataclass(frozen=True, slots=True)
+class TriggerMatch:
+    event: str
+    room: str
+    # "transcript" or "video.description"
+    source: str
+    text: str
+    # epoch seconds
+    detected_at: float
+    # version of the phrase set that matched
+    phrases_version: str = ""
+    trace: AlertTrace | None = None
+    # found only by the tolerant pass; published but never dispatched
+    fuzzy: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class ProvisionalMatch:
+    event: str
+    room: str
+    # "provisional", "confirmed" or "retracted"
+    state: str
+    # epoch seconds
+    at: float
+
+
+@dataclass(frozen=True, slots=True)
+class EventPublished:
+    event: str
+    room: str
+    state: str
+    # None when the post failed before a response
+    status: int | None
+    transcript: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class CallDispatched:
+    event: str
+    room: str
+    # True when the call joined one already in flight or in cooldown
+    shared: bool
+
+
+class TriggerEngine(rtc.EventEmitter[EngineEventTypes]):
+    """Trigger detection, debouncing, event publishing and SIP dispatch.
+
+    One engine is created per worker process and shared by every job, so the
+    compiled phrase index, the debounce state and the dispatch dedup cache
+    are built once and span rooms. Jobs feed it matches from per-stream or
+    per-speaker matchers and spawn `handle()` for each; listeners get
+    "trigger_matched", "trigger_provisional", "event_published" and
+    "call_dispatched" events.
+
+    `swap_phrases()` replaces the phrase index with a single reference
+    assignment, so it is safe to call from another thread; matchers already
+    handed out keep the index they were created with.
+    """
+
+    def __init__(
+        self,
+        phrases: dict[str, str],
+        *,
+        version: str = "builtin",
+        debouncer: EventDebouncer | None = None,
+        dispatch_cooldown: float = SIP_DISPATCH_COOLDOWN,
+    ) -> None:
+        super().__init__()
+        self.matcher = TokenMatcher(phrases, version=version, context_window=TRIGGER_CONTEXT_WINDOW)
+        self.fuzzy = _compile_fuzzy(self.matcher)
+        self.debouncer = debouncer or EventDebouncer()
+        self.events_url = f"{EVENTS_API_BASE_URL.rstrip('/')}{EVENTS_API_PATH}" if EVENTS_API_BASE_URL else ""
+        # collapses the transcript, text stream and tool dispatches of one
+        # incident into a single outbound call per room and event
+        self._dispatches: DispatchDeduper[dict[str, Any]] = DispatchDeduper(dispatch_cooldown)
+        metrics.preallocate_events(self.matcher.event_names())
+
+    def swap_phrases(self, matcher: TokenMatcher) -> None:
+        metrics.preallocate_events(matcher.event_names())
+        fuzzy = _compile_fuzzy(matcher)
+        previous = self.matcher
+        self.fuzzy, self.matcher = fuzzy, matcher
+        logger.info(
+            "Trigger phrases updated from version %s to %s",
+            previous.version,
+            matcher.version,
+        )
+
+    def transcript_matcher(self) -> TranscriptMatcher:
+        return TranscriptMatcher(self.matcher, self.fuzzy)
+
+    def stream_matcher(self) -> StreamingMatcher:
+        return StreamingMatcher(self.matcher, self.fuzzy)
+
+    def matched(
+        self,
+        event: str,
+        *,
+        room: str,
+        source: str,
+        text: str,
+        latency: float,
+        phrases_version: str,
+        trace: AlertTrace | None = None,
+        fuzzy: bool = False,
+    ) -> TriggerMatch:
+        metrics.record_match(event, source, latency)
+        if trace is not None:
+            trace.attributes["phrases_version"] = phrases_version
+        match = TriggerMatch(event, room, source, text, time.time(), phrases_version, trace, fuzzy)
+        self.emit("trigger_matched", match)
+        return match
+
+    async def provisional(self, event: str, *, room: str, state: str, text: str = "") -> None:
+        """Report a keyword-spotter event as "provisional", "confirmed" or "retracted".
+
+        Provisional and retracted events are posted with that state and skip
+        the debouncer; a confirmed one is posted by its transcript match.
+        """
+        metrics.KWS_EVENTS.labels(state).inc()
+        self.emit("trigger_provisional", ProvisionalMatch(event, room, state, time.time()))
+        if state == "confirmed":
+            return
+        logger.info("Keyword spotter event %s (room=%s): %s", state, room, event)
+        await self.publish(event, text, room, state=state)
+
+    def suppressed(self, events: set[str], *, room: str, source: str, text: str) -> None:
+        """Count and log phrases that only matched under a negation or question."""
+        for event in events:
+            metrics.TRIGGERS_SUPPRESSED.labels(event, source).inc()
+        logger.info(
+            "Trigger suppressed by negation or question (room=%s, source=%s): %s: %s",
+            room,
+            source,
+            ", ".join(sorted(events)),
+            text,
+        )
+
+    async def handle(self, match: TriggerMatch, *, dispatch_sources: frozenset[str] = DISPATCH_SOURCES) -> None:
+        """Publish `match`, and place a call for it when its event and source dispatch.
+
+        A fuzzy match never places a call: a phone call must not depend on
+        edit distance.
+        """
+        dispatch = match.event in DISPATCH_EVENTS and match.source in dispatch_sources
+        if dispatch and match.fuzzy:
+            dispatch = False
+            logger.info(
+                "Not dispatching a call for fuzzy %s match (room=%s): %s",
+                match.event,
+                match.room,
+                match.text,
+            )
+        if dispatch:
+            logger.warning(
+                "Audio trigger detected in %s (room=%s): %s",
+                "text stream" if match.source == "video.description" else match.source,
+                match.room,
+                match.text,
+            )
+        await self.publish(
+            match.event,
+            match.text,
+            match.room,
+            phrases_version=match.phrases_version,
+            trace=match.trace,
+        )
+        if dispatch:
+            await self.dispatch_call(
+                match.text,
+                match.room,
+                event=match.event,
+                detected_at=match.detected_at,
+            )
+
+    def expire(self) -> list[tuple[str, str, str]]:
+        """(room, event, transcript) of events that are no longer detected."""
+        return self.debouncer.expire()
+
+    def clear_room(self, room: str) -> list[tuple[str, str, str]]:
+        return self.debouncer.clear_room(room)
+
+    async def publish(
+        self,
+        event: str,
+        transcript: str,
+        room_name: str,
+        *,
+        state: str | None = None,
+        phrases_version: str | None = None,
+        trace: AlertTrace | None = None,
+    ) -> None:
+        if not self.events_url:
+            logger.warning("Missing CLEARANCE_API_BASE_URL; skipping event publish.")
+            return
+        if state is None:
+            cleared: list[tuple[str, str, str]] = []
+            state = self.debouncer.observe(room_name, event, transcript, cleared)
+            # an entry past its window that the sweeper has not cleared yet
+            for _, _, previous in cleared:
+                await self.publish(event, previous, room_name, state="cleared")
+            if state is None:
+                return
+
+        payload = {
+            "event": event,
+            "state": state,
+            "cameraDetails": room_name,
+            "roomName": room_name,
+            "transcript": transcript,
+            "source": "livekit-voice-agent",
+            "detectedAt": int(time.time() * 1000),
+        }
+        if phrases_version:
+            payload["phrasesVersion"] = phrases_version
+        outbox = get_outbox()
+        if outbox is not None:
+            outbox.append(payload, trace)
+            return
+        if not await self.post(payload, trace) and trace is not None:
+            export_trace(trace, error="publish failed")
+
+    async def post(self, payload: dict[str, Any], trace: AlertTrace | None = None) -> bool:
+        """Post one event; returns False if the post should be retried."""
+        if trace is not None:
+            trace.mark("sent")
+        try:
+            status, body = await get_events_client().publish(
+                self.events_url,
+                payload,
+                immediate=payload["event"] in CRITICAL_EVENTS,
+            )
+        except Exception as exc:
+            metrics.EVENT_POSTS_ERROR.inc()
+            logger.warning("Event publish error: %s", exc)
+            if trace is not None:
+                trace.mark("responded")
+            self._emit_published(payload, None)
+            return False
+        if trace is not None:
+            trace.mark("responded")
+        self._emit_published(payload, status)
+        if status >= 300:
+            metrics.EVENT_POSTS_REJECTED.inc()
+            logger.warning("Event publish failed (%s): %s", status, body)
+            done = status < 500 and status not in (408, 429)
+            if trace is not None and done:
+                export_trace(trace, error=f"HTTP {status}")
+            return done
+        metrics.EVENT_POSTS_OK.inc()
+        if trace is not None:
+            export_trace(trace)
+        metrics.MATCH_TO_POST.observe(max(time.time() - payload["detectedAt"] / 1000, 0.0))
+        logger.info("Event published (%s): %s", status, body)
+        return True
+
+    def _emit_published(self, payload: dict[str, Any], status: int | None) -> None:
+        self.emit(
+            "event_published",
+            EventPublished(
+                payload["event"], payload["roomName"], payload["state"], status, payload["transcript"]
+            ),
+        )
+
+    async def dispatch_call(
+        self,
+        transcript: str,
+        room_name: str | None,
+        *,
+        event: str = "shots_fired",
+        detected_at: float | None = None,
+    ) -> dict[str, Any]:
+        target_room = room_name or os.getenv("LIVEKIT_SIP_ROOM_NAME", "sip-alerts")
+        result, shared = await self._dispatches.run(
+            (target_room, event),
+            lambda: _create_sip_call(transcript, target_room),
+        )
+        if not shared and detected_at is not None:
+            metrics.MATCH_TO_DISPATCH.observe(time.time() - detected_at)
+        if shared:
+            logger.info(
+                "Outbound call for %s in room %s already dispatched; skipping: %s",
+                event,
+                target_room,
+                transcript,
+            )
+        self.emit("call_dispatched", CallDispatched(event, target_room, shared))
+        return result
+
+
+def _compile_fuzzy(matcher: TokenMatcher) -> FuzzyMatcher | None:
+    if not TRIGGER_FUZZY:
+        return None
+    return FuzzyMatcher(
+        matcher,
+        max_cost=TRIGGER_FUZZY_MAX_COST,
+        context_window=matcher.context_window,
+    )
+
+
+async def _create_sip_call(transcript: str, target_room: str) -> dict[str, Any]:
+    trunk_id = os.getenv("LIVEKIT_SIP_TRUNK_ID")
+    if not trunk_id:
+        raise RuntimeError("Missing LIVEKIT_SIP_TRUNK_ID for outbound SIP calls.")
+    participant_identity = f"sip-alert-{int(time.time())}"
+
+    request = CreateSIPParticipantRequest(
+        sip_trunk_id=trunk_id,
+        sip_call_to=OUTBOUND_PHONE_NUMBER,
+        room_name=target_room,
+        participant_identity=participant_identity,
+        participant_name="Shots Fired Alert",
+        krisp_enabled=True,
+        wait_until_answered=False,
+    )
+
+    participant = await get_sip_service().create_sip_participant(request)
+
+    logger.warning(
+        "Outbound call dispatched to %s (room=%s, participant=%s) for: %s",
+        OUTBOUND_PHONE_NUMBER,
+        target_room,
+        participant_identity,
+        transcript,
+    )
+    return {"participant": str(participant)}
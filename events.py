@@ -0,0 +1,259 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from metrics import EVENT_POSTS_IN_FLIGHT
+
+logger = logging.getLogger("voice-transcriber")
+
+EVENTS_HTTP_TIMEOUT = float(os.getenv("CLEARANCE_API_TIMEOUT", "10"))
+EVENTS_HTTP_MAX_CONNECTIONS = int(os.getenv("CLEARANCE_API_MAX_CONNECTIONS", "20"))
+EVENTS_HTTP_MAX_IN_FLIGHT = int(os.getenv("CLEARANCE_API_MAX_IN_FLIGHT", "32"))
+# batching is off unless a window is configured
+EVENTS_BATCH_WINDOW_MS = float(os.getenv("CLEARANCE_API_BATCH_WINDOW_MS", "0"))
+EVENTS_BATCH_MAX_EVENTS = int(os.getenv("CLEARANCE_API_BATCH_MAX_EVENTS", "16"))
+# an event clears once it has not been seen for this long (0 disables debouncing)
+EVENT_DEBOUNCE_SECONDS = float(os.getenv("EVENT_DEBOUNCE_SECONDS", "30"))
+EVENT_ONGOING_INTERVAL = float(os.getenv("EVENT_ONGOING_INTERVAL", "60"))
+EVENT_DEBOUNCE_MAX_ENTRIES = int(os.getenv("EVENT_DEBOUNCE_MAX_ENTRIES", "4096"))
+
+# HTTP/2 needs the optional `h2` package (`httpx[http2]`)
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class EventsClient:
+    """Keep-alive HTTP client for the Clearance events API.
+
+    Connections are pooled and reused between posts, and at most
+    `max_in_flight` requests are outstanding at any time; further posts wait
+    for a free slot instead of opening more sockets.
+
+    When `batch_window_ms` is positive, `publish()` coalesces payloads for the
+    same URL that arrive within the window (or until `batch_max_events` are
+    queued) into a single POST with a JSON array body. Immediate publishes
+    skip the queue. `transport` replaces httpx's network transport.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = EVENTS_HTTP_TIMEOUT,
+        max_connections: int = EVENTS_HTTP_MAX_CONNECTIONS,
+        max_in_flight: int = EVENTS_HTTP_MAX_IN_FLIGHT,
+        batch_window_ms: float = EVENTS_BATCH_WINDOW_MS,
+        batch_max_events: int = EVENTS_BATCH_MAX_EVENTS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
+            transport=transport,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._in_flight = 0
+        self._batch_window = batch_window_ms / 1000
+        self._batch_max_events = max(1, batch_max_events)
+        self._batches: dict[str, list[tuple[Any, asyncio.Future[tuple[int, str]]]]] = {}
+        self._batch_timers: dict[str, asyncio.TimerHandle] = {}
+        self._batch_tasks: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def post_json(self, url: str, payload: Any) -> tuple[int, str]:
+        async with self._slots:
+            self._in_flight += 1
+            EVENT_POSTS_IN_FLIGHT.inc()
+            try:
+                response = await self._client.post(url, json=payload)
+            finally:
+                self._in_flight -= 1
+                EVENT_POSTS_IN_FLIGHT.dec()
+        return response.status_code, response.text
+
+    async def publish(self, url: str, payload: Any, *, immediate: bool = False) -> tuple[int, str]:
+        if immediate or self._batch_window <= 0:
+            return await self.post_json(url, payload)
+
+        future: asyncio.Future[tuple[int, str]] = asyncio.get_running_loop().create_future()
+        batch = self._batches.setdefault(url, [])
+        batch.append((payload, future))
+        if len(batch) >= self._batch_max_events:
+            self._flush_batch(url)
+        elif len(batch) == 1:
+            self._batch_timers[url] = asyncio.get_running_loop().call_later(
+                self._batch_window, self._flush_batch, url
+            )
+        return await future
+
+    def _flush_batch(self, url: str) -> None:
+        timer = self._batch_timers.pop(url, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(url, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._post_batch(url, batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _post_batch(
+        self,
+        url: str,
+        batch: list[tuple[Any, asyncio.Future[tuple[int, str]]]],
+    ) -> None:
+        payloads = [payload for payload, _ in batch]
+        try:
+            result = await self.post_json(url, payloads if len(payloads) > 1 else payloads[0])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        for url in list(self._batches):
+            self._flush_batch(url)
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        await self._client.aclose()
+
+
+@dataclass
+class _EventState:
+    last_seen: float
+    last_emitted: float
+    transcript: str
+
+
+class EventDebouncer:
+    """Bounded LRU of active (room, event) pairs that turns repeats into transitions.
+
+    `observe()` returns "started" the first time an event is seen in a room,
+    "ongoing" at most once per `ongoing_interval` while it keeps being seen,
+    and None for every other repeat. `expire()` returns the pairs that have
+    not been seen for `window` seconds, which callers report as "cleared".
+    Pairs evicted to stay within `max_entries` are returned by the next
+    `expire()` as well, so no event is left open downstream. A pair seen
+    again after `window` but before `expire()` ran is cleared by `observe()`
+    itself: it adds the old entry to `cleared` before starting a new one.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: float = EVENT_DEBOUNCE_SECONDS,
+        ongoing_interval: float = EVENT_ONGOING_INTERVAL,
+        max_entries: int = EVENT_DEBOUNCE_MAX_ENTRIES,
+    ) -> None:
+        self._window = window
+        self._ongoing_interval = ongoing_interval
+        self._max_entries = max_entries
+        # ordered by last_seen, oldest first
+        self._states: OrderedDict[tuple[str, str], _EventState] = OrderedDict()
+        # (room, event, last transcript) evicted since the last expire()
+        self._evicted: list[tuple[str, str, str]] = []
+        self.suppressed = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def observe(
+        self,
+        room: str,
+        event: str,
+        transcript: str,
+        cleared: list[tuple[str, str, str]] | None = None,
+    ) -> str | None:
+        if self._window <= 0:
+            return "started"
+        now = time.monotonic()
+        key = (room, event)
+        state = self._states.get(key)
+        if state is None or now - state.last_seen > self._window:
+            if state is not None and cleared is not None:
+                cleared.append((room, event, state.transcript))
+            self._states[key] = _EventState(now, now, transcript)
+            self._states.move_to_end(key)
+            while len(self._states) > self._max_entries:
+                evicted_key, evicted = self._states.popitem(last=False)
+                self._evicted.append((*evicted_key, evicted.transcript))
+            return "started"
+
+        state.last_seen = now
+        state.transcript = transcript
+        self._states.move_to_end(key)
+        if now - state.last_emitted >= self._ongoing_interval:
+            state.last_emitted = now
+            return "ongoing"
+        self.suppressed += 1
+        return None
+
+    def expire(self) -> list[tuple[str, str, str]]:
+        """Pop and return (room, event, last transcript) for every cleared event."""
+        cutoff = time.monotonic() - self._window
+        cleared, self._evicted = self._evicted, []
+        while self._states:
+            key, state = next(iter(self._states.items()))
+            if state.last_seen > cutoff:
+                break
+            del self._states[key]
+            cleared.append((*key, state.transcript))
+        return cleared
+
+    def clear_room(self, room: str) -> list[tuple[str, str, str]]:
+        cleared = [entry for entry in self._evicted if entry[0] == room]
+        if cleared:
+            self._evicted = [entry for entry in self._evicted if entry[0] != room]
+        for key in [key for key in self._states if key[0] == room]:
+            cleared.append((*key, self._states.pop(key).transcript))
+        return cleared
+
+
+# one client per event loop: jobs running in the same process and loop share
+# the connection pool, and the last job to finish closes it
+_clients: dict[asyncio.AbstractEventLoop, EventsClient] = {}
+_client_users: dict[asyncio.AbstractEventLoop, int] = {}
+
+
+def get_events_client() -> EventsClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = EventsClient()
+        logger.info("Events HTTP client created (http2=%s)", _HTTP2_AVAILABLE)
+    return client
+
+
+def acquire_events_client() -> EventsClient:
+    loop = asyncio.get_running_loop()
+    _client_users[loop] = _client_users.get(loop, 0) + 1
+    return get_events_client()
+
+
+async def release_events_client() -> None:
+    loop = asyncio.get_running_loop()
+    users = _client_users.get(loop, 0) - 1
+    if users > 0:
+        _client_users[loop] = users
+        return
+    _client_users.pop(loop, None)
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,155 @@
+"""On-CPU keyword spotting of trigger phrases in room audio.
+
+The realtime model only reports a transcript once its server VAD has closed
+the turn, which is seconds after the words were said. `KeywordSpotter` runs
+a PocketSphinx keyphrase search over the raw audio of a track and reports
+trigger events a few hundred milliseconds after the phrase ends. Those
+events are provisional: `ProvisionalTracker` holds them until the realtime
+transcript either matches the same event (confirmed) or finishes the turn
+without it, or never matches it in time (retracted).
+
+PocketSphinx is an optional dependency (`uv sync --extra kws`); spotting is
+off unless `KWS_ENABLED=1`.
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from triggers import TokenMatcher
+
+logger = logging.getLogger("voice-transcriber")
+
+KWS_ENABLED = os.getenv("KWS_ENABLED", "0") == "1"
+# PocketSphinx detection threshold; larger values (1e-10) spot less, smaller
+# ones (1e-30) spot more
+KWS_THRESHOLD = float(os.getenv("KWS_THRESHOLD", "1e-20"))
+# audio handed to the decoder per step; bounds the added detection delay
+KWS_CHUNK_MS = int(os.getenv("KWS_CHUNK_MS", "100"))
+# seconds a provisional event waits for the transcript before it is retracted
+KWS_CONFIRM_TIMEOUT = float(os.getenv("KWS_CONFIRM_TIMEOUT", "10"))
+
+SAMPLE_RATE = 16000
+# the decoder is polled for a hit after every 20 ms of audio
+_STEP_BYTES = SAMPLE_RATE // 50 * 2
+
+
+class KeywordSpotter:
+    """PocketSphinx keyphrase search over 16 kHz mono 16-bit PCM of one track.
+
+    Phrases come from a `TokenMatcher`, so hot-reloaded phrase sets apply to
+    spotters created afterwards; `version` records which set was used.
+    Phrases with a word missing from the pronunciation dictionary are
+    skipped and logged.
+    """
+
+    def __init__(self, matcher: TokenMatcher, *, threshold: float = KWS_THRESHOLD) -> None:
+        try:
+            from pocketsphinx import Decoder
+        except ImportError as exc:
+            raise RuntimeError("KWS_ENABLED requires pocketsphinx (uv sync --extra kws).") from exc
+
+        self.version = matcher.version
+        self._matcher = matcher
+        self._decoder = Decoder(samprate=SAMPLE_RATE, lm=None, loglevel="FATAL")
+        keyphrases = []
+        for phrase in matcher.phrases:
+            words = phrase.lower().split()
+            missing = [word for word in words if self._decoder.lookup_word(word) is None]
+            if missing:
+                logger.warning("Keyword spotter skips %r: no pronunciation for %s", phrase, missing)
+            else:
+                keyphrases.append(" ".join(words))
+        if not keyphrases:
+            raise ValueError("no trigger phrase can be spotted")
+
+        with tempfile.NamedTemporaryFile("w", suffix=".kws", delete=False) as file:
+            for keyphrase in keyphrases:
+                file.write(f"{keyphrase} /{threshold:g}/\n")
+        try:
+            self._decoder.add_kws("triggers", file.name)
+        finally:
+            os.unlink(file.name)
+        self._decoder.activate_search("triggers")
+        self._decoder.start_utt()
+
+    def process(self, pcm: bytes) -> set[str]:
+        """Decode `pcm` and return the events of phrases spotted in it.
+
+        CPU bound; callers on an event loop should run it in a thread.
+        """
+        found: set[str] = set()
+        decoder = self._decoder
+        for offset in range(0, len(pcm), _STEP_BYTES):
+            decoder.process_raw(pcm[offset : offset + _STEP_BYTES], False, False)
+            hyp = decoder.hyp()
+            if hyp is not None and hyp.hypstr:
+                found |= self._matcher.events(hyp.hypstr)
+                # start over so the same phrase is not reported again
+                decoder.end_utt()
+                decoder.start_utt()
+        return found
+
+    def close(self) -> None:
+        self._decoder.end_utt()
+
+
+class ProvisionalTracker:
+    """Provisional events of one room waiting for the realtime transcript.
+
+    Events are keyed by name; one that is already pending is not reported
+    again. `confirm()` resolves the pending events a transcript matched,
+    `settle()` retracts the ones a final transcript of a later-ending turn
+    did not match, and `expire()` retracts those older than `timeout`.
+    """
+
+    def __init__(self, timeout: float = KWS_CONFIRM_TIMEOUT) -> None:
+        self._timeout = timeout
+        # event -> monotonic time it was spotted
+        self._pending: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, event: str, spotted_at: float | None = None) -> bool:
+        if event in self._pending:
+            return False
+        self._pending[event] = time.monotonic() if spotted_at is None else spotted_at
+        return True
+
+    def confirm(self, events: set[str]) -> dict[str, float]:
+        """Pending events in `events`, with the seconds they were spotted ahead."""
+        now = time.monotonic()
+        return {
+            event: now - self._pending.pop(event)
+            for event in events
+            if event in self._pending
+        }
+
+    def settle(self, events: set[str], turn_ended: float) -> set[str]:
+        """Retract events spotted before `turn_ended` that the final transcript lacks."""
+        retracted = {
+            event
+            for event, spotted_at in self._pending.items()
+            if spotted_at <= turn_ended and event not in events
+        }
+        for event in retracted:
+            del self._pending[event]
+        return retracted
+
+    def expire(self, now: float | None = None) -> set[str]:
+        now = time.monotonic() if now is None else now
+        expired = {
+            event
+            for event, spotted_at in self._pending.items()
+            if now - spotted_at >= self._timeout
+        }
+        for event in expired:
+            del self._pending[event]
+        return expired
+
+    def clear(self) -> set[str]:
+        pending = set(self._pending)
+        self._pending.clear()
+        return pending
@@ -0,0 +1,277 @@
+"""Load generator: many rooms pushing text streams through one worker loop.
+
+Runs the real `entrypoint` for N stand-in rooms on one event loop, the way
+jobs share a loop in a thread-executor worker. Each room opens
+`video.description` streams at random intervals, and a share of them carry a
+trigger phrase. Events go to `mock_services` running in a child process (or
+to `--mock-url`), and detection latency is measured from the moment the
+trigger chunk is delivered to the moment the worker has the response to
+its accepted post, so it includes the mock's `--latency-ms`.
+Each room count runs as a separate step:
+
+    uv run python loadgen.py --rooms 10 50 100 200 --seconds 10 --latency-ms 40
+
+The report flags the first step whose p99 latency exceeds `--max-p99-ms` or
+that loses events after reading them, which is the room count per worker at
+which latency degrades. Trigger streams dropped by a room's text stream queue
+are reported separately. Debouncing is turned off so every trigger produces a post.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import re
+import socket
+import time
+from typing import Any
+
+import aiohttp
+
+import agent
+import mock_services
+from engine import EventPublished
+from events import EventDebouncer
+from phrases import TRIGGER_PHRASES
+from replay import ReplayReader, percentile, start_room, use_stand_ins
+
+_MARKER = re.compile(r"\[(ld-\d+-\d+)\]")
+_FILLER = (
+    "person", "walking", "near", "the", "vehicle", "hands", "visible", "street",
+    "light", "door", "open", "subject", "talking", "calm", "parked", "car",
+)
+
+
+class LoadReader(ReplayReader):
+    """Text stream whose trigger chunk stamps its delivery time."""
+
+    def __init__(
+        self,
+        stream_id: str,
+        chunks: list[str],
+        interval: float,
+        marker: str | None,
+        delivered: dict[str, float],
+    ) -> None:
+        super().__init__(stream_id, chunks, interval)
+        self._marker = marker
+        self._delivered = delivered
+
+    async def _iterate(self) -> Any:
+        async for chunk in super()._iterate():
+            if self._marker is not None and self._marker in chunk:
+                self._delivered[self._marker] = time.time()
+            yield chunk
+
+
+def _stream_chunks(
+    rng: random.Random,
+    chunks: int,
+    marker: str | None,
+    phrase: str | None,
+) -> list[str]:
+    texts = [" ".join(rng.choices(_FILLER, k=4)) + " " for _ in range(chunks)]
+    if marker is not None:
+        texts[rng.randrange(chunks)] = f"[{marker}] {phrase} "
+    return texts
+
+
+async def _load_room(
+    index: int,
+    step: int,
+    args: argparse.Namespace,
+    deadline: float,
+    delivered: dict[str, float],
+    counters: dict[str, int],
+) -> None:
+    rng = random.Random(args.seed * 100_003 + index if args.seed is not None else None)
+    phrases = list(TRIGGER_PHRASES)
+    room, _, ctx, job = await start_room(f"load-{step}-{index}")
+    handler = room.text_stream_handlers["video.description"]
+
+    streams = 0
+    while True:
+        await asyncio.sleep(rng.expovariate(1 / args.stream_interval))
+        if time.monotonic() >= deadline:
+            break
+        streams += 1
+        marker = phrase = None
+        if rng.random() < args.trigger_ratio:
+            marker = f"ld-{index}-{streams}"
+            phrase = rng.choice(phrases)
+            counters["triggers"] += 1
+        reader = LoadReader(
+            f"{room.name}-{streams}",
+            _stream_chunks(rng, args.chunks, marker, phrase),
+            args.chunk_interval,
+            marker,
+            delivered,
+        )
+        counters["streams"] += 1
+        handler(reader, f"bodycam-{index}")
+
+    await asyncio.sleep(args.settle)
+    room.emit("disconnected")
+    await job
+    await ctx.shutdown()
+
+
+async def _measure_loop_lag(lags: list[float], interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        before = loop.time()
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - before - interval) * 1000)
+
+
+async def _run_step(
+    step: int,
+    rooms: int,
+    args: argparse.Namespace,
+    http: aiohttp.ClientSession,
+) -> dict[str, Any]:
+    await (await http.post(f"{args.mock_url}/_mock/reset")).release()
+    delivered: dict[str, float] = {}
+    # marker -> wall-clock time the first accepted post of it completed
+    responded: dict[str, float] = {}
+    counters = {"streams": 0, "triggers": 0}
+    lags: list[float] = []
+    lag_task = asyncio.create_task(_measure_loop_lag(lags))
+
+    def on_published(published: EventPublished) -> None:
+        match = _MARKER.search(published.transcript)
+        if match and published.status is not None and published.status < 300:
+            responded.setdefault(match.group(1), time.time())
+
+    agent.trigger_engine.on("event_published", on_published)
+
+    started = time.monotonic()
+    deadline = started + args.seconds
+    await asyncio.gather(
+        *(_load_room(index, step, args, deadline, delivered, counters) for index in range(rooms))
+    )
+    elapsed = time.monotonic() - started
+    lag_task.cancel()
+    agent.trigger_engine.off("event_published", on_published)
+
+    async with http.get(f"{args.mock_url}/_mock/received") as response:
+        received = await response.json()
+
+    latencies = [
+        (responded[marker] - at) * 1000
+        for marker, at in delivered.items()
+        if marker in responded
+    ]
+    return {
+        "rooms": rooms,
+        "streams_per_s": round(counters["streams"] / elapsed, 1),
+        "triggers": counters["triggers"],
+        # trigger streams the room's text stream queue dropped or coalesced
+        "dropped": counters["triggers"] - len(delivered),
+        "posted": len(latencies),
+        # triggers that were read but never reached the events API
+        "lost": len(delivered) - len(latencies),
+        "latency_p50_ms": round(percentile(latencies, 50), 2),
+        "latency_p99_ms": round(percentile(latencies, 99), 2),
+        "loop_lag_p99_ms": round(percentile(lags, 99), 2),
+        "outcomes": received["outcomes"],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(http: aiohttp.ClientSession, url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with http.get(f"{url}/_mock/received") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            if time.monotonic() >= deadline:
+                raise
+        await asyncio.sleep(0.1)
+
+
+async def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    use_stand_ins(args.mock_url)
+    agent.trigger_engine.debouncer = EventDebouncer(window=0)
+    results = []
+    async with aiohttp.ClientSession() as http:
+        await _wait_ready(http, args.mock_url)
+        for step, rooms in enumerate(args.rooms):
+            result = await _run_step(step, rooms, args, http)
+            results.append(result)
+            if not args.json:
+                print(_format_row(result), flush=True)
+    return results
+
+
+def _format_row(result: dict[str, Any]) -> str:
+    return (
+        f"{result['rooms']:>6} rooms  {result['streams_per_s']:>8.1f} streams/s  "
+        f"{result['posted']:>5}/{result['triggers']:<5} posted  {result['dropped']:>4} dropped  "
+        f"p50 {result['latency_p50_ms']:>8.2f} ms  p99 {result['latency_p99_ms']:>8.2f} ms  "
+        f"loop lag p99 {result['loop_lag_p99_ms']:>7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rooms", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each step")
+    parser.add_argument("--stream-interval", type=float, default=2.0, help="mean seconds between streams per room")
+    parser.add_argument("--chunks", type=int, default=6, help="chunks per text stream")
+    parser.add_argument("--chunk-interval", type=float, default=0.1)
+    parser.add_argument("--trigger-ratio", type=float, default=0.25, help="share of streams with a trigger phrase")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait for posts after a step")
+    parser.add_argument("--max-p99-ms", type=float, default=250.0, help="p99 latency that counts as degraded")
+    parser.add_argument("--mock-url", help="use an already running mock_services instead of starting one")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true")
+    mock_services.add_behavior_arguments(parser)
+    args = parser.parse_args()
+    # per-stream and per-alert logs would dominate the loop at these rates
+    logging.getLogger("voice-transcriber").setLevel(logging.ERROR)
+
+    mock = None
+    if args.mock_url is None:
+        port = _free_port()
+        args.mock_url = f"http://127.0.0.1:{port}"
+        mock = multiprocessing.get_context("spawn").Process(
+            target=mock_services.serve,
+            args=("127.0.0.1", port, *mock_services.behaviors_from_args(args), args.seed),
+            daemon=True,
+        )
+        mock.start()
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.join()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    degraded = next(
+        (r for r in results if r["latency_p99_ms"] > args.max_p99_ms or r["lost"]),
+        None,
+    )
+    if degraded is None:
+        print(f"no degradation up to {results[-1]['rooms']} rooms (p99 <= {args.max_p99_ms} ms)")
+    else:
+        print(f"latency degrades at {degraded['rooms']} rooms (p99 > {args.max_p99_ms} ms or lost events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Local speech-to-text on the worker's CPU, as an alternative to the realtime model.
+
+Rooms are transcribed by the OpenAI realtime model unless the routing
+policy picks the local backend for them: `TRANSCRIBE_BACKEND` sets the
+default and `TRANSCRIBE_LOCAL_ROOMS` lists room name patterns that always
+go local, for offline sites and cost-sensitive rooms.
+
+The local backend is a streaming sherpa-onnx transducer (e.g. a streaming
+Zipformer) loaded from `LOCAL_STT_MODEL_DIR`, int8-quantized weights
+preferred. `LocalSTT` wraps it as a livekit-agents STT: interim
+transcripts while the words arrive and a final one at each endpoint, which
+also ends the user turn. The model is loaded once per process and shared
+by every stream.
+
+sherpa-onnx is an optional dependency (`uv sync --extra local-stt`).
+"""
+
+import asyncio
+import fnmatch
+import functools
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions, stt, utils
+from livekit.agents.types import NOT_GIVEN, NotGivenOr
+
+import metrics
+
+logger = logging.getLogger("voice-transcriber")
+
+BACKENDS = ("realtime", "local")
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "realtime")
+# comma-separated room name patterns (fnmatch) transcribed locally
+TRANSCRIBE_LOCAL_ROOMS = [
+    pattern.strip()
+    for pattern in os.getenv("TRANSCRIBE_LOCAL_ROOMS", "").split(",")
+    if pattern.strip()
+]
+LOCAL_STT_MODEL_DIR = os.getenv("LOCAL_STT_MODEL_DIR", "")
+LOCAL_STT_THREADS = int(os.getenv("LOCAL_STT_THREADS", "1"))
+# audio handed to the decoder per step
+LOCAL_STT_CHUNK_MS = int(os.getenv("LOCAL_STT_CHUNK_MS", "100"))
+# trailing silence that ends an utterance
+LOCAL_STT_ENDPOINT_MS = int(os.getenv("LOCAL_STT_ENDPOINT_MS", "800"))
+
+SAMPLE_RATE = 16000
+
+
+def backend_for(room_name: str) -> str:
+    """Transcription backend the routing policy picks for `room_name`."""
+    if any(fnmatch.fnmatchcase(room_name, pattern) for pattern in TRANSCRIBE_LOCAL_ROOMS):
+        return "local"
+    if TRANSCRIBE_BACKEND not in BACKENDS:
+        raise ValueError(f"unknown transcription backend: {TRANSCRIBE_BACKEND!r}")
+    return TRANSCRIBE_BACKEND
+
+
+def _model_file(model_dir: Path, part: str) -> str:
+    candidates = sorted(model_dir.glob(f"{part}*.onnx"))
+    if not candidates:
+        raise ValueError(f"no {part}*.onnx in {model_dir}")
+    quantized = [path for path in candidates if path.name.endswith(".int8.onnx")]
+    return str((quantized or candidates)[0])
+
+
+class LocalModel:
+    """A streaming sherpa-onnx transducer; `decoder()` starts one audio stream on it."""
+
+    def __init__(self, model_dir: str = LOCAL_STT_MODEL_DIR, *, threads: int = LOCAL_STT_THREADS) -> None:
+        try:
+            import sherpa_onnx
+        except ImportError as exc:
+            raise RuntimeError("the local STT backend requires sherpa-onnx (uv sync --extra local-stt).") from exc
+        if not model_dir:
+            raise ValueError("the local STT backend requires LOCAL_STT_MODEL_DIR")
+
+        path = Path(model_dir)
+        self.name = path.name
+        started = time.perf_counter()
+        self._recognizer = sherpa_onnx.OnlineRecognizer.from_transducer(
+            tokens=str(path / "tokens.txt"),
+            encoder=_model_file(path, "encoder"),
+            decoder=_model_file(path, "decoder"),
+            joiner=_model_file(path, "joiner"),
+            num_threads=threads,
+            sample_rate=SAMPLE_RATE,
+            enable_endpoint_detection=True,
+            rule2_min_trailing_silence=LOCAL_STT_ENDPOINT_MS / 1000,
+        )
+        logger.info("Loaded local STT model %s in %.2fs", path, time.perf_counter() - started)
+
+    def decoder(self) -> "LocalDecoder":
+        return LocalDecoder(self._recognizer)
+
+
+@functools.cache
+def load_model(model_dir: str = LOCAL_STT_MODEL_DIR) -> LocalModel:
+    return LocalModel(model_dir)
+
+
+class LocalDecoder:
+    """Decodes one audio stream of 16-bit mono PCM.
+
+    `accept()` returns the transcript updates the audio produced, each as
+    `(text, final)`: a changed partial transcript, and the full utterance
+    with `final=True` once an endpoint is detected.
+    """
+
+    def __init__(self, recognizer) -> None:
+        self._recognizer = recognizer
+        self._stream = recognizer.create_stream()
+        self._partial = ""
+        # seconds of audio accepted and spent decoding it
+        self.audio_seconds = 0.0
+        self.decode_seconds = 0.0
+
+    def accept(self, pcm: bytes, sample_rate: int = SAMPLE_RATE) -> list[tuple[str, bool]]:
+        """Decode `pcm`. CPU bound; callers on an event loop should run it in a thread."""
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        started = time.perf_counter()
+        self._stream.accept_waveform(sample_rate, samples)
+        updates = self._decode()
+        elapsed = time.perf_counter() - started
+        duration = samples.size / sample_rate
+        self.audio_seconds += duration
+        self.decode_seconds += elapsed
+        if duration:
+            metrics.LOCAL_STT_RTF.observe(elapsed / duration)
+        return updates
+
+    def flush(self) -> list[tuple[str, bool]]:
+        """End the current utterance, returning its final transcript if any."""
+        # trailing silence lets the model emit the last words
+        self._stream.accept_waveform(SAMPLE_RATE, np.zeros(SAMPLE_RATE // 2, dtype=np.float32))
+        updates = [update for update in self._decode() if update[1]]
+        text = self._text()
+        self._recognizer.reset(self._stream)
+        self._partial = ""
+        if text:
+            updates.append((text, True))
+        return updates
+
+    def _text(self) -> str:
+        return self._recognizer.get_result(self._stream).strip().lower()
+
+    def _decode(self) -> list[tuple[str, bool]]:
+        recognizer = self._recognizer
+        while recognizer.is_ready(self._stream):
+            recognizer.decode_stream(self._stream)
+        text = self._text()
+        updates = []
+        if text and text != self._partial:
+            updates.append((text, False))
+            self._partial = text
+        if recognizer.is_endpoint(self._stream):
+            if text:
+                updates.append((text, True))
+            recognizer.reset(self._stream)
+            self._partial = ""
+        return updates
+
+
+class LocalSTT(stt.STT):
+    """livekit-agents STT backed by a `LocalModel`."""
+
+    def __init__(self, model: LocalModel | None = None) -> None:
+        super().__init__(
+            capabilities=stt.STTCapabilities(streaming=True, interim_results=True)
+        )
+        self._model = model or load_model()
+
+    @property
+    def model(self) -> str:
+        return self._model.name
+
+    @property
+    def provider(self) -> str:
+        return "sherpa-onnx"
+
+    async def _recognize_impl(
+        self,
+        buffer: utils.AudioBuffer,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions,
+    ) -> stt.SpeechEvent:
+        frame = rtc.combine_audio_frames(buffer)
+        samples = np.frombuffer(frame.data, dtype=np.int16)
+        if frame.num_channels > 1:
+            samples = samples.reshape(-1, frame.num_channels).mean(axis=1).astype(np.int16)
+        decoder = self._model.decoder()
+
+        def _transcribe() -> str:
+            # the recognizer resamples to the model's rate itself
+            updates = decoder.accept(samples.tobytes(), frame.sample_rate) + decoder.flush()
+            return " ".join(text for text, final in updates if final)
+
+        text = await asyncio.to_thread(_transcribe)
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language="en", text=text)],
+        )
+
+    def stream(
+        self,
+        *,
+        language: NotGivenOr[str] = NOT_GIVEN,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+    ) -> "LocalSpeechStream":
+        return LocalSpeechStream(stt=self, decoder=self._model.decoder(), conn_options=conn_options)
+
+
+class LocalSpeechStream(stt.RecognizeStream):
+    def __init__(self, *, stt: LocalSTT, decoder: LocalDecoder, conn_options: APIConnectOptions) -> None:
+        super().__init__(stt=stt, conn_options=conn_options, sample_rate=SAMPLE_RATE)
+        self._decoder = decoder
+
+    async def _run(self) -> None:
+        chunk_bytes = SAMPLE_RATE * LOCAL_STT_CHUNK_MS // 1000 * 2
+        pending = bytearray()
+        speaking = False
+
+        def _emit(updates: list[tuple[str, bool]]) -> None:
+            nonlocal speaking
+            for text, final in updates:
+                if not speaking:
+                    speaking = True
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+                event_type = (
+                    stt.SpeechEventType.FINAL_TRANSCRIPT if final else stt.SpeechEventType.INTERIM_TRANSCRIPT
+                )
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(type=event_type, alternatives=[stt.SpeechData(language="en", text=text)])
+                )
+                if final:
+                    speaking = False
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+
+        async for item in self._input_ch:
+            if isinstance(item, self._FlushSentinel):
+                if pending:
+                    _emit(await asyncio.to_thread(self._decoder.accept, bytes(pending)))
+                    pending.clear()
+                _emit(await asyncio.to_thread(self._decoder.flush))
+                continue
+            pending += item.data.tobytes()
+            if len(pending) >= chunk_bytes:
+                _emit(await asyncio.to_thread(self._decoder.accept, bytes(pending)))
+                pending.clear()
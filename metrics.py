@@ -0,0 +1,128 @@
+"""Prometheus metrics for the trigger pipeline."""
+
+import os
+
+import prometheus_client
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None
+
+SOURCES = ("transcript", "video.description")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+TRANSCRIPT_TO_MATCH = prometheus_client.Histogram(
+    "clearance_transcript_to_match_seconds",
+    "Time from a transcript or text stream arriving to a trigger match",
+    ["source"],
+    buckets=_LATENCY_BUCKETS,
+)
+MATCH_TO_POST = prometheus_client.Histogram(
+    "clearance_match_to_post_seconds",
+    "Time from a trigger match to the events API accepting the post",
+    buckets=_LATENCY_BUCKETS,
+)
+MATCH_TO_DISPATCH = prometheus_client.Histogram(
+    "clearance_match_to_dispatch_seconds",
+    "Time from a trigger match to the outbound SIP call being created",
+    buckets=_LATENCY_BUCKETS,
+)
+KWS_LEAD = prometheus_client.Histogram(
+    "clearance_kws_lead_seconds",
+    "Time a confirmed keyword-spotter event was ahead of the transcript match",
+    buckets=_LATENCY_BUCKETS,
+)
+KWS_EVENTS = prometheus_client.Counter(
+    "clearance_kws_events",
+    "Keyword-spotter events by state (provisional, confirmed, retracted)",
+    ["state"],
+)
+TURN_TO_FINAL = prometheus_client.Histogram(
+    "clearance_turn_to_final_seconds",
+    "Time from the end of a user turn to its final transcript",
+    buckets=_LATENCY_BUCKETS,
+)
+VAD_ONSET_DELAY = prometheus_client.Histogram(
+    "clearance_vad_onset_delay_seconds",
+    "Time from the first speech frame of a turn to the speech gate opening",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 1),
+)
+AUDIO_BYTES = prometheus_client.Counter(
+    "clearance_audio_bytes",
+    "Room audio bytes seen by the speech gate by outcome (forwarded, dropped)",
+    ["outcome"],
+)
+REALTIME_DIAL = prometheus_client.Histogram(
+    "clearance_realtime_dial_seconds",
+    "Time to open a pooled websocket connection to the Realtime API",
+    buckets=_LATENCY_BUCKETS,
+)
+REALTIME_CONNECTIONS = prometheus_client.Counter(
+    "clearance_realtime_connections",
+    "Realtime API connections asked of the pool by outcome (warm, cold, evicted)",
+    ["outcome"],
+)
+LOCAL_STT_RTF = prometheus_client.Histogram(
+    "clearance_local_stt_rtf",
+    "Local STT decode time per second of audio (real-time factor), per chunk",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2),
+)
+TRANSCRIPTION_ROOMS = prometheus_client.Counter(
+    "clearance_transcription_rooms",
+    "Rooms by the transcription backend routed to (realtime, local)",
+    ["backend"],
+)
+TRIGGER_EVENTS = prometheus_client.Counter(
+    "clearance_trigger_events",
+    "Trigger phrases matched",
+    ["event", "source"],
+)
+TRIGGERS_SUPPRESSED = prometheus_client.Counter(
+    "clearance_triggers_suppressed",
+    "Trigger phrases matched under a negation or question and not published",
+    ["event", "source"],
+)
+EVENT_POSTS = prometheus_client.Counter(
+    "clearance_event_posts",
+    "Event posts to the events API by outcome",
+    ["outcome"],
+)
+TEXT_STREAMS_DROPPED = prometheus_client.Counter(
+    "clearance_text_streams_dropped",
+    "Text streams dropped because a room's queue was full",
+)
+ACTIVE_TEXT_STREAMS = prometheus_client.Gauge(
+    "clearance_active_text_streams",
+    "Text streams being handled",
+    multiprocess_mode="livesum",
+)
+EVENT_POSTS_IN_FLIGHT = prometheus_client.Gauge(
+    "clearance_event_posts_in_flight",
+    "Event posts waiting on the events API",
+    multiprocess_mode="livesum",
+)
+
+# label children are resolved once so the hot path skips the label lookup
+_TRANSCRIPT_TO_MATCH = {source: TRANSCRIPT_TO_MATCH.labels(source) for source in SOURCES}
+_TRIGGER_EVENTS: dict[tuple[str, str], prometheus_client.Counter] = {}
+EVENT_POSTS_OK = EVENT_POSTS.labels("ok")
+EVENT_POSTS_REJECTED = EVENT_POSTS.labels("rejected")
+EVENT_POSTS_ERROR = EVENT_POSTS.labels("error")
+AUDIO_BYTES_FORWARDED = AUDIO_BYTES.labels("forwarded")
+AUDIO_BYTES_DROPPED = AUDIO_BYTES.labels("dropped")
+REALTIME_CONNECTIONS_WARM = REALTIME_CONNECTIONS.labels("warm")
+REALTIME_CONNECTIONS_COLD = REALTIME_CONNECTIONS.labels("cold")
+REALTIME_CONNECTIONS_EVICTED = REALTIME_CONNECTIONS.labels("evicted")
+
+
+def preallocate_events(events: set[str] | frozenset[str]) -> None:
+    for event in events:
+        for source in SOURCES:
+            _TRIGGER_EVENTS[(event, source)] = TRIGGER_EVENTS.labels(event, source)
+
+
+def record_match(event: str, source: str, latency: float) -> None:
+    counter = _TRIGGER_EVENTS.get((event, source))
+    if counter is None:
+        counter = _TRIGGER_EVENTS[(event, source)] = TRIGGER_EVENTS.labels(event, source)
+    counter.inc()
+    _TRANSCRIPT_TO_MATCH[source].observe(latency)
@@ -0,0 +1,218 @@
+"""Local stand-ins for the Clearance events API and the LiveKit SIP API.
+
+One aiohttp server answers `POST /api/events` like the Clearance API and
+`POST /twirp/livekit.SIP/CreateSIPParticipant` like LiveKit, each with its own
+latency, error rate and rate limit:
+
+    uv run python mock_services.py --port 8089 --latency-ms 40 --error-rate 0.01 --rate-limit 200
+
+and point a worker at it with
+
+    CLEARANCE_API_BASE_URL=http://127.0.0.1:8089
+    LIVEKIT_SIP_API_URL=http://127.0.0.1:8089
+
+`GET /_mock/received` returns the accepted events and calls with wall-clock
+arrival times and the outcome counts, and `POST /_mock/reset` clears them,
+so a load generator in another process can check what arrived.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import web
+from livekit.protocol.sip import CreateSIPParticipantRequest, SIPParticipantInfo
+
+EVENTS_PATH = "/api/events"
+SIP_PATH = "/twirp/livekit.SIP/CreateSIPParticipant"
+
+
+@dataclass
+class ServiceBehavior:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # fraction of requests answered with a server error after the latency
+    error_rate: float = 0.0
+    # requests per second before answering 429; 0 disables rate limiting
+    rate_limit: float = 0.0
+    burst: int = 0
+
+    def delay(self, rng: random.Random) -> float:
+        jitter = rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._capacity = float(max(1, burst or int(rate) or 1))
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class MockServices:
+    """Events API and SIP stub on one local port, recording what they accept."""
+
+    def __init__(
+        self,
+        events: ServiceBehavior | None = None,
+        sip: ServiceBehavior | None = None,
+        *,
+        seed: int | None = None,
+    ) -> None:
+        self.events = events or ServiceBehavior()
+        self.sip = sip or ServiceBehavior()
+        self._rng = random.Random(seed)
+        self._buckets = {
+            name: _TokenBucket(behavior.rate_limit, behavior.burst)
+            for name, behavior in (("events", self.events), ("sip", self.sip))
+            if behavior.rate_limit > 0
+        }
+        # (time.time() at arrival, payload) for every accepted request
+        self.received_events: list[tuple[float, dict[str, Any]]] = []
+        self.received_calls: list[tuple[float, CreateSIPParticipantRequest]] = []
+        self.outcomes: Counter[str] = Counter()
+        self._runner: web.AppRunner | None = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(EVENTS_PATH, self._handle_events)
+        app.router.add_post(SIP_PATH, self._handle_sip)
+        app.router.add_get("/_mock/received", self._handle_received)
+        app.router.add_post("/_mock/reset", self._handle_reset)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}"
+
+    async def aclose(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset(self) -> None:
+        self.received_events.clear()
+        self.received_calls.clear()
+        self.outcomes.clear()
+
+    async def _admit(self, service: str, behavior: ServiceBehavior) -> str:
+        """Return "ok", "rate_limited" or "error" for one request."""
+        bucket = self._buckets.get(service)
+        if bucket is not None and not bucket.take():
+            self.outcomes[f"{service}:rate_limited"] += 1
+            return "rate_limited"
+        delay = behavior.delay(self._rng)
+        if delay:
+            await asyncio.sleep(delay)
+        outcome = "error" if self._rng.random() < behavior.error_rate else "ok"
+        self.outcomes[f"{service}:{outcome}"] += 1
+        return outcome
+
+    async def _handle_events(self, request: web.Request) -> web.Response:
+        arrived_at = time.time()
+        body = await request.json()
+        outcome = await self._admit("events", self.events)
+        if outcome == "rate_limited":
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "1"})
+        if outcome == "error":
+            return web.json_response({"error": "injected failure"}, status=503)
+        for payload in body if isinstance(body, list) else [body]:
+            self.received_events.append((arrived_at, payload))
+        return web.json_response({"ok": True}, status=201)
+
+    async def _handle_sip(self, request: web.Request) -> web.Response:
+        arrived_at = time.time()
+        create = CreateSIPParticipantRequest.FromString(await request.read())
+        outcome = await self._admit("sip", self.sip)
+        if outcome == "rate_limited":
+            return web.json_response({"code": "resource_exhausted", "msg": "rate limited"}, status=429)
+        if outcome == "error":
+            return web.json_response({"code": "unavailable", "msg": "injected failure"}, status=503)
+        self.received_calls.append((arrived_at, create))
+        info = SIPParticipantInfo(
+            participant_id=f"PA_{uuid.uuid4().hex[:12]}",
+            participant_identity=create.participant_identity,
+            room_name=create.room_name,
+            sip_call_id=f"SCL_{uuid.uuid4().hex[:12]}",
+        )
+        return web.Response(body=info.SerializeToString(), content_type="application/protobuf")
+
+    async def _handle_received(self, _request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "events": [[at, payload] for at, payload in self.received_events],
+                "calls": [[at, call.room_name] for at, call in self.received_calls],
+                "outcomes": dict(self.outcomes),
+            }
+        )
+
+    async def _handle_reset(self, _request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+
+def add_behavior_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="events API latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of events posts failing with 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="events posts per second before 429s")
+    parser.add_argument("--sip-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sip-error-rate", type=float, default=0.0)
+    parser.add_argument("--sip-rate-limit", type=float, default=0.0)
+
+
+def behaviors_from_args(args: argparse.Namespace) -> tuple[ServiceBehavior, ServiceBehavior]:
+    events = ServiceBehavior(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+    sip = ServiceBehavior(
+        latency_ms=args.sip_latency_ms,
+        error_rate=args.sip_error_rate,
+        rate_limit=args.sip_rate_limit,
+    )
+    return events, sip
+
+
+def serve(host: str, port: int, events: ServiceBehavior, sip: ServiceBehavior, seed: int | None = None) -> None:
+    services = MockServices(events, sip, seed=seed)
+    web.run_app(services.app(), host=host, port=port, access_log=None, print=None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int)
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    events, sip = behaviors_from_args(args)
+    print(f"mock services on http://{args.host}:{args.port} (events={events}, sip={sip})")
+    serve(args.host, args.port, events, sip, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+import asyncio
+import fcntl
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import random
+import struct
+import time
+import zlib
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from tasks import JOB_DRAIN_TIMEOUT
+
+logger = logging.getLogger("voice-transcriber")
+
+OUTBOX_DIR = os.getenv("CLEARANCE_OUTBOX_DIR", "")
+OUTBOX_SEGMENT_BYTES = int(os.getenv("CLEARANCE_OUTBOX_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+OUTBOX_FSYNC_INTERVAL_MS = float(os.getenv("CLEARANCE_OUTBOX_FSYNC_MS", "50"))
+OUTBOX_MAX_BACKOFF = float(os.getenv("CLEARANCE_OUTBOX_MAX_BACKOFF", "60"))
+
+# record header: payload length, crc32 of the payload, delivery state
+_HEADER = struct.Struct("<IIB")
+_PENDING = 0
+_DELIVERED = 1
+# cap on the backoff exponent, far past the point where max_backoff applies
+_MAX_BACKOFF_EXPONENT = 32
+
+_segment_ids = itertools.count()
+
+
+class _Segment:
+    """Fixed-size memory-mapped log file holding length-prefixed records.
+
+    A zero length marks the end of the log. Records are only ever appended;
+    the single state byte in the header is flipped once a record has been
+    delivered. The file is `flock`ed for as long as a process owns it.
+    """
+
+    def __init__(self, path: Path, file: Any, size: int) -> None:
+        self.path = path
+        self._file = file
+        self._map = mmap.mmap(file.fileno(), size)
+        self.size = size
+        self.write_offset = 0
+        self.pending = 0
+        self.sealed = False
+        self.dirty = False
+
+    @classmethod
+    def create(cls, path: Path, size: int) -> "_Segment":
+        # lock under a temporary name so no other process can adopt it first
+        tmp_path = path.with_suffix(".tmp")
+        file = open(tmp_path, "w+b")
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        file.truncate(size)
+        tmp_path.rename(path)
+        return cls(path, file, size)
+
+    @classmethod
+    def adopt(cls, path: Path) -> "_Segment | None":
+        """Open a segment left behind by another process, unless it is still owned."""
+        try:
+            file = open(path, "r+b")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            return None
+        size = os.fstat(file.fileno()).st_size
+        if size <= _HEADER.size:
+            file.close()
+            path.unlink(missing_ok=True)
+            return None
+        segment = cls(path, file, size)
+        segment.sealed = True
+        return segment
+
+    def append(self, data: bytes) -> int | None:
+        offset = self.write_offset
+        end = offset + _HEADER.size + len(data)
+        # keep room for the zero-length end marker
+        if end + _HEADER.size > self.size:
+            return None
+        self._map[offset + _HEADER.size : end] = data
+        self._map[offset : offset + _HEADER.size] = _HEADER.pack(
+            len(data), zlib.crc32(data), _PENDING
+        )
+        self.write_offset = end
+        self.pending += 1
+        self.dirty = True
+        return offset
+
+    def mark_delivered(self, offset: int) -> None:
+        self._map[offset + _HEADER.size - 1] = _DELIVERED
+        self.pending -= 1
+        self.dirty = True
+
+    def scan(self) -> list[tuple[int, bytes]]:
+        """Return the undelivered records and position the write offset at the end."""
+        records = []
+        offset = 0
+        while offset + _HEADER.size <= self.size:
+            length, crc, state = _HEADER.unpack_from(self._map, offset)
+            end = offset + _HEADER.size + length
+            if length == 0 or end > self.size:
+                break
+            data = self._map[offset + _HEADER.size : end]
+            if zlib.crc32(data) != crc:
+                # torn write from a crash, nothing after it was acknowledged
+                break
+            if state == _PENDING:
+                records.append((offset, data))
+            offset = end
+        self.write_offset = offset
+        self.pending = len(records)
+        return records
+
+    def flush(self) -> None:
+        # on Linux fsync also writes back the file's shared mapping, and unlike
+        # mmap.flush it releases the GIL, so it can run off the event loop
+        os.fsync(self._file.fileno())
+
+    def close(self, *, delete: bool = False) -> None:
+        if delete:
+            self.path.unlink(missing_ok=True)
+        self._map.close()
+        self._file.close()
+
+
+@dataclass
+class _PendingRecord:
+    segment: _Segment
+    offset: int
+    payload: Any
+    context: Any = None
+    # order of arrival; among due records the oldest is attempted first
+    seq: int = 0
+    attempts: int = 0
+    next_attempt: float = field(default_factory=time.monotonic)
+    in_flight: bool = False
+
+
+class Outbox:
+    """Durable at-least-once delivery queue backed by a segment log on disk.
+
+    `append()` writes the payload to the active segment and returns without
+    waiting for the disk; dirty segments are synced to disk off the event
+    loop every `fsync_interval_ms`. A background drainer hands records to
+    `deliver` as soon as they are appended and retries failures with
+    exponential backoff. Records waiting for a retry sit in a heap ordered
+    by their next attempt and due ones in a heap ordered by age, so a wakeup
+    only touches the records it starts, however large the backlog.
+    An optional in-memory `context` travels with each record to `deliver`; it
+    is not persisted, so recovered records are delivered with None.
+    Segments that were not fully delivered by a previous process are adopted
+    and drained on `start()`.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        deliver: Callable[[Any, Any], Awaitable[bool]],
+        *,
+        segment_bytes: int = OUTBOX_SEGMENT_BYTES,
+        fsync_interval_ms: float = OUTBOX_FSYNC_INTERVAL_MS,
+        base_backoff: float = 0.5,
+        max_backoff: float = OUTBOX_MAX_BACKOFF,
+        max_in_flight: int = 32,
+    ) -> None:
+        self._dir = Path(directory)
+        self._deliver = deliver
+        self._segment_bytes = segment_bytes
+        self._fsync_interval = fsync_interval_ms / 1000
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._max_in_flight = max_in_flight
+
+        self._active: _Segment | None = None
+        self._sealed: list[_Segment] = []
+        self._pending: dict[tuple[int, int], _PendingRecord] = {}
+        # (next attempt, seq, record) of records backing off after a failure
+        self._retries: list[tuple[float, int, _PendingRecord]] = []
+        # (seq, record) of records due for an attempt
+        self._due: list[tuple[int, _PendingRecord]] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._wakeup = asyncio.Event()
+        self._empty = asyncio.Event()
+        self._empty.set()
+        self._closed = False
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+        # delivered segments whose close waits for the sync in progress
+        self._retired: list[_Segment] = []
+        self._drain_task: asyncio.Task | None = None
+        self._delivery_tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        recovered = 0
+        for path in sorted(self._dir.glob("*.seg")):
+            segment = _Segment.adopt(path)
+            if segment is None:
+                continue
+            records = segment.scan()
+            if not records:
+                segment.close(delete=True)
+                continue
+            self._sealed.append(segment)
+            for offset, data in records:
+                self._track(segment, offset, json.loads(data))
+            recovered += len(records)
+        if recovered:
+            logger.warning("Outbox recovered %d undelivered events", recovered)
+        self._drain_task = asyncio.create_task(self._drain())
+
+    def append(self, payload: Any, context: Any = None) -> None:
+        data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        segment = self._active
+        offset = segment.append(data) if segment is not None else None
+        if offset is None:
+            segment = self._roll(len(data))
+            offset = segment.append(data)
+            assert offset is not None
+        self._track(segment, offset, payload, context)
+        self._schedule_flush()
+
+    async def aclose(self, timeout: float = JOB_DRAIN_TIMEOUT) -> None:
+        """Deliver what is pending for up to `timeout` seconds, then stop.
+
+        Records still undelivered at the deadline stay on disk for the next
+        process to adopt.
+        """
+        if self._drain_task is not None:
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._empty.wait()
+            except TimeoutError:
+                pass
+        self._closed = True
+        self._wakeup.set()
+        tasks = list(self._delivery_tasks)
+        if self._drain_task is not None:
+            tasks.append(self._drain_task)
+            self._drain_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        if self._pending:
+            logger.warning(
+                "Outbox closed with %d undelivered events left in %s", len(self._pending), self._dir
+            )
+        segments = [*self._sealed, *([self._active] if self._active else [])]
+        await asyncio.to_thread(self._close_segments, segments)
+        self._sealed.clear()
+        self._active = None
+        self._pending.clear()
+        self._retries.clear()
+        self._due.clear()
+
+    @staticmethod
+    def _sync_segments(segments: list[_Segment]) -> None:
+        for segment in segments:
+            segment.flush()
+
+    @staticmethod
+    def _close_segments(segments: list[_Segment]) -> None:
+        for segment in segments:
+            if segment.pending == 0:
+                segment.close(delete=True)
+                continue
+            if segment.dirty:
+                segment.flush()
+            segment.close()
+
+    def _roll(self, record_bytes: int) -> _Segment:
+        if self._active is not None:
+            self._active.sealed = True
+            if self._active.pending == 0:
+                self._retire(self._active)
+            else:
+                self._sealed.append(self._active)
+        size = max(self._segment_bytes, record_bytes + 2 * _HEADER.size)
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(_segment_ids)}.seg"
+        self._active = _Segment.create(self._dir / name, size)
+        return self._active
+
+    def _retire(self, segment: _Segment) -> None:
+        """Close and delete a segment whose records were all delivered."""
+        if self._flush_task is not None:
+            # the sync running in a thread may still hold its file
+            self._retired.append(segment)
+        else:
+            segment.close(delete=True)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None and not self._closed:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self._fsync_interval, self._flush
+            )
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        if self._flush_task is not None:
+            # still syncing, try again next interval
+            self._schedule_flush()
+            return
+        dirty = [
+            segment
+            for segment in [*self._sealed, *([self._active] if self._active else [])]
+            if segment.dirty
+        ]
+        if dirty:
+            self._flush_task = asyncio.create_task(self._sync(dirty))
+
+    async def _sync(self, segments: list[_Segment]) -> None:
+        for segment in segments:
+            segment.dirty = False
+        try:
+            await asyncio.to_thread(self._sync_segments, segments)
+        except OSError as exc:
+            logger.warning("Outbox sync failed: %s", exc)
+            for segment in segments:
+                segment.dirty = True
+            self._schedule_flush()
+        finally:
+            self._flush_task = None
+            retired, self._retired = self._retired, []
+            for segment in retired:
+                segment.close(delete=True)
+
+    def _track(self, segment: _Segment, offset: int, payload: Any, context: Any = None) -> None:
+        record = _PendingRecord(segment, offset, payload, context, next(self._seq))
+        self._pending[(id(segment), offset)] = record
+        self._empty.clear()
+        heapq.heappush(self._due, (record.seq, record))
+        self._wakeup.set()
+
+    async def _drain(self) -> None:
+        while not self._closed:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                _, seq, record = heapq.heappop(self._retries)
+                heapq.heappush(self._due, (seq, record))
+            while self._due and self._in_flight < self._max_in_flight:
+                _, record = heapq.heappop(self._due)
+                record.in_flight = True
+                self._in_flight += 1
+                task = asyncio.create_task(self._attempt(record))
+                self._delivery_tasks.add(task)
+                task.add_done_callback(self._delivery_tasks.discard)
+
+            # due records left over wait for an attempt to finish, which wakes us
+            timeout = None
+            if self._retries and not self._due:
+                timeout = max(0.0, self._retries[0][0] - now)
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def _attempt(self, record: _PendingRecord) -> None:
+        delivered = False
+        try:
+            delivered = await self._deliver(record.payload, record.context)
+        except Exception as exc:
+            logger.warning("Outbox delivery error: %s", exc)
+        finally:
+            record.in_flight = False
+            self._in_flight -= 1
+            if delivered:
+                self._delivered(record)
+            else:
+                record.attempts += 1
+                exponent = min(record.attempts - 1, _MAX_BACKOFF_EXPONENT)
+                backoff = min(self._max_backoff, self._base_backoff * 2**exponent)
+                record.next_attempt = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+                heapq.heappush(self._retries, (record.next_attempt, record.seq, record))
+            self._wakeup.set()
+
+    def _delivered(self, record: _PendingRecord) -> None:
+        segment = record.segment
+        self._pending.pop((id(segment), record.offset), None)
+        segment.mark_delivered(record.offset)
+        if not self._pending:
+            self._empty.set()
+        if segment.sealed and segment.pending == 0:
+            self._sealed.remove(segment)
+            self._retire(segment)
+        else:
+            self._schedule_flush()
+
+
+# one outbox per event loop, shared by the jobs running on it
+_outboxes: dict[asyncio.AbstractEventLoop, Outbox] = {}
+_outbox_users: dict[asyncio.AbstractEventLoop, int] = {}
+
+
+def get_outbox() -> Outbox | None:
+    return _outboxes.get(asyncio.get_running_loop())
+
+
+def acquire_outbox(deliver: Callable[[Any, Any], Awaitable[bool]]) -> Outbox | None:
+    if not OUTBOX_DIR:
+        return None
+    loop = asyncio.get_running_loop()
+    _outbox_users[loop] = _outbox_users.get(loop, 0) + 1
+    outbox = _outboxes.get(loop)
+    if outbox is None:
+        outbox = _outboxes[loop] = Outbox(OUTBOX_DIR, deliver)
+        outbox.start()
+    return outbox
+
+
+async def release_outbox() -> None:
+    loop = asyncio.get_running_loop()
+    users = _outbox_users.get(loop, 0) - 1
+    if users > 0:
+        _outbox_users[loop] = users
+        return
+    _outbox_users.pop(loop, None)
+    outbox = _outboxes.pop(loop, None)
+    if outbox is not None:
+        await outbox.aclose()
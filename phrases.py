@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Callable
+
+import httpx
+
+from triggers import CUE_WINDOW, TokenMatcher
+
+logger = logging.getLogger("voice-transcriber")
+
+# built-in phrase -> event map
+TRIGGER_PHRASES: dict[str, str] = {
+    "weapon drawn": "weapon_drawn",
+    "weapon out": "weapon_drawn",
+    "gun drawn": "weapon_drawn",
+    "shots fired": "shots_fired",
+    "man down": "man_down",
+    "officer down": "officer_down",
+    "suspect down": "suspect_down",
+    "camera blocked": "camera_blocked",
+    "camera obscured": "camera_blocked",
+}
+
+# file path or http(s) URL of the phrase -> event map; unset keeps the
+# built-in phrases
+TRIGGER_PHRASES_SOURCE = os.getenv("TRIGGER_PHRASES_SOURCE", "")
+TRIGGER_PHRASES_RELOAD_INTERVAL = float(os.getenv("TRIGGER_PHRASES_RELOAD_INTERVAL", "30"))
+# words before a phrase checked for negation and question cues; 0 disables
+# suppression
+TRIGGER_CONTEXT_WINDOW = int(os.getenv("TRIGGER_CONTEXT_WINDOW", str(CUE_WINDOW)))
+
+
+def compile_phrases(data: bytes) -> TokenMatcher:
+    """Compile a phrase config document into a versioned matcher.
+
+    The document is either a flat JSON object of phrase -> event, or
+    `{"version": "...", "phrases": {...}}`. Without an explicit version the
+    first 12 hex digits of the document's SHA-256 are used.
+    """
+    document = json.loads(data)
+    if not isinstance(document, dict):
+        raise ValueError("phrase config must be a JSON object")
+    version = document.get("version") if "phrases" in document else None
+    phrases = document["phrases"] if "phrases" in document else document
+    if not isinstance(phrases, dict) or not phrases:
+        raise ValueError("phrase config has no phrases")
+    for phrase, event in phrases.items():
+        if not isinstance(event, str) or not event or not phrase.strip():
+            raise ValueError(f"invalid phrase entry: {phrase!r} -> {event!r}")
+    version = str(version) if version else hashlib.sha256(data).hexdigest()[:12]
+    return TokenMatcher(phrases, version=version, context_window=TRIGGER_CONTEXT_WINDOW)
+
+
+class PhraseReloader(threading.Thread):
+    """Polls a phrase config file or endpoint and hands new matchers to `on_update`.
+
+    Fetching and compiling happen on this thread, so a large phrase set never
+    blocks a job's event loop; `on_update` only has to swap a reference.
+    The first load runs as soon as the thread starts rather than at import,
+    so a slow endpoint cannot hold up a job process's initialization; the
+    built-in phrases are used until it succeeds. Invalid or unreachable
+    configs are logged and the current matcher stays.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        on_update: Callable[[TokenMatcher], None],
+        *,
+        interval: float = TRIGGER_PHRASES_RELOAD_INTERVAL,
+    ) -> None:
+        super().__init__(name="phrase-reloader", daemon=True)
+        self._source = source
+        self._on_update = on_update
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._is_url = source.startswith(("http://", "https://"))
+        # file (mtime_ns, size) or HTTP ETag of the last fetch
+        self._validator: object = None
+        self._digest = ""
+
+    def load(self) -> TokenMatcher | None:
+        """Fetch and compile the config; None if it has not changed."""
+        data = self._fetch()
+        if data is None:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == self._digest:
+            return None
+        matcher = compile_phrases(data)
+        self._digest = digest
+        return matcher
+
+    def _fetch(self) -> bytes | None:
+        if self._is_url:
+            headers = {"If-None-Match": self._validator} if isinstance(self._validator, str) else {}
+            response = httpx.get(self._source, headers=headers, timeout=10.0, follow_redirects=True)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            self._validator = response.headers.get("ETag")
+            return response.content
+
+        stat = os.stat(self._source)
+        validator = (stat.st_mtime_ns, stat.st_size)
+        if validator == self._validator:
+            return None
+        with open(self._source, "rb") as file:
+            data = file.read()
+        self._validator = validator
+        return data
+
+    def run(self) -> None:
+        wait = 0.0
+        while not self._stopped.wait(wait):
+            wait = self._interval
+            try:
+                matcher = self.load()
+            except Exception as exc:
+                if self._digest:
+                    logger.warning("Phrase config reload from %s failed: %s", self._source, exc)
+                else:
+                    logger.error(
+                        "Could not load trigger phrases from %s, using built-in phrases: %s",
+                        self._source,
+                        exc,
+                    )
+                continue
+            if matcher is not None:
+                self._on_update(matcher)
+
+    def stop(self) -> None:
+        self._stopped.set()
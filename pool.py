@@ -0,0 +1,178 @@
+"""Pre-dialed websocket connections to the OpenAI Realtime API.
+
+A realtime session dials its websocket when the agent session starts, and
+dials again, with nothing to send on in between, whenever the connection
+drops or is recycled after `max_session_duration`. `RealtimeConnectionPool`
+keeps `REALTIME_POOL_SIZE` connections dialed ahead of time; sessions of a
+`PooledRealtimeModel` take one instead of dialing, and the pool dials a
+replacement in the background. Idle connections older than
+`REALTIME_POOL_IDLE_TTL` are closed and dialed again, well before the
+server's own session limit.
+
+Connections belong to the event loop and HTTP session of the job that
+dialed them, and a job process runs a single job, so the pool lives as long
+as one job: it is started at the top of the entrypoint, overlapping the
+handshake with the room join, and closed on shutdown. A session that starts
+while that first dial is still in flight waits for it rather than dialing a
+second connection. Pooling is off unless `REALTIME_POOL_SIZE` is above 0.
+
+The pool dials with the plugin's own `RealtimeSession._create_ws_conn`,
+which is protected, and sessions override it; livekit-plugins-openai is
+pinned for that.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+import aiohttp
+from livekit.agents import utils
+from livekit.plugins import openai
+
+import metrics
+
+logger = logging.getLogger("voice-transcriber")
+
+REALTIME_POOL_SIZE = int(os.getenv("REALTIME_POOL_SIZE", "0"))
+# seconds an idle connection is kept before it is closed and dialed again
+REALTIME_POOL_IDLE_TTL = float(os.getenv("REALTIME_POOL_IDLE_TTL", "300"))
+
+# delay before dialing again after a failed dial, doubled per failure
+_RETRY_MIN = 1.0
+_RETRY_MAX = 30.0
+
+
+class RealtimeConnectionPool:
+    """Websocket connections to the Realtime API dialed ahead of their session.
+
+    `take()` returns the newest open connection, waiting for a dial in
+    flight when there is none yet, or None when the session has to dial its
+    own. Every connection is used by
+    one session once; the pool never takes connections back, since one
+    that carried a conversation holds that room's context.
+    """
+
+    def __init__(
+        self,
+        model: openai.realtime.RealtimeModel,
+        *,
+        size: int = REALTIME_POOL_SIZE,
+        idle_ttl: float = REALTIME_POOL_IDLE_TTL,
+    ) -> None:
+        self._model = model
+        self._size = size
+        self._idle_ttl = idle_ttl
+        # (connection, monotonic time it was dialed), oldest first
+        self._idle: list[tuple[aiohttp.ClientWebSocketResponse, float]] = []
+        self._wanted = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # the dial in flight, which adds its connection to the pool when done
+        self._dialing: asyncio.Task | None = None
+        # closes of evicted connections, referenced until they finish
+        self._closing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def start(self) -> None:
+        if self._task is None and self._size > 0:
+            self._wanted.set()
+            self._task = asyncio.create_task(self._fill(), name="realtime_pool")
+
+    async def take(self) -> aiohttp.ClientWebSocketResponse | None:
+        self._evict()
+        if not self._idle and self._dialing is not None:
+            # sessions usually start while the pool's first dial is in flight;
+            # a failed or cancelled dial leaves the pool empty
+            await asyncio.wait([self._dialing])
+            self._evict()
+        self._wanted.set()
+        if not self._idle:
+            metrics.REALTIME_CONNECTIONS_COLD.inc()
+            return None
+        conn, dialed_at = self._idle.pop()
+        metrics.REALTIME_CONNECTIONS_WARM.inc()
+        logger.debug("Using realtime connection dialed %.1fs ago", time.monotonic() - dialed_at)
+        return conn
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        kept = []
+        for conn, dialed_at in self._idle:
+            if conn.closed or now - dialed_at >= self._idle_ttl:
+                metrics.REALTIME_CONNECTIONS_EVICTED.inc()
+                task = asyncio.create_task(conn.close())
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+            else:
+                kept.append((conn, dialed_at))
+        self._idle = kept
+
+    async def _dial(self) -> None:
+        # the plugin's dial only reads the model off the session
+        session = SimpleNamespace(_realtime_model=self._model)
+        started = time.perf_counter()
+        conn = await openai.realtime.RealtimeSession._create_ws_conn(session)
+        metrics.REALTIME_DIAL.observe(time.perf_counter() - started)
+        self._idle.append((conn, time.monotonic()))
+
+    async def _fill(self) -> None:
+        retry = _RETRY_MIN
+        while True:
+            # no await when wanted, so the first dial is in flight before
+            # any session started after `start()` asks for a connection
+            if not self._wanted.is_set():
+                try:
+                    await asyncio.wait_for(self._wanted.wait(), timeout=self._idle_ttl / 4)
+                except asyncio.TimeoutError:
+                    pass
+            self._wanted.clear()
+            self._evict()
+            while len(self._idle) < self._size:
+                self._dialing = asyncio.create_task(self._dial(), name="realtime_pool_dial")
+                try:
+                    await self._dialing
+                except Exception as exc:
+                    self._dialing = None
+                    logger.warning("Could not dial a realtime connection, retrying in %.0fs: %s", retry, exc)
+                    await asyncio.sleep(retry)
+                    retry = min(retry * 2, _RETRY_MAX)
+                    continue
+                self._dialing = None
+                retry = _RETRY_MIN
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            await utils.aio.cancel_and_wait(self._task)
+            self._task = None
+        idle, self._idle = self._idle, []
+        await asyncio.gather(
+            *self._closing, *(conn.close() for conn, _ in idle), return_exceptions=True
+        )
+
+
+class PooledRealtimeSession(openai.realtime.RealtimeSession):
+    """Realtime session that takes its connections from the model's pool."""
+
+    async def _create_ws_conn(self) -> aiohttp.ClientWebSocketResponse:
+        pool = self._realtime_model.pool
+        conn = await pool.take() if pool is not None else None
+        if conn is None:
+            conn = await super()._create_ws_conn()
+        return conn
+
+
+class PooledRealtimeModel(openai.realtime.RealtimeModel):
+    """`RealtimeModel` whose sessions connect through a `RealtimeConnectionPool`.
+
+    Without a pool, or with an empty one, sessions dial as usual.
+    """
+
+    pool: RealtimeConnectionPool | None = None
+
+    def session(self) -> PooledRealtimeSession:
+        sess = PooledRealtimeSession(self)
+        self._sessions.add(sess)
+        return sess
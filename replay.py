@@ -0,0 +1,381 @@
+"""Offline replay of recorded transcripts and text streams through the agent.
+
+Runs the real `entrypoint` once per recorded room against a stand-in room and
+session and the local events API and SIP stub from `mock_services`, then reports throughput,
+detection latency and the events that were emitted. No LiveKit or OpenAI
+credentials are needed:
+
+    uv run python replay.py recordings/sample.jsonl --speed 0
+
+Each JSONL line is one input for a room, ordered by `at` (seconds from the
+start of that room):
+
+    {"room": "r1", "at": 0.0, "kind": "user_state", "state": "speaking"}
+    {"room": "r1", "at": 1.2, "kind": "transcript", "text": "shots fired", "final": true}
+    {"room": "r1", "at": 2.0, "kind": "text_stream", "participant": "cam-1",
+     "chunks": ["suspect has a ", "weapon drawn"], "chunk_interval": 0.05}
+    {"room": "r1", "at": 4.0, "kind": "audio", "path": "turn-16k-mono.wav",
+     "text": "drop the weapon"}
+
+An `audio` record is a turn of 16-bit mono WAV audio (relative paths are
+resolved against the recording) with the transcript the realtime model
+gave for it. `--backend realtime` replays that transcript; `--backend
+local` transcribes the audio with the local STT instead, as a room routed
+to it would, and reports its real-time factor. Replaying the same
+recording with each backend compares their recall and speed.
+
+An optional `"expect": ["shots_fired"]` on a line marks the events that input
+should produce; recall and detection latency are computed from these.
+Latency runs from the first input expecting an event in a room to the first
+post of that event reaching the events API, so for text streams it includes
+the time the chunks take to arrive.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+import wave
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from types import SimpleNamespace
+from typing import Any
+
+os.environ.setdefault("LIVEKIT_SIP_TRUNK_ID", "replay-trunk")
+os.environ.setdefault("LIVEKIT_API_KEY", "replay")
+os.environ.setdefault("LIVEKIT_API_SECRET", "replay-secret-replay-secret-replay")
+
+import agent  # noqa: E402
+import dispatch  # noqa: E402
+import local_stt  # noqa: E402
+from livekit.agents import UserInputTranscribedEvent, UserStateChangedEvent  # noqa: E402
+from mock_services import EVENTS_PATH, MockServices, add_behavior_arguments, behaviors_from_args  # noqa: E402
+
+
+# the session of the room whose entrypoint is running in the current task
+_SESSION: contextvars.ContextVar["ReplaySession"] = contextvars.ContextVar("replay_session")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class _Emitter:
+    def __init__(self) -> None:
+        self._handlers: dict[str, list[Callable[..., Any]]] = defaultdict(list)
+
+    def on(self, event: str, callback: Callable[..., Any] | None = None) -> Any:
+        if callback is not None:
+            self._handlers[event].append(callback)
+            return callback
+
+        def decorator(fnc: Callable[..., Any]) -> Callable[..., Any]:
+            self._handlers[event].append(fnc)
+            return fnc
+
+        return decorator
+
+    def emit(self, event: str, *args: Any) -> None:
+        for handler in list(self._handlers[event]):
+            handler(*args)
+
+
+class ReplayRoom(_Emitter):
+    def __init__(self, name: str) -> None:
+        super().__init__()
+        self.name = name
+        self.text_stream_handlers: dict[str, Callable[[Any, str], None]] = {}
+
+    def register_text_stream_handler(self, topic: str, handler: Callable[[Any, str], None]) -> None:
+        self.text_stream_handlers[topic] = handler
+
+
+class ReplaySession(_Emitter):
+    llm = None
+
+    async def start(self, **_: Any) -> None:
+        pass
+
+
+class ReplayReader:
+    def __init__(self, stream_id: str, chunks: list[str], interval: float) -> None:
+        self.info = SimpleNamespace(
+            topic="video.description",
+            id=stream_id,
+            size=sum(len(chunk.encode("utf-8")) for chunk in chunks),
+        )
+        self._chunks = chunks
+        self._interval = interval
+
+    def __aiter__(self) -> Any:
+        return self._iterate()
+
+    async def _iterate(self) -> Any:
+        for index, chunk in enumerate(self._chunks):
+            if index and self._interval > 0:
+                await asyncio.sleep(self._interval)
+            yield chunk
+
+
+class ReplayJobContext:
+    def __init__(self, room: ReplayRoom) -> None:
+        self.room = room
+        self.log_context_fields: dict[str, Any] = {}
+        self.connected = asyncio.Event()
+        self._shutdown_callbacks: list[Callable[[], Any]] = []
+
+    def add_shutdown_callback(self, callback: Callable[[], Any]) -> None:
+        self._shutdown_callbacks.append(callback)
+
+    async def connect(self) -> None:
+        self.connected.set()
+
+    async def shutdown(self) -> None:
+        # like livekit-agents, which runs them concurrently
+        await asyncio.gather(*(callback() for callback in self._shutdown_callbacks))
+
+
+def use_stand_ins(base_url: str) -> None:
+    """Send the agent's events, SIP calls and sessions to local stand-ins."""
+    agent.trigger_engine.events_url = f"{base_url}{EVENTS_PATH}"
+    dispatch.LIVEKIT_SIP_API_URL = base_url
+    agent._create_session = lambda backend="realtime": _SESSION.get()
+
+
+async def start_room(room_name: str) -> tuple[ReplayRoom, ReplaySession, ReplayJobContext, asyncio.Task]:
+    """Run `entrypoint` for a stand-in room and wait until it has connected."""
+    room = ReplayRoom(room_name)
+    session = ReplaySession()
+    ctx = ReplayJobContext(room)
+    # the entrypoint task copies the current context, so it picks up this session
+    _SESSION.set(session)
+    job = asyncio.create_task(agent.entrypoint(ctx))
+    await ctx.connected.wait()
+    return room, session, ctx, job
+
+
+def load_recording(path: str) -> dict[str, list[dict[str, Any]]]:
+    rooms: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                record = json.loads(line)
+                rooms[record["room"]].append(record)
+    for records in rooms.values():
+        records.sort(key=lambda r: r.get("at", 0.0))
+    return rooms
+
+
+def _emit_transcript(session: ReplaySession, text: str, final: bool, speaker: str | None = None) -> None:
+    session.emit(
+        "user_input_transcribed",
+        UserInputTranscribedEvent(transcript=text, is_final=final, speaker_id=speaker),
+    )
+
+
+def _emit_user_state(session: ReplaySession, state: str) -> None:
+    old_state = "listening" if state == "speaking" else "speaking"
+    session.emit("user_state_changed", UserStateChangedEvent(old_state=old_state, new_state=state))
+
+
+async def _play_audio(
+    session: ReplaySession,
+    record: dict[str, Any],
+    base_dir: str,
+    backend: str,
+    speed: float,
+    audio_stats: Counter[str],
+) -> None:
+    """Transcribe one recorded turn of audio the way `backend` would."""
+    with wave.open(os.path.join(base_dir, record["path"]), "rb") as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"{record['path']}: audio records must be 16-bit mono")
+        sample_rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    audio_stats["audio_s"] += len(pcm) / 2 / sample_rate
+
+    _emit_user_state(session, "speaking")
+    if backend == "realtime":
+        if speed > 0:
+            await asyncio.sleep(len(pcm) / 2 / sample_rate / speed)
+        _emit_transcript(session, record["text"], True, record.get("speaker"))
+    else:
+        decoder = (await asyncio.to_thread(local_stt.load_model)).decoder()
+        chunk = sample_rate * local_stt.LOCAL_STT_CHUNK_MS // 1000 * 2
+        for offset in range(0, len(pcm), chunk):
+            updates = await asyncio.to_thread(decoder.accept, pcm[offset : offset + chunk], sample_rate)
+            for text, final in updates:
+                _emit_transcript(session, text, final, record.get("speaker"))
+            if speed > 0:
+                await asyncio.sleep(local_stt.LOCAL_STT_CHUNK_MS / 1000 / speed)
+        for text, final in await asyncio.to_thread(decoder.flush):
+            _emit_transcript(session, text, final, record.get("speaker"))
+        audio_stats["decode_s"] += decoder.decode_seconds
+    _emit_user_state(session, "listening")
+
+
+async def _play_room(
+    room_name: str,
+    records: list[dict[str, Any]],
+    speed: float,
+    expected_at: dict[tuple[str, str], float],
+    settle: float,
+    base_dir: str = ".",
+    backend: str = "realtime",
+    audio_stats: Counter[str] | None = None,
+) -> None:
+    room, session, ctx, job = await start_room(room_name)
+
+    started = time.time()
+    for index, record in enumerate(records):
+        if speed > 0:
+            delay = started + record.get("at", 0.0) / speed - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        now = time.time()
+        for event in record.get("expect", []):
+            expected_at.setdefault((room_name, event), now)
+
+        kind = record["kind"]
+        if kind == "transcript":
+            _emit_transcript(session, record["text"], record.get("final", True), record.get("speaker"))
+        elif kind == "user_state":
+            _emit_user_state(session, record["state"])
+        elif kind == "audio":
+            await _play_audio(
+                session, record, base_dir, backend, speed, Counter() if audio_stats is None else audio_stats
+            )
+        elif kind == "text_stream":
+            interval = record.get("chunk_interval", 0.0) / speed if speed > 0 else 0.0
+            reader = ReplayReader(f"{room_name}-{index}", record["chunks"], interval)
+            handler = room.text_stream_handlers["video.description"]
+            handler(reader, record.get("participant", "camera"))
+        else:
+            raise ValueError(f"unknown record kind: {kind!r}")
+        # let the handlers run before the next input, as the event loop would
+        await asyncio.sleep(0)
+
+    await asyncio.sleep(settle)
+    room.emit("disconnected")
+    await job
+    # livekit-agents does not wait for the entrypoint; the job drains in its
+    # shutdown callbacks
+    await ctx.shutdown()
+
+
+async def replay(args: argparse.Namespace) -> dict[str, Any]:
+    rooms = load_recording(args.recording)
+    # rooms are routed to the backend under test
+    local_stt.TRANSCRIBE_BACKEND = args.backend
+    if args.backend == "local":
+        # fail before any room starts if the model cannot be loaded
+        local_stt.load_model()
+    services = MockServices(*behaviors_from_args(args), seed=args.seed)
+    use_stand_ins(await services.start())
+
+    expected_at: dict[tuple[str, str], float] = {}
+    audio_stats: Counter[str] = Counter()
+    base_dir = os.path.dirname(os.path.abspath(args.recording))
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _play_room(
+                name,
+                records,
+                args.speed,
+                expected_at,
+                args.settle_ms / 1000,
+                base_dir,
+                args.backend,
+                audio_stats,
+            )
+            for name, records in rooms.items()
+        )
+    )
+    elapsed = time.perf_counter() - started
+    await services.aclose()
+
+    first_post: dict[tuple[str, str], float] = {}
+    emitted: Counter[str] = Counter()
+    for received_at, payload in services.received_events:
+        key = (payload["roomName"], payload["event"])
+        emitted[f"{payload['event']}:{payload.get('state')}"] += 1
+        first_post.setdefault(key, received_at)
+
+    latencies = [
+        (first_post[key] - injected_at) * 1000
+        for key, injected_at in expected_at.items()
+        if key in first_post
+    ]
+    unexpected = sorted({key for key in first_post if key not in expected_at})
+    total_records = sum(len(records) for records in rooms.values())
+    audio_s = audio_stats["audio_s"]
+    return {
+        "backend": args.backend,
+        "rooms": len(rooms),
+        "records": total_records,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_s": round(total_records / elapsed, 1),
+        "events_posted": len(services.received_events),
+        "events": dict(sorted(emitted.items())),
+        "sip_calls": len(services.received_calls),
+        "outcomes": dict(sorted(services.outcomes.items())),
+        "expected": len(expected_at),
+        "detected": len(latencies),
+        "recall": round(len(latencies) / len(expected_at), 4) if expected_at else None,
+        "unexpected": [f"{room}:{event}" for room, event in unexpected],
+        "latency_p50_ms": round(percentile(latencies, 50), 2),
+        "latency_p99_ms": round(percentile(latencies, 99), 2),
+        "audio_s": round(audio_s, 2),
+        # the realtime backend's transcripts are replayed, not decoded here
+        "rtf": round(audio_stats["decode_s"] / audio_s, 4) if audio_s and args.backend == "local" else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("recording", help="JSONL recording to replay")
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = real time, 0 = as fast as possible")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument(
+        "--backend",
+        choices=local_stt.BACKENDS,
+        default="realtime",
+        help="transcription backend for audio records",
+    )
+    add_behavior_arguments(parser)
+    parser.add_argument("--settle-ms", type=float, default=200.0, help="wait after the last input of a room")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if p99 detection latency is higher")
+    parser.add_argument("--min-recall", type=float, help="fail if recall is lower")
+    args = parser.parse_args()
+
+    report = asyncio.run(replay(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:<16} {value}")
+
+    failures = []
+    if args.max_p99_ms is not None and report["latency_p99_ms"] > args.max_p99_ms:
+        failures.append(f"p99 latency {report['latency_p99_ms']}ms > {args.max_p99_ms}ms")
+    if args.min_recall is not None and (report["recall"] or 0.0) < args.min_recall:
+        failures.append(f"recall {report['recall']} < {args.min_recall}")
+    if failures:
+        print("FAILED: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from collections.abc import Awaitable, Callable, Coroutine
+from typing import Any
+
+from metrics import ACTIVE_TEXT_STREAMS, TEXT_STREAMS_DROPPED
+
+logger = logging.getLogger("voice-transcriber")
+
+TEXT_STREAM_CONCURRENCY = int(os.getenv("TEXT_STREAM_CONCURRENCY", "2"))
+TEXT_STREAM_MAX_PENDING = int(os.getenv("TEXT_STREAM_MAX_PENDING", "8"))
+# "coalesce" keeps only the newest pending stream per participant before
+# falling back to dropping the oldest; "drop_oldest" only does the latter
+TEXT_STREAM_QUEUE_POLICY = os.getenv("TEXT_STREAM_QUEUE_POLICY", "coalesce")
+
+QUEUE_POLICIES = ("coalesce", "drop_oldest")
+
+
+class TextStreamQueue:
+    """Bounded work queue for the text streams of one room.
+
+    At most `concurrency` streams are handled at once; the rest wait in a
+    queue of `max_pending` entries. When the queue is full the oldest
+    pending stream is dropped, and with the "coalesce" policy a new stream
+    first replaces a pending one from the same participant. Streams that
+    are dropped or replaced go to `on_drop`, which still has to consume
+    them, e.g. with one cheap matching pass so no trigger is lost.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any, str], Awaitable[None]],
+        *,
+        concurrency: int = TEXT_STREAM_CONCURRENCY,
+        max_pending: int = TEXT_STREAM_MAX_PENDING,
+        policy: str = TEXT_STREAM_QUEUE_POLICY,
+        spawn: Callable[[Coroutine[Any, Any, None]], asyncio.Task] = asyncio.create_task,
+        on_drop: Callable[[Any, str], Awaitable[None]] | None = None,
+    ) -> None:
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"unknown text stream queue policy: {policy!r}")
+        self._handler = handler
+        self._concurrency = max(1, concurrency)
+        self._max_pending = max(0, max_pending)
+        self._policy = policy
+        self._spawn_task = spawn
+        self._on_drop_handler = on_drop
+        self._pending: deque[tuple[Any, str]] = deque()
+        self.tasks: set[asyncio.Task] = set()
+
+        self.queued = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, reader: Any, participant_identity: str) -> None:
+        if len(self.tasks) < self._concurrency:
+            self._spawn(reader, participant_identity)
+            return
+
+        if self._policy == "coalesce":
+            for index, (_, identity) in enumerate(self._pending):
+                if identity == participant_identity:
+                    replaced, _ = self._pending[index]
+                    del self._pending[index]
+                    self.coalesced += 1
+                    self._discard(replaced, identity)
+                    break
+
+        if len(self._pending) >= self._max_pending:
+            if not self._pending:
+                self._on_drop(reader, participant_identity)
+                return
+            dropped, dropped_identity = self._pending.popleft()
+            self._on_drop(dropped, dropped_identity)
+
+        self._pending.append((reader, participant_identity))
+        self.queued += 1
+
+    def _spawn(self, reader: Any, participant_identity: str) -> None:
+        task = self._spawn_task(self._run(reader, participant_identity))
+        self.tasks.add(task)
+        ACTIVE_TEXT_STREAMS.inc()
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        ACTIVE_TEXT_STREAMS.dec()
+
+    async def _run(self, reader: Any, participant_identity: str) -> None:
+        # keep this slot busy until the queue is empty
+        while True:
+            try:
+                await self._handler(reader, participant_identity)
+            except Exception:
+                logger.exception("Text stream handler failed")
+            if not self._pending:
+                return
+            reader, participant_identity = self._pending.popleft()
+
+    def _discard(self, reader: Any, participant_identity: str) -> None:
+        if self._on_drop_handler is not None:
+            self._spawn_task(self._run_dropped(reader, participant_identity))
+
+    async def _run_dropped(self, reader: Any, participant_identity: str) -> None:
+        try:
+            await self._on_drop_handler(reader, participant_identity)
+        except Exception:
+            logger.exception("Dropped text stream handler failed")
+
+    def _on_drop(self, reader: Any, participant_identity: str) -> None:
+        self._discard(reader, participant_identity)
+        self.dropped += 1
+        TEXT_STREAMS_DROPPED.inc()
+        if self.dropped == 1 or self.dropped % 100 == 0:
+            logger.warning(
+                "Text stream queue full, dropped stream from %s (dropped=%d, queued=%d, coalesced=%d)",
+                participant_identity,
+                self.dropped,
+                self.queued,
+                self.coalesced,
+            )
+
+
+class TextTail:
+    """Keeps the last `max_bytes` of UTF-8 text appended in chunks."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self._max_bytes = max_bytes
+        self._chunks: deque[bytes] = deque()
+        self._size = 0
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def append(self, chunk: str) -> None:
+        data = chunk.encode("utf-8")
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self._max_bytes and self._chunks:
+            excess = self._size - self._max_bytes
+            head = self._chunks[0]
+            if len(head) <= excess:
+                self._chunks.popleft()
+                self._size -= len(head)
+            else:
+                self._chunks[0] = head[excess:]
+                self._size -= excess
+
+    def text(self) -> str:
+        # a cut inside a multi-byte character is dropped on decode
+        return b"".join(self._chunks).decode("utf-8", errors="ignore")
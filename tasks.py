@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from collections.abc import Coroutine
+from typing import Any
+
+logger = logging.getLogger("voice-transcriber")
+
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "5"))
+
+
+class TaskSupervisor:
+    """Owns the background tasks started by one job.
+
+    Every task is referenced until it finishes, so it cannot be garbage
+    collected mid-flight, and failures are logged instead of surfacing as
+    "Task exception was never retrieved". `aclose()` waits for outstanding
+    tasks up to a deadline and cancels whatever is left.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: dict[asyncio.Task, str] = {}
+        self._closed = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def counts(self) -> dict[str, int]:
+        """In-flight tasks per kind."""
+        return dict(Counter(self._tasks.values()))
+
+    def spawn(self, coro: Coroutine[Any, Any, Any], *, kind: str = "task") -> asyncio.Task:
+        task = asyncio.create_task(coro, name=kind)
+        if self._closed:
+            # the job is tearing down, don't start new work
+            task.cancel()
+            return task
+        self._tasks[task] = kind
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        kind = self._tasks.pop(task, "task")
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error("Background %s task failed", kind, exc_info=exc)
+
+    def cancel(self, kind: str) -> None:
+        for task, task_kind in list(self._tasks.items()):
+            if task_kind == kind:
+                task.cancel()
+
+    async def aclose(self, timeout: float = JOB_DRAIN_TIMEOUT) -> None:
+        # tasks started while draining (e.g. a dispatch after an event post)
+        # still get the rest of the deadline
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.wait(list(self._tasks), timeout=remaining)
+
+        self._closed = True
+        pending = list(self._tasks)
+        if not pending:
+            return
+        logger.warning(
+            "Cancelling %d background tasks after %.1fs drain: %s",
+            len(pending),
+            timeout,
+            self.counts(),
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,44 @@
+import asyncio
+import logging
+
+import replay
+from mock_services import MockServices, ServiceBehavior
+
+
+def test_shutdown_drains_posts_and_dispatches_before_releasing_clients(caplog):
+    caplog.set_level(logging.INFO, logger="voice-transcriber")
+
+    async def run():
+        services = MockServices(ServiceBehavior(latency_ms=200), ServiceBehavior(latency_ms=200))
+        replay.use_stand_ins(await services.start())
+        try:
+            room, session, ctx, job = await replay.start_room("drain-test")
+            session.emit(
+                "user_input_transcribed",
+                replay.UserInputTranscribedEvent(transcript="officer down", is_final=True),
+            )
+            handler = room.text_stream_handlers["video.description"]
+            handler(replay.ReplayReader("s1", ["muzzle flash, shots fired"], 0.0), "camera")
+            await asyncio.sleep(0.05)
+            # the room goes away while the posts and the call are in flight
+            room.emit("disconnected")
+            await ctx.shutdown()
+            # livekit-agents exits the job process once the shutdown callbacks return
+            received = list(services.received_events), list(services.received_calls)
+            job.cancel()
+        finally:
+            await services.aclose()
+        return received
+
+    events, calls = asyncio.run(run())
+    states = sorted(f"{payload['event']}:{payload['state']}" for _, payload in events)
+    assert states == [
+        "officer_down:cleared",
+        "officer_down:started",
+        "shots_fired:cleared",
+        "shots_fired:started",
+    ]
+    assert len(calls) == 1
+    # nothing reopened the events client after it was released
+    created = [record for record in caplog.records if record.getMessage().startswith("Events HTTP client created")]
+    assert len(created) == 1
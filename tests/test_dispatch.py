@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from livekit import api as lk_api
+
+from dispatch import CachedTokenSipService, DispatchDeduper
+from engine import LOCAL_DISPATCH_SOURCES, TriggerEngine, TriggerMatch
+
+
+def _service(ttl: float = 600) -> CachedTokenSipService:
+    # the service only needs its HTTP session to send requests
+    return CachedTokenSipService(None, "http://sip.test", "key", "secret-" * 6, ttl=ttl)
+
+
+def test_token_is_reused_per_grant_set():
+    service = _service()
+    call = lk_api.SIPGrants(call=True)
+    first = service._auth_header(None, call)
+    assert service._auth_header(None, call) is first
+    assert service._auth_header(None, lk_api.SIPGrants(admin=True)) != first
+
+
+def test_token_is_signed_again_near_expiry():
+    # a ttl inside the refresh margin is never reused
+    service = _service(ttl=10)
+    call = lk_api.SIPGrants(call=True)
+    assert service._auth_header(None, call) is not service._auth_header(None, call)
+
+
+def test_token_carries_sip_grants():
+    header = _service()._auth_header(None, lk_api.SIPGrants(call=True))
+    claims = lk_api.TokenVerifier("key", "secret-" * 6).verify(header["authorization"].removeprefix("Bearer "))
+    assert claims.sip.call
+
+
+def test_concurrent_calls_share_one_in_flight_call():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "participant"
+
+    async def run():
+        deduper = DispatchDeduper(cooldown=60)
+        return await asyncio.gather(*(deduper.run(("room", "shots_fired"), call) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert results == [("participant", False), ("participant", True), ("participant", True)]
+
+
+def test_keys_do_not_share_calls():
+    async def call():
+        return "participant"
+
+    async def run():
+        deduper = DispatchDeduper(cooldown=60)
+        return [await deduper.run(key, call) for key in (("a", "shots_fired"), ("b", "shots_fired"))]
+
+    assert asyncio.run(run()) == [("participant", False), ("participant", False)]
+
+
+def test_result_is_reused_until_cooldown_ends():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        deduper = DispatchDeduper(cooldown=0.05)
+        first = await deduper.run("key", call)
+        during = await deduper.run("key", call)
+        await asyncio.sleep(0.06)
+        after = await deduper.run("key", call)
+        return first, during, after, len(deduper)
+
+    assert asyncio.run(run()) == ((1, False), (1, True), (2, False), 1)
+
+
+def test_failed_call_is_retried_by_the_next_caller():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("SIP trunk unavailable")
+        return "participant"
+
+    async def run():
+        deduper = DispatchDeduper(cooldown=60)
+        with pytest.raises(RuntimeError):
+            await deduper.run("key", call)
+        return await deduper.run("key", call)
+
+    assert asyncio.run(run()) == ("participant", False)
+
+
+class _RecordingEngine(TriggerEngine):
+    def __init__(self) -> None:
+        super().__init__({"shots fired": "shots_fired"})
+        self.published: list[str] = []
+        self.calls: list[str] = []
+
+    async def publish(self, event, transcript, room_name, **kwargs) -> None:
+        self.published.append(event)
+
+    async def dispatch_call(self, transcript, room_name, **kwargs) -> None:
+        self.calls.append(room_name)
+
+
+def test_transcripts_dispatch_only_on_the_local_backend():
+    engine = _RecordingEngine()
+    match = TriggerMatch("shots_fired", "room", "transcript", "shots fired", 0.0)
+    asyncio.run(engine.handle(match))
+    assert engine.calls == []
+    asyncio.run(engine.handle(match, dispatch_sources=LOCAL_DISPATCH_SOURCES))
+    assert engine.calls == ["room"]
+    assert engine.published == ["shots_fired", "shots_fired"]
+
+    stream = TriggerMatch("shots_fired", "room", "video.description", "shots fired", 0.0)
+    asyncio.run(engine.handle(stream))
+    assert engine.calls == ["room", "room"]
+
+
+def test_fuzzy_matches_are_published_without_a_call():
+    engine = _RecordingEngine()
+    match = TriggerMatch("shots_fired", "room", "video.description", "shop fired him", 0.0, fuzzy=True)
+    asyncio.run(engine.handle(match, dispatch_sources=LOCAL_DISPATCH_SOURCES))
+    assert engine.published == ["shots_fired"]
+    assert engine.calls == []
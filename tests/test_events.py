@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+import events
+from engine import CRITICAL_EVENTS, TriggerEngine
+from events import EventDebouncer, EventsClient
+
+PAYLOAD = {
+    "event": "shots_fired",
+    "state": "started",
+    "roomName": "r1",
+    "transcript": "shots fired",
+    "detectedAt": 0,
+}
+
+
+def test_repeats_become_ongoing_then_cleared(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    debouncer = EventDebouncer(window=30, ongoing_interval=60, max_entries=16)
+
+    assert debouncer.observe("r1", "man_down", "man down") == "started"
+    now += 10
+    assert debouncer.observe("r1", "man_down", "still down") is None
+    assert debouncer.suppressed == 1
+    now += 25
+    assert debouncer.observe("r1", "man_down", "man down here") is None
+    now += 26
+    assert debouncer.observe("r1", "man_down", "he is down") == "ongoing"
+    now += 29
+    assert debouncer.expire() == []
+    now += 2
+    assert debouncer.expire() == [("r1", "man_down", "he is down")]
+    assert len(debouncer) == 0
+
+
+def test_event_starts_again_after_window(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    debouncer = EventDebouncer(window=30, ongoing_interval=60, max_entries=16)
+
+    assert debouncer.observe("r1", "shots_fired", "shots fired") == "started"
+    now += 31
+    cleared = []
+    assert debouncer.observe("r1", "shots_fired", "shots fired again", cleared) == "started"
+    # the old entry is cleared before the new one starts, not by the sweeper after it
+    assert cleared == [("r1", "shots_fired", "shots fired")]
+    assert debouncer.expire() == []
+
+
+def test_rooms_and_events_are_debounced_separately():
+    debouncer = EventDebouncer(window=30, ongoing_interval=60, max_entries=16)
+    assert debouncer.observe("r1", "man_down", "man down") == "started"
+    assert debouncer.observe("r2", "man_down", "man down") == "started"
+    assert debouncer.observe("r1", "shots_fired", "shots fired") == "started"
+
+
+def test_disabled_window_reports_every_match():
+    debouncer = EventDebouncer(window=0)
+    assert debouncer.observe("r1", "man_down", "man down") == "started"
+    assert debouncer.observe("r1", "man_down", "man down") == "started"
+
+
+def test_evicted_events_are_cleared():
+    debouncer = EventDebouncer(window=30, ongoing_interval=60, max_entries=2)
+    debouncer.observe("r1", "man_down", "man down")
+    debouncer.observe("r2", "man_down", "man down")
+    debouncer.observe("r3", "shots_fired", "shots fired")
+
+    assert len(debouncer) == 2
+    assert debouncer.expire() == [("r1", "man_down", "man down")]
+    assert debouncer.expire() == []
+
+
+def test_clear_room_includes_evicted_events():
+    debouncer = EventDebouncer(window=30, ongoing_interval=60, max_entries=1)
+    debouncer.observe("r1", "man_down", "man down")
+    debouncer.observe("r1", "shots_fired", "shots fired")
+
+    assert debouncer.clear_room("r1") == [
+        ("r1", "man_down", "man down"),
+        ("r1", "shots_fired", "shots fired"),
+    ]
+    assert debouncer.expire() == []
+
+
+URL = "http://events.test/api/events"
+
+
+def _client(bodies: list, *, status: int = 200, window_ms: float = 50, max_events: int = 16, fail: bool = False):
+    def handle(request: httpx.Request) -> httpx.Response:
+        if fail:
+            raise httpx.ConnectError("refused", request=request)
+        bodies.append(json.loads(request.content))
+        return httpx.Response(status, text="ok")
+
+    return EventsClient(
+        batch_window_ms=window_ms,
+        batch_max_events=max_events,
+        transport=httpx.MockTransport(handle),
+    )
+
+
+def test_batch_is_posted_when_the_window_ends():
+    async def run():
+        bodies = []
+        client = _client(bodies, status=202)
+        started = time.perf_counter()
+        results = await asyncio.gather(*(client.publish(URL, {"n": n}) for n in range(3)))
+        elapsed = time.perf_counter() - started
+        await client.aclose()
+        return bodies, results, elapsed
+
+    bodies, results, elapsed = asyncio.run(run())
+    assert bodies == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+    # one array POST answers every caller
+    assert results == [(202, "ok")] * 3
+    assert elapsed >= 0.04
+
+
+def test_batch_is_posted_when_full():
+    async def run():
+        bodies = []
+        client = _client(bodies, window_ms=60_000, max_events=2)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(client.publish(URL, {"n": n}) for n in range(2))), timeout=5
+        )
+        await client.aclose()
+        return bodies, results
+
+    bodies, results = asyncio.run(run())
+    assert bodies == [[{"n": 0}, {"n": 1}]]
+    assert results == [(200, "ok")] * 2
+
+
+def test_batch_error_reaches_every_caller():
+    async def run():
+        client = _client([], fail=True)
+        results = await asyncio.gather(
+            *(client.publish(URL, {"n": n}) for n in range(3)), return_exceptions=True
+        )
+        await client.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert results[0] is results[1] is results[2]
+
+
+def test_critical_events_skip_the_batch(monkeypatch):
+    bodies = []
+    monkeypatch.setattr(events, "EventsClient", lambda: _client(bodies, window_ms=60_000))
+
+    async def run():
+        events.acquire_events_client()
+        engine = TriggerEngine({"shots fired": "shots_fired"})
+        engine.events_url = URL
+        assert "shots_fired" in CRITICAL_EVENTS
+        batched = asyncio.create_task(engine.post({**PAYLOAD, "event": "weapon_drawn"}))
+        assert await asyncio.wait_for(engine.post(PAYLOAD), timeout=5)
+        posted = list(bodies)
+        batched.cancel()
+        await events.release_events_client()
+        return posted
+
+    # the critical event went out alone while the other one waits for its batch
+    assert asyncio.run(run()) == [PAYLOAD]
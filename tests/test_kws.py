@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from engine import TriggerEngine
+from kws import ProvisionalTracker
+
+
+class _RecordingEngine(TriggerEngine):
+    def __init__(self) -> None:
+        super().__init__({"shots fired": "shots_fired"})
+        self.states: list[str] = []
+        self.published: list[tuple[str, str]] = []
+        self.on("trigger_provisional", lambda match: self.states.append(match.state))
+
+    async def publish(self, event, transcript, room_name, *, state="started", **kwargs) -> None:
+        self.published.append((event, state))
+
+
+def _resolve(engine: TriggerEngine, events: set[str], state: str) -> None:
+    for event in events:
+        asyncio.run(engine.provisional(event, room="r1", state=state))
+
+
+def test_transcript_match_within_the_window_confirms(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    engine = _RecordingEngine()
+    tracker = ProvisionalTracker(timeout=10)
+
+    assert tracker.add("shots_fired")
+    _resolve(engine, {"shots_fired"}, "provisional")
+    # spotted again before the transcript arrives
+    assert not tracker.add("shots_fired")
+    now += 3
+    confirmed = tracker.confirm({"shots_fired", "man_down"})
+    assert confirmed == {"shots_fired": 3.0}
+    _resolve(engine, set(confirmed), "confirmed")
+
+    assert engine.states == ["provisional", "confirmed"]
+    # the transcript match posts the confirmed event itself
+    assert engine.published == [("shots_fired", "provisional")]
+    now += 10
+    assert tracker.expire() == set()
+    assert len(tracker) == 0
+
+
+def test_missing_transcript_match_retracts_after_the_timeout(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    engine = _RecordingEngine()
+    tracker = ProvisionalTracker(timeout=10)
+
+    tracker.add("shots_fired")
+    _resolve(engine, {"shots_fired"}, "provisional")
+    now += 9.5
+    assert tracker.confirm({"man_down"}) == {}
+    assert tracker.expire() == set()
+    now += 0.5
+    retracted = tracker.expire()
+    assert retracted == {"shots_fired"}
+    _resolve(engine, retracted, "retracted")
+
+    assert engine.states == ["provisional", "retracted"]
+    assert engine.published == [("shots_fired", "provisional"), ("shots_fired", "retracted")]
+    assert tracker.confirm({"shots_fired"}) == {}
+
+
+def test_final_transcript_retracts_events_of_its_turn():
+    tracker = ProvisionalTracker(timeout=10)
+    tracker.add("shots_fired", spotted_at=5.0)
+    tracker.add("man_down", spotted_at=8.0)
+    # the turn ended before "man_down" was spotted, so only its own event settles
+    assert tracker.settle({"officer_down"}, turn_ended=6.0) == {"shots_fired"}
+    assert tracker.clear() == {"man_down"}
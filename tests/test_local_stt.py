@@ -0,0 +1,28 @@
+import pytest
+
+import local_stt
+from local_stt import backend_for
+
+
+def test_local_room_patterns_override_the_default(monkeypatch):
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_BACKEND", "realtime")
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_LOCAL_ROOMS", ["site-*", "bodycam-7"])
+    assert backend_for("site-north") == "local"
+    assert backend_for("bodycam-7") == "local"
+    # patterns match the whole name, case-sensitively
+    assert backend_for("bodycam-70") == "realtime"
+    assert backend_for("Site-north") == "realtime"
+
+
+def test_default_backend_applies_to_other_rooms(monkeypatch):
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_BACKEND", "local")
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_LOCAL_ROOMS", [])
+    assert backend_for("bodycam-1") == "local"
+
+
+def test_unknown_default_backend_is_rejected(monkeypatch):
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_BACKEND", "whisper")
+    monkeypatch.setattr(local_stt, "TRANSCRIBE_LOCAL_ROOMS", ["site-*"])
+    assert backend_for("site-north") == "local"
+    with pytest.raises(ValueError, match="whisper"):
+        backend_for("bodycam-1")
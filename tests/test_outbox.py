@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from outbox import Outbox
+
+
+async def _wait_for(condition, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.005)
+
+
+def test_delivers_in_append_order(tmp_path):
+    delivered = []
+
+    async def deliver(payload, _context):
+        delivered.append(payload["seq"])
+        return True
+
+    async def run():
+        outbox = Outbox(tmp_path, deliver, max_in_flight=1)
+        outbox.start()
+        for seq in range(5):
+            outbox.append({"seq": seq})
+        await outbox.aclose()
+
+    asyncio.run(run())
+    assert delivered == [0, 1, 2, 3, 4]
+    assert not list(tmp_path.glob("*.seg"))
+
+
+def test_retries_after_many_failures(tmp_path):
+    attempted_at = []
+
+    async def deliver(_payload, _context):
+        attempted_at.append(time.monotonic())
+        return len(attempted_at) > 2
+
+    async def run():
+        outbox = Outbox(tmp_path, deliver, base_backoff=0.001, max_backoff=0.01)
+        outbox.start()
+        outbox.append({"event": "shots_fired"})
+        # far past the point where 2 ** attempts overflows a float
+        next(iter(outbox._pending.values())).attempts = 5000
+        await _wait_for(lambda: outbox.pending == 0)
+        await outbox.aclose()
+
+    asyncio.run(run())
+    assert len(attempted_at) == 3
+    # each retry still backed off, by at least half of max_backoff
+    assert all(later - earlier >= 0.005 for earlier, later in zip(attempted_at, attempted_at[1:]))
+
+
+def test_close_keeps_undelivered_records_for_recovery(tmp_path):
+    recovered = []
+
+    async def never(_payload, _context):
+        await asyncio.Event().wait()
+
+    async def deliver(payload, context):
+        recovered.append((payload["seq"], context))
+        return True
+
+    async def run():
+        outbox = Outbox(tmp_path, never)
+        outbox.start()
+        for seq in range(3):
+            outbox.append({"seq": seq}, context="trace")
+        async with asyncio.timeout(2):
+            await outbox.aclose(timeout=0.05)
+        assert list(tmp_path.glob("*.seg"))
+
+        outbox = Outbox(tmp_path, deliver)
+        outbox.start()
+        await _wait_for(lambda: outbox.pending == 0)
+        await outbox.aclose()
+
+    asyncio.run(run())
+    assert sorted(recovered) == [(0, None), (1, None), (2, None)]
+    assert not list(tmp_path.glob("*.seg"))
+
+
+def test_close_waits_for_pending_deliveries(tmp_path):
+    delivered = []
+
+    async def deliver(payload, _context):
+        await asyncio.sleep(0.01)
+        delivered.append(payload["seq"])
+        return True
+
+    async def run():
+        outbox = Outbox(tmp_path, deliver, max_in_flight=2)
+        outbox.start()
+        for seq in range(6):
+            outbox.append({"seq": seq})
+        await outbox.aclose(timeout=2)
+
+    asyncio.run(run())
+    assert sorted(delivered) == list(range(6))
+
+
+def test_segments_roll_and_are_deleted_once_delivered(tmp_path):
+    async def deliver(_payload, _context):
+        return True
+
+    async def run():
+        outbox = Outbox(tmp_path, deliver, segment_bytes=256, fsync_interval_ms=1)
+        outbox.start()
+        for seq in range(20):
+            outbox.append({"seq": seq, "text": "x" * 32})
+            await asyncio.sleep(0)
+        await _wait_for(lambda: outbox.pending == 0)
+        # only the active segment is left
+        assert len(list(tmp_path.glob("*.seg"))) == 1
+        await outbox.aclose()
+
+    asyncio.run(run())
+    assert not list(tmp_path.glob("*.seg"))
@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from phrases import PhraseReloader, compile_phrases
+
+
+def test_flat_document_is_versioned_by_its_hash():
+    data = json.dumps({"shots fired": "shots_fired"}).encode()
+    matcher = compile_phrases(data)
+    assert matcher.events("shots fired") == {"shots_fired"}
+    assert len(matcher.version) == 12
+    assert compile_phrases(data).version == matcher.version
+
+
+def test_versioned_document_keeps_its_version():
+    matcher = compile_phrases(b'{"version": "2026-10-14", "phrases": {"gun out": "weapon_drawn"}}')
+    assert matcher.version == "2026-10-14"
+    assert matcher.events("gun out now") == {"weapon_drawn"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b'["shots fired"]',
+        b"{}",
+        b'{"phrases": {}}',
+        b'{"shots fired": ""}',
+        b'{"  ": "shots_fired"}',
+        b'{"shots fired": 1}',
+        b"not json",
+    ],
+)
+def test_invalid_documents_are_rejected(data):
+    with pytest.raises(ValueError):
+        compile_phrases(data)
+
+
+def test_file_is_reloaded_when_it_changes(tmp_path):
+    path = tmp_path / "phrases.json"
+    path.write_text('{"shots fired": "shots_fired"}')
+    reloader = PhraseReloader(str(path), lambda matcher: None)
+    assert reloader.load().events("shots fired") == {"shots_fired"}
+    # same mtime and size: not even read again
+    assert reloader.load() is None
+
+    path.write_text('{"man down": "man_down"}   ')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert reloader.load().events("man down") == {"man_down"}
+    # touched but unchanged content keeps the current matcher
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000))
+    assert reloader.load() is None
+
+
+def test_url_is_reloaded_unless_not_modified():
+    body = b'{"version": "v1", "phrases": {"shots fired": "shots_fired"}}'
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        reloader = PhraseReloader(f"http://127.0.0.1:{server.server_port}/phrases", lambda matcher: None)
+        assert reloader.load().version == "v1"
+        assert reloader.load() is None
+    finally:
+        server.shutdown()
+    assert requests == [None, '"v1"']
+
+
+def test_first_load_runs_on_the_reloader_thread(tmp_path):
+    path = tmp_path / "phrases.json"
+    path.write_text('{"version": "v2", "phrases": {"man down": "man_down"}}')
+    loaded = threading.Event()
+    versions = []
+
+    def on_update(matcher):
+        versions.append(matcher.version)
+        loaded.set()
+
+    reloader = PhraseReloader(str(path), on_update, interval=60)
+    reloader.start()
+    try:
+        assert loaded.wait(5)
+    finally:
+        reloader.stop()
+    assert versions == ["v2"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from prometheus_client import REGISTRY
+
+from pool import PooledRealtimeModel, RealtimeConnectionPool
+
+
+def _cold_connections() -> float:
+    return REGISTRY.get_sample_value("clearance_realtime_connections_total", {"outcome": "cold"}) or 0.0
+
+
+def test_session_waits_for_the_pools_first_dial():
+    async def main():
+        handshakes = 0
+
+        async def handle(request):
+            nonlocal handshakes
+            handshakes += 1
+            await asyncio.sleep(0.2)
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            async for _ in ws:
+                pass
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/v1/realtime", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        cold = _cold_connections()
+        try:
+            async with aiohttp.ClientSession() as http:
+                model = PooledRealtimeModel(
+                    model="gpt-realtime",
+                    modalities=["text"],
+                    api_key="test",
+                    base_url=f"http://127.0.0.1:{port}/v1",
+                    http_session=http,
+                )
+                pool = model.pool = RealtimeConnectionPool(model, size=1)
+                pool.start()
+                await asyncio.sleep(0)
+                # the session starts while the pool is still dialing
+                session = model.session()
+                await asyncio.sleep(1.0)
+                # one dial for the session, one to refill the pool
+                assert handshakes == 2
+                assert len(pool) == 1
+                assert _cold_connections() == cold
+                await session.aclose()
+                await pool.aclose()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
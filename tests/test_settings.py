@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _settings(tmp_path: Path, env_local: str, modules: list[str], expr: str) -> object:
+    """Evaluate `expr` on `modules` after importing agent from a directory holding `env_local`."""
+    (tmp_path / ".env.local").write_text(env_local)
+    keys = {line.split("=", 1)[0] for line in env_local.splitlines()}
+    env = {key: value for key, value in os.environ.items() if key not in keys}
+    env["PYTHONPATH"] = str(ROOT)
+    imports = "".join(f"from {module} import *; " for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-c", f"import json, agent; {imports}print(json.dumps({expr}))"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_env_local_configures_events_client(tmp_path):
+    settings = _settings(
+        tmp_path,
+        "CLEARANCE_API_TIMEOUT=3\nCLEARANCE_API_BATCH_WINDOW_MS=25\n",
+        ["events"],
+        "[EVENTS_HTTP_TIMEOUT, EVENTS_BATCH_WINDOW_MS]",
+    )
+    assert settings == [3.0, 25.0]
+
+
+def test_env_local_configures_engine(tmp_path):
+    settings = _settings(
+        tmp_path,
+        "CLEARANCE_API_BASE_URL=http://events.test\nTRIGGER_FUZZY_MAX_COST=64\n",
+        ["engine"],
+        "[EVENTS_API_BASE_URL, TRIGGER_FUZZY_MAX_COST]",
+    )
+    assert settings == ["http://events.test", 64]
+
+
+def test_env_local_configures_job_modules(tmp_path):
+    settings = _settings(
+        tmp_path,
+        "LIVEKIT_SIP_DISPATCH_COOLDOWN=5\nTEXT_STREAM_MAX_PENDING=3\nVAD_HANGOVER_MS=700\n"
+        "TURN_SILENCE_MAX_MS=900\nREALTIME_POOL_SIZE=2\nTRANSCRIBE_BACKEND=local\n",
+        ["dispatch", "streams", "vad", "turns", "pool", "local_stt"],
+        "[SIP_DISPATCH_COOLDOWN, TEXT_STREAM_MAX_PENDING, VAD_HANGOVER_MS,"
+        " TURN_SILENCE_MAX_MS, REALTIME_POOL_SIZE, TRANSCRIBE_BACKEND]",
+    )
+    assert settings == [5.0, 3, 700.0, 900, 2, "local"]
@@ -0,0 +1,81 @@
+import asyncio
+
+from streams import TextStreamQueue, TextTail
+
+
+def test_tail_keeps_a_phrase_split_across_chunks():
+    chunks = ["unit twelve on scene, ", "we have sho", "ts fi", "red near the park"]
+    tail = TextTail(32)
+    for chunk in chunks:
+        tail.append(chunk)
+    text = "".join(chunks)
+    assert tail.text() == text[-32:]
+    assert "shots fired" in tail.text()
+
+
+def test_tail_trims_whole_and_partial_chunks():
+    tail = TextTail(10)
+    assert not tail
+    for chunk in "abcdefghijklmnopqrstuvwxyz":
+        tail.append(chunk)
+    assert tail.text() == "qrstuvwxyz"
+    tail.append("0123456789ABC")
+    assert tail.text() == "3456789ABC"
+
+
+def test_tail_drops_a_character_cut_in_half():
+    tail = TextTail(5)
+    tail.append("café!")
+    tail.append("x")
+    assert tail.text() == "fé!x"
+    # "é" is two bytes; the cut leaves half of it
+    tail.append("yz")
+    assert tail.text() == "!xyz"
+
+
+def _queue(policy: str, handled: list, dropped: list, release: asyncio.Event) -> TextStreamQueue:
+    async def handle(reader, identity):
+        await release.wait()
+        handled.append(reader)
+
+    async def on_drop(reader, identity):
+        dropped.append(reader)
+
+    return TextStreamQueue(handle, concurrency=1, max_pending=2, policy=policy, on_drop=on_drop)
+
+
+def _run(policy: str, submissions: list[tuple[str, str]]):
+    async def run():
+        handled, dropped = [], []
+        release = asyncio.Event()
+        queue = _queue(policy, handled, dropped, release)
+        for reader, identity in submissions:
+            queue.submit(reader, identity)
+        counts = (queue.queued, queue.coalesced, queue.dropped, queue.pending)
+        release.set()
+        while queue.tasks:
+            await asyncio.gather(*queue.tasks)
+        await asyncio.sleep(0)
+        return handled, dropped, counts
+
+    return asyncio.run(run())
+
+
+def test_drop_oldest_hands_dropped_streams_to_on_drop():
+    handled, dropped, counts = _run(
+        "drop_oldest", [("s1", "cam-1"), ("s2", "cam-1"), ("s3", "cam-2"), ("s4", "cam-1")]
+    )
+    # s1 runs, s2 and s3 fill the queue, s4 pushes out s2
+    assert handled == ["s1", "s3", "s4"]
+    assert dropped == ["s2"]
+    assert counts == (3, 0, 1, 2)
+
+
+def test_coalesce_replaces_a_participants_pending_stream():
+    handled, dropped, counts = _run(
+        "coalesce", [("s1", "cam-1"), ("s2", "cam-1"), ("s3", "cam-2"), ("s4", "cam-1"), ("s5", "cam-3")]
+    )
+    # s4 replaces s2 from the same camera, then s5 pushes out s3
+    assert handled == ["s1", "s4", "s5"]
+    assert dropped == ["s2", "s3"]
+    assert counts == (4, 1, 1, 2)
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+
+from tasks import TaskSupervisor
+
+
+def test_cancel_only_stops_tasks_of_that_kind():
+    async def run():
+        tasks = TaskSupervisor()
+        sweeper = tasks.spawn(asyncio.sleep(60), kind="sweeper")
+        event = tasks.spawn(asyncio.sleep(0.01), kind="event")
+        assert tasks.counts() == {"sweeper": 1, "event": 1}
+        tasks.cancel("sweeper")
+        await asyncio.gather(sweeper, event, return_exceptions=True)
+        return sweeper, event, tasks.in_flight
+
+    sweeper, event, in_flight = asyncio.run(run())
+    assert sweeper.cancelled()
+    assert not event.cancelled()
+    assert in_flight == 0
+
+
+def test_aclose_waits_until_the_deadline_then_cancels():
+    async def run():
+        tasks = TaskSupervisor()
+        quick = tasks.spawn(asyncio.sleep(0.02), kind="event")
+        stuck = tasks.spawn(asyncio.sleep(60), kind="event")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await tasks.aclose(timeout=0.2)
+        elapsed = loop.time() - started
+        late = tasks.spawn(asyncio.sleep(0), kind="event")
+        await asyncio.sleep(0)
+        return quick, stuck, late, elapsed
+
+    quick, stuck, late, elapsed = asyncio.run(run())
+    assert not quick.cancelled()
+    assert stuck.cancelled()
+    assert 0.19 <= elapsed < 1
+    # nothing new starts once the job has closed
+    assert late.cancelled()
+
+
+def test_task_failures_are_logged(caplog):
+    async def fail():
+        raise RuntimeError("post failed")
+
+    async def run():
+        tasks = TaskSupervisor()
+        tasks.spawn(fail(), kind="event")
+        await tasks.aclose(timeout=1)
+
+    with caplog.at_level(logging.ERROR, logger="voice-transcriber"):
+        asyncio.run(run())
+    [record] = caplog.records
+    assert record.getMessage() == "Background event task failed"
+    assert isinstance(record.exc_info[1], RuntimeError)
@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+import events
+from engine import TriggerEngine
+from events import EventsClient
+from tracing import AlertTrace, export_trace, set_span_exporter
+
+URL = "http://events.test/api/events"
+
+
+def _exporter() -> InMemorySpanExporter:
+    exporter = InMemorySpanExporter()
+    set_span_exporter(exporter, batch=False)
+    return exporter
+
+
+def _handle(monkeypatch, status: int) -> None:
+    transport = httpx.MockTransport(lambda request: httpx.Response(status, text="ok"))
+    monkeypatch.setattr(events, "EventsClient", lambda: EventsClient(transport=transport))
+
+    async def run():
+        events.acquire_events_client()
+        engine = TriggerEngine({"man down": "man_down"}, version="v7")
+        engine.events_url = URL
+        received = AlertTrace(source="transcript", room="r1")
+        received.mark("transcribed")
+        trace = received.fork(event="man_down")
+        trace.mark("matched")
+        match = engine.matched(
+            "man_down",
+            room="r1",
+            source="transcript",
+            text="man down",
+            latency=0.0,
+            phrases_version="v7",
+            trace=trace,
+        )
+        await engine.handle(match)
+        await events.release_events_client()
+
+    asyncio.run(run())
+
+
+def test_handled_match_is_exported_with_a_span_per_stage(monkeypatch):
+    exporter = _exporter()
+    _handle(monkeypatch, 200)
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {"clearance.alert", "clearance.matching", "clearance.queue", "clearance.events_api"}
+    root = spans["clearance.alert"]
+    assert root.parent is None
+    assert dict(root.attributes) == {
+        "source": "transcript",
+        "room": "r1",
+        "event": "man_down",
+        "phrases_version": "v7",
+    }
+    for name in ("clearance.matching", "clearance.queue", "clearance.events_api"):
+        assert spans[name].parent.span_id == root.context.span_id
+        assert spans[name].start_time <= spans[name].end_time
+    assert root.status.status_code is not StatusCode.ERROR
+
+
+def test_rejected_post_marks_the_root_span_as_failed(monkeypatch):
+    exporter = _exporter()
+    _handle(monkeypatch, 400)
+
+    [root] = [span for span in exporter.get_finished_spans() if span.name == "clearance.alert"]
+    assert root.status.status_code is StatusCode.ERROR
+    assert root.status.description == "HTTP 400"
+
+
+def test_export_trace_records_an_error():
+    exporter = _exporter()
+    trace = AlertTrace(source="video.description", room="r2")
+    trace.mark("stream_opened")
+    trace.mark("matched")
+    export_trace(trace, error="publish failed")
+
+    [root, child] = sorted(exporter.get_finished_spans(), key=lambda span: span.name)
+    assert root.name == "clearance.alert"
+    assert root.status.status_code is StatusCode.ERROR
+    assert root.status.description == "publish failed"
+    assert child.name == "clearance.matching"
@@ -0,0 +1,170 @@
+from triggers import FuzzyMatcher, StreamingMatcher, TokenMatcher, TranscriptMatcher
+
+PHRASES = {
+    "weapon drawn": "weapon_drawn",
+    "gun drawn": "weapon_drawn",
+    "shots fired": "shots_fired",
+    "man down": "man_down",
+    "officer down": "officer_down",
+    "camera blocked": "camera_blocked",
+}
+
+
+def test_token_matcher_finds_every_phrase_in_one_pass():
+    matcher = TokenMatcher(PHRASES)
+    assert matcher.events("Shots fired, OFFICER DOWN near the gun drawn") == {
+        "shots_fired",
+        "officer_down",
+        "weapon_drawn",
+    }
+    assert matcher.events("all quiet on fifth street") == set()
+
+
+def test_token_matcher_follows_failure_links():
+    # "shots shots fired" needs the automaton to fall back mid-phrase
+    matcher = TokenMatcher({"shots fired": "shots_fired", "shots shots": "double"})
+    assert matcher.events("shots shots fired") == {"shots_fired", "double"}
+    assert matcher.event_names() == {"shots_fired", "double"}
+
+
+def test_streaming_matcher_finds_phrases_split_across_chunks():
+    stream = StreamingMatcher(TokenMatcher(PHRASES))
+    assert stream.feed("we have sho") == set()
+    assert stream.feed("ts fi") == set()
+    # "fired" could still continue in the next chunk
+    assert stream.feed("red") == set()
+    assert stream.flush() == {"shots_fired"}
+
+
+def test_streaming_matcher_reports_each_event_once_until_reset():
+    stream = StreamingMatcher(TokenMatcher(PHRASES))
+    assert stream.feed("man down. ") == {"man_down"}
+    assert stream.feed("man down again. ") == set()
+    stream.reset()
+    assert stream.feed("man down. ") == {"man_down"}
+
+
+def test_transcript_matcher_scans_only_appended_text():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "we have", False) == set()
+    assert matcher.update("s1", "we have an officer down at", False) == {"officer_down"}
+    assert matcher.update("s1", "we have an officer down at fifth", True) == set()
+
+
+def test_transcript_matcher_rescans_revised_turns():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "the weapon", False) == set()
+    assert matcher.update("s1", "a gun drawn now", False) == {"weapon_drawn"}
+
+
+def test_transcript_matcher_keeps_speakers_apart():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "shots", False) == set()
+    assert matcher.update("s2", "fired", False) == set()
+    assert matcher.update("s1", "shots fired now", True) == {"shots_fired"}
+
+
+def test_fuzzy_matcher_tolerates_asr_variants():
+    fuzzy = FuzzyMatcher(TokenMatcher(PHRASES))
+    assert fuzzy.events("shot fired") == {"shots_fired"}
+    assert fuzzy.events("shots fire") == {"shots_fired"}
+    assert fuzzy.events("shuts fired") == {"shots_fired"}
+    assert fuzzy.events("gun drawing") == {"weapon_drawn"}
+    assert fuzzy.events("woman downstairs") == set()
+
+
+def test_fuzzy_matcher_applies_cues():
+    fuzzy = FuzzyMatcher(TokenMatcher(PHRASES))
+    assert fuzzy.events("no shot fired") == set()
+    assert fuzzy.events("shot fired?") == set()
+
+
+def test_fuzzy_cost_cap_falls_back_to_exact_stems():
+    fuzzy = FuzzyMatcher(TokenMatcher(PHRASES), max_cost=20)
+    assert fuzzy.events("shuts fired") == {"shots_fired"}
+    # the filler words spend the budget before the misheard word
+    assert fuzzy.events("the suspect is running away now shuts fired") == set()
+    assert fuzzy.events("the suspect is running away now shot fired") == {"shots_fired"}
+
+
+def test_token_matcher_matches_whole_words_within_a_clause():
+    matcher = TokenMatcher(PHRASES)
+    assert matcher.events("Officer  DOWN!") == {"officer_down"}
+    assert matcher.events("the woman downstairs") == set()
+    assert matcher.events("a gunman down the road") == set()
+    assert matcher.events("shots. Fired") == set()
+    assert matcher.events("shots fired, officer down") == {"shots_fired", "officer_down"}
+    assert matcher.events("shots\nfired") == set()
+    assert matcher.events("camera-blocked") == {"camera_blocked"}
+
+
+def test_interim_match_waits_for_the_next_word():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "we have a man down", False) == set()
+    assert matcher.update("s1", "we have a man downstairs", False) == set()
+    assert matcher.update("s1", "we have a man downstairs now", True) == set()
+
+    assert matcher.update("s1", "we have a man down", False) == set()
+    assert matcher.update("s1", "we have a man down by", False) == {"man_down"}
+    assert matcher.update("s1", "we have a man down by the car", True) == set()
+
+
+def test_interim_match_leaves_the_question_mark_to_the_final():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "shots", False) == set()
+    assert matcher.update("s1", "shots fired", False) == set()
+    assert matcher.update("s1", "shots fired?", True) == set()
+    assert matcher.suppressed == {"shots_fired"}
+
+
+def test_word_by_word_interims_match_like_the_final():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    words = "there are shots fired near the park".split()
+    fired = set()
+    for count in range(1, len(words)):
+        fired |= matcher.update("s1", " ".join(words[:count]), False)
+    assert fired == {"shots_fired"}
+    assert matcher.update("s1", " ".join(words), True) == set()
+
+
+def test_negation_scope_ends_at_connectors_and_negated_nouns():
+    for matcher in (TokenMatcher(PHRASES, context_window=3), FuzzyMatcher(TokenMatcher(PHRASES), context_window=3)):
+        assert matcher.events("there was never an officer down") == set()
+        assert matcher.events("not a single shot fired") == set()
+        assert matcher.events("this is not a drill shots fired") == {"shots_fired"}
+        assert matcher.events("not sure but man down") == {"man_down"}
+        assert matcher.events("no shots fired but officer down") == {"officer_down"}
+        assert matcher.events("not a drill but is the camera blocked") == set()
+
+
+def test_new_turn_does_not_inherit_an_unfinished_turns_events():
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES))
+    assert matcher.update("s1", "shots fired near", False, 1) == {"shots_fired"}
+    # a revision within the turn keeps what already fired
+    assert matcher.update("s1", "shots fired by the", False, 1) == set()
+    # turn 1 never got its final transcript
+    assert matcher.update("s1", "more shots fired over", False, 2) == {"shots_fired"}
+    assert matcher.update("s1", "more shots fired over here", True, 2) == set()
+
+
+def test_fuzzy_only_events_are_marked():
+    stream = StreamingMatcher(TokenMatcher(PHRASES), FuzzyMatcher(TokenMatcher(PHRASES)))
+    assert stream.feed("shop fired him") == set()
+    assert stream.finish("shop fired him") == {"shots_fired"}
+    assert stream.fuzzy_fired == {"shots_fired"}
+
+    matcher = TranscriptMatcher(TokenMatcher(PHRASES), FuzzyMatcher(TokenMatcher(PHRASES)))
+    assert matcher.update("s1", "shots fired and man dawn", True) == {"shots_fired", "man_down"}
+    assert matcher.fuzzy_fired == {"man_down"}
+    assert matcher.update("s1", "all", False) == set()
+    assert matcher.fuzzy_fired == set()
+
+
+def test_fuzzy_pass_uses_the_token_matchers_words():
+    matcher = TokenMatcher(PHRASES)
+    words = matcher.words()
+    tokens = matcher.tokens("Shots FIRED, naïve man")
+    assert [word for _, word in tokens] == ["shots", "fired", ",", "naïve", "man"]
+    assert [words[word_id] for word_id, _ in tokens if word_id >= 0] == ["shots", "fired", "man"]
+    # "shotsé" is one word for both passes, not "shots" and a stray "é"
+    assert FuzzyMatcher(matcher).events("shotsé fired") == matcher.events("shotsé fired") == set()
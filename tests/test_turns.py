@@ -0,0 +1,25 @@
+from turns import TURN_SILENCE_MAX_MS, TurnTuner
+
+
+def _long_pauses(tuner: TurnTuner, pause_ms: float) -> None:
+    for _ in range(20):
+        tuner.observe(True, 200, -60.0)
+        for _ in range(int(pause_ms // 20)):
+            tuner.observe(False, 20, -60.0)
+    tuner.observe(True, 200, -60.0)
+
+
+def test_threshold_follows_the_noise_floor():
+    tuner = TurnTuner()
+    tuner.observe(False, 20, -30.0)
+    assert tuner.target().threshold == 0.65
+
+
+def test_silence_stays_below_the_gate_hangover():
+    tuner = TurnTuner()
+    _long_pauses(tuner, 860)
+    assert tuner.target().silence_duration_ms == min(960, TURN_SILENCE_MAX_MS)
+
+    gated = TurnTuner(hangover_ms=1000)
+    _long_pauses(gated, 860)
+    assert gated.target().silence_duration_ms == 900
@@ -0,0 +1,64 @@
+import numpy as np
+from livekit import rtc
+
+from vad import SpeechGate
+
+RATE = 16000
+FRAME_MS = 20
+SAMPLES = RATE * FRAME_MS // 1000
+
+
+def _frame(samples: np.ndarray) -> rtc.AudioFrame:
+    pcm = np.clip(samples, -32768, 32767).astype(np.int16)
+    return rtc.AudioFrame(pcm.tobytes(), RATE, 1, SAMPLES)
+
+
+def _noise(rng: np.random.Generator, level: float, frames: int) -> list[rtc.AudioFrame]:
+    return [_frame(rng.normal(0, level, SAMPLES)) for _ in range(frames)]
+
+
+def _tone(hz: float, level: float, frames: int, rng: np.random.Generator, noise: float) -> list[rtc.AudioFrame]:
+    t = np.arange(frames * SAMPLES) / RATE
+    wave = level * np.sin(2 * np.pi * hz * t) + rng.normal(0, noise, t.size)
+    return [_frame(chunk) for chunk in wave.reshape(frames, SAMPLES)]
+
+
+def _gate() -> SpeechGate:
+    return SpeechGate(padding_ms=100, hangover_ms=200, margin_db=9, min_speech_ms=40)
+
+
+def test_silence_and_steady_noise_keep_the_gate_closed():
+    rng = np.random.default_rng(1)
+    for frames in (_noise(rng, 3, 100), _noise(rng, 2000, 100)):
+        gate = _gate()
+        assert [gate.push(frame) for frame in frames] == [[]] * len(frames)
+        assert not gate.open
+        # only the padding is held back, the rest was dropped
+        assert gate.bytes_out == 0 and gate.saved == 1.0
+
+
+def test_voice_band_tone_opens_holds_for_the_hangover_and_closes():
+    rng = np.random.default_rng(3)
+    gate = _gate()
+    for frame in _noise(rng, 50, 50):
+        assert gate.push(frame) == []
+
+    tone = _tone(440, 6000, 25, rng, 50)
+    assert gate.push(tone[0]) == []
+    released = gate.push(tone[1])
+    # 40 ms of speech opens the gate and releases the padding in front of it
+    assert gate.open
+    assert len(released) == 100 // FRAME_MS + 2
+    assert released[-2:] == tone[:2]
+    assert gate.onset_delays == [FRAME_MS / 1000]
+    for frame in tone[2:]:
+        assert gate.push(frame) == [frame]
+
+    # every frame of the hangover is forwarded, and the last one closes the gate
+    hangover = _noise(rng, 50, 200 // FRAME_MS)
+    for frame in hangover:
+        assert gate.open
+        assert gate.push(frame) == [frame]
+    assert not gate.open
+    assert gate.push(_noise(rng, 50, 1)[0]) == []
+    assert 0.0 < gate.saved < 1.0
@@ -0,0 +1,97 @@
+import os
+import time
+from typing import Any
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SimpleSpanProcessor,
+    SpanExporter,
+)
+from opentelemetry.trace import Status, StatusCode
+
+# span covering the interval that ends at each stage
+STAGE_SPANS: dict[str, str] = {
+    "turn_ended": "speech",
+    "transcribed": "transcription",
+    "matched": "matching",
+    "sent": "queue",
+    "responded": "events_api",
+}
+
+_provider: TracerProvider | None = None
+_tracer: trace.Tracer | None = None
+
+
+class AlertTrace:
+    """Monotonic timestamps for each pipeline stage of one alert.
+
+    A trace is started where the input arrives, forked once per matched
+    event, and travels with the event until the events API responds; then it
+    is exported as a root span with one child span per stage interval.
+    """
+
+    __slots__ = ("attributes", "stamps")
+
+    def __init__(self, **attributes: Any) -> None:
+        self.attributes: dict[str, Any] = attributes
+        self.stamps: list[tuple[str, int]] = []
+
+    def mark(self, stage: str, at_ns: int | None = None) -> None:
+        self.stamps.append((stage, time.monotonic_ns() if at_ns is None else at_ns))
+
+    def fork(self, **attributes: Any) -> "AlertTrace":
+        forked = AlertTrace(**self.attributes, **attributes)
+        forked.stamps = list(self.stamps)
+        return forked
+
+    def durations_ms(self) -> dict[str, float]:
+        return {
+            stage: (at - prev_at) / 1e6
+            for (_, prev_at), (stage, at) in zip(self.stamps, self.stamps[1:])
+        }
+
+
+def set_span_exporter(exporter: SpanExporter, *, batch: bool = True) -> None:
+    """Export alert spans through `exporter`; use batch=False for in-process test exporters."""
+    global _provider, _tracer
+    if _provider is not None:
+        _provider.shutdown()
+    _provider = TracerProvider(resource=Resource.create({SERVICE_NAME: "clearance-agent"}))
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _provider.add_span_processor(processor)
+    _tracer = _provider.get_tracer("clearance-agent")
+
+
+def export_trace(alert: AlertTrace, *, error: str | None = None) -> None:
+    if _tracer is None or len(alert.stamps) < 2:
+        return
+    # map monotonic stamps onto the wall clock that OpenTelemetry expects
+    offset = time.time_ns() - time.monotonic_ns()
+    first_ns = alert.stamps[0][1] + offset
+    last_ns = alert.stamps[-1][1] + offset
+
+    root = _tracer.start_span(
+        "clearance.alert",
+        start_time=first_ns,
+        attributes={k: v for k, v in alert.attributes.items() if v is not None},
+    )
+    context = trace.set_span_in_context(root)
+    for (_, prev_at), (stage, at) in zip(alert.stamps, alert.stamps[1:]):
+        span = _tracer.start_span(
+            f"clearance.{STAGE_SPANS.get(stage, stage)}",
+            context=context,
+            start_time=prev_at + offset,
+        )
+        span.end(end_time=at + offset)
+    if error is not None:
+        root.set_status(Status(StatusCode.ERROR, error))
+    root.end(end_time=last_ns)
+
+
+if os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+    set_span_exporter(OTLPSpanExporter())
@@ -0,0 +1,668 @@
+from collections import deque
+
+
+# characters that end a clause; a phrase never matches across them
+_BREAKS = frozenset(".,!?;:\n")
+
+# a match is suppressed when one of these words is among the few words
+# before it in the same clause ("no shots fired") ...
+NEGATION_CUES = frozenset(
+    {
+        "no", "not", "never", "none", "nobody", "nothing", "neither", "nor",
+        "zero", "without", "negative", "cannot",
+        "isn't", "aren't", "wasn't", "weren't", "don't", "doesn't", "didn't",
+        "haven't", "hasn't", "hadn't", "ain't", "can't", "won't",
+    }
+)
+# ... when the clause opens with one of these within the window ("is the
+# camera blocked"), or when a "?" directly follows the phrase
+QUESTION_OPENERS = frozenset(
+    {
+        "is", "are", "was", "were", "did", "do", "does", "has", "have", "had",
+        "can", "could", "would", "will", "any", "anyone", "anybody",
+        "who", "what", "where", "why", "how",
+    }
+)
+# a negation only reaches past the noun phrase it negates: after a
+# negation and one of these, the next word that is not a phrase word ends
+# its scope ("not a drill, shots fired" without the comma)
+NEGATED_DETERMINERS = frozenset({"a", "an", "the", "one", "single", "this", "that"})
+# words that start a new clause for cues ("not sure but man down")
+CLAUSE_CONNECTORS = frozenset({"but", "though", "although", "however", "because"})
+# words before a phrase that are checked for cues
+CUE_WINDOW = 3
+
+# longest suffix first; a stem keeps at least three characters, and a
+# trailing "n" is only dropped from participles like "drawn" or "thrown"
+_SUFFIXES = ("ing", "ed", "es", "s", "wn")
+# tokens shorter than this on both sides only match exactly
+_FUZZY_MIN_LEN = 4
+# shorter phonetic keys ("st" for "shot") collide with too many words
+_PHONETIC_MIN_LEN = 3
+_FUZZY_MAX_LEN = 20
+_PHONETIC = str.maketrans("bcdfgjkpqstvxz", "pkttkkkpkttfks", "aeiouhwy")
+
+
+def _stem(token: str) -> str:
+    if token.endswith("'s"):
+        token = token[:-2]
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-1] if suffix == "wn" else token[: -len(suffix)]
+    return token
+
+
+def _phonetic(stem: str) -> str:
+    """First letter plus the consonant skeleton, with similar sounds merged."""
+    rest = stem[1:].replace("ph", "f").replace("ce", "s").replace("ci", "s").replace("cy", "s")
+    key = [stem[0]]
+    for ch in rest.translate(_PHONETIC):
+        if ch != key[-1]:
+            key.append(ch)
+    return "".join(key)
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if `a` and `b` differ by at most one edit or one transposition."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        if i >= len(a) - 1 or a[i + 1 :] == b[i + 1 :]:
+            return True
+        return a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2 :] == b[i + 2 :]
+    return a[i:] == b[i + 1 :]
+
+
+class FuzzyMatcher:
+    """Tolerant phrase matching over word stems.
+
+    Text is split into words by the `TokenMatcher` the fuzzy pass belongs
+    to, so both passes agree on word boundaries, and its phrase and cue
+    words come with their stem and candidates precomputed by word id. Each
+    other word of the text is reduced to a stem ("fired" -> "fir", "drawing"
+    -> "draw") and looked up among the phrase words exactly, within one edit
+    through a deletion index, and by a phonetic key. Candidate words advance
+    a trie of phrases word by word, so the work per word is a handful of
+    dict lookups regardless of the number of phrases. Every lookup counts
+    against `max_cost`; once a text exhausts it, the rest of the text is
+    matched on exact stems only. Negation and question cues suppress matches
+    the same way as in `TokenMatcher`.
+    """
+
+    def __init__(
+        self,
+        matcher: "TokenMatcher",
+        *,
+        max_cost: int = 4096,
+        context_window: int = CUE_WINDOW,
+    ) -> None:
+        self.matcher = matcher
+        self.max_cost = max_cost
+        self.context_window = context_window
+        self._vocab: dict[str, int] = {}
+        self._deletions: dict[str, set[int]] = {}
+        self._sounds: dict[str, set[int]] = {}
+        self._children: list[dict[int, int]] = [{}]
+        self._out: list[tuple[str, ...]] = [()]
+
+        for phrase, event in matcher.phrases.items():
+            node = 0
+            for word in _split_words(phrase.lower()):
+                word_id = self._add_word(_stem(word))
+                nxt = self._children[node].get(word_id)
+                if nxt is None:
+                    nxt = self._children[node][word_id] = len(self._children)
+                    self._children.append({})
+                    self._out.append(())
+                node = nxt
+            if node and event not in self._out[node]:
+                self._out[node] += (event,)
+
+        self._stems = {word_id: stem for stem, word_id in self._vocab.items()}
+        # (stem, candidates, cost) per word id of the tokenizer
+        self._known: list[tuple[str, set[int], int]] = []
+        for word in matcher.words():
+            stem = _stem(word)
+            self._known.append((stem, *self._candidates(stem, max_cost)))
+
+    def _add_word(self, stem: str) -> int:
+        word_id = self._vocab.get(stem)
+        if word_id is not None:
+            return word_id
+        word_id = self._vocab[stem] = len(self._vocab)
+        if len(stem) <= _FUZZY_MAX_LEN:
+            self._deletions.setdefault(stem, set()).add(word_id)
+            for i in range(len(stem)):
+                self._deletions.setdefault(stem[:i] + stem[i + 1 :], set()).add(word_id)
+            sound = _phonetic(stem)
+            if len(stem) >= _FUZZY_MIN_LEN and len(sound) >= _PHONETIC_MIN_LEN:
+                self._sounds.setdefault(sound, set()).add(word_id)
+        return word_id
+
+    def _candidates(self, stem: str, budget: int) -> tuple[set[int], int]:
+        """Phrase words that `stem` may stand for, and the lookups spent."""
+        exact = self._vocab.get(stem)
+        found = {exact} if exact is not None else set()
+        if budget <= 0 or len(stem) > _FUZZY_MAX_LEN:
+            return found, 1
+        cost = 1
+        keys = [stem] + [stem[:i] + stem[i + 1 :] for i in range(len(stem))]
+        for key in keys:
+            cost += 1
+            for word_id in self._deletions.get(key, ()):
+                other = self._stems[word_id]
+                if (
+                    word_id not in found
+                    and max(len(stem), len(other)) >= _FUZZY_MIN_LEN
+                    and _within_one_edit(stem, other)
+                ):
+                    found.add(word_id)
+        if len(stem) >= _FUZZY_MIN_LEN:
+            cost += 1
+            sound = _phonetic(stem)
+            if len(sound) >= _PHONETIC_MIN_LEN:
+                found.update(self._sounds.get(sound, ()))
+        return found, cost
+
+    def _suppressed(self, words: list[str], clause: int, start: int, end: int) -> bool:
+        window = self.context_window
+        if not window:
+            return False
+        if end + 1 < len(words) and words[end + 1] == "?":
+            return True
+        first = max(clause, start - window)
+        for index in range(first, start):
+            if words[index] in NEGATION_CUES and not self._scope_ends(words, index, start):
+                return True
+        return clause < start and clause >= start - window and words[clause] in QUESTION_OPENERS
+
+    def _scope_ends(self, words: list[str], negation: int, start: int) -> bool:
+        """True if the negation at `negation` ends before the phrase at `start`."""
+        index = negation + 1
+        while index < start and words[index] in NEGATED_DETERMINERS:
+            index += 1
+        return negation + 1 < index < start and _stem(words[index]) not in self._vocab
+
+    def events(self, text: str) -> set[str]:
+        found: set[str] = set()
+        budget = self.max_cost
+        children = self._children
+        out = self._out
+        known = self._known
+        tokens = self.matcher.tokens(text)
+        words = [word for _, word in tokens]
+        clause = 0
+        # (trie node, index of the phrase's first word)
+        active: list[tuple[int, int]] = []
+        for index, (word_id, word) in enumerate(tokens):
+            if word in _BREAKS:
+                active = []
+                clause = index + 1
+                continue
+            if self.context_window and word in CLAUSE_CONNECTORS:
+                clause = index + 1
+            if word_id >= 0 and budget > 0:
+                _, candidates, cost = known[word_id]
+            else:
+                stem = known[word_id][0] if word_id >= 0 else _stem(word)
+                candidates, cost = self._candidates(stem, budget)
+            budget -= cost
+            if not candidates:
+                active = []
+                continue
+            nxt: list[tuple[int, int]] = []
+            for node, start in ((0, index), *active):
+                for word_id in candidates:
+                    child = children[node].get(word_id)
+                    if child is not None:
+                        nxt.append((child, start))
+                        if out[child] and not self._suppressed(words, clause, start, index):
+                            found.update(out[child])
+            active = nxt
+        return found
+
+
+# word id of a token that is not a phrase word
+_UNKNOWN = -1
+# cue bits kept per word in the scan history
+_NEGATION = 1
+_OPENER = 2
+_CUE_BITS = _NEGATION | _OPENER
+# word classes that end a negation's scope, not kept in the history
+_DETERMINER = 4
+_CONNECTOR = 8
+_HISTORY_WORDS = 16
+_HISTORY_MASK = (1 << 2 * _HISTORY_WORDS) - 1
+_NEGATION_HISTORY = _HISTORY_MASK // 3
+# negation scope: none, right after a negation cue, or after its determiner
+_SCOPE_NONE = 0
+_SCOPE_NEGATION = 1
+_SCOPE_DETERMINER = 2
+# (pending word node, automaton state, cue history, words in clause, negation scope)
+ScanPosition = tuple[int, int, int, int, int]
+START: ScanPosition = (0, 0, 0, 0, 0)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "'"
+
+
+def _before_last_word(text: str) -> str:
+    """`text` up to the start of its last word."""
+    end = len(text)
+    while end and not _is_word_char(text[end - 1]):
+        end -= 1
+    while end and _is_word_char(text[end - 1]):
+        end -= 1
+    return text[:end]
+
+
+def _split_words(text: str) -> list[str]:
+    words: list[str] = []
+    start = None
+    for i, ch in enumerate(text):
+        if _is_word_char(ch):
+            if start is None:
+                start = i
+        elif start is not None:
+            words.append(text[start:i])
+            start = None
+    if start is not None:
+        words.append(text[start:])
+    return words
+
+
+class TokenMatcher:
+    """Word-level Aho-Corasick automaton over a phrase -> event map.
+
+    Phrases match whole words only, so "man down" is not found in "woman
+    downstairs", and never across clause punctuation. Text is tokenized in
+    the same pass that matches it: characters walk a trie of the phrase
+    words whose edges carry both cases, so no lowercase copy of the text is
+    made, and a word ends up as a word id (or unknown) that drives the
+    automaton. `version` identifies the phrase set it was compiled from.
+
+    Negation and question cues are tracked in the same pass as a bit history
+    of the last words of the clause. A match is suppressed when a negation
+    cue is within `context_window` words before the phrase, when the clause
+    opens with a question word within that window, or when a "?" directly
+    follows the phrase; `context_window=0` turns suppression off. Connectors
+    like "but" start a new clause for cues, and a negation followed by a
+    determiner only covers the next noun unless that starts a phrase, so
+    "not a drill shots fired" fires but "not a man down" does not.
+    """
+
+    def __init__(
+        self,
+        phrases: dict[str, str],
+        *,
+        version: str = "",
+        context_window: int = CUE_WINDOW,
+    ) -> None:
+        self.phrases = phrases
+        self.version = version
+        self.context_window = context_window
+        # character trie of phrase and cue words; node 0 is the root
+        self._chars: list[dict[str, int]] = [{}]
+        self._word_ids: list[int] = [_UNKNOWN]
+        self._words: dict[str, int] = {}
+        self._names: list[str] = []
+        self._goto: list[dict[int, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[str, ...]] = [()]
+        self._depth: list[int] = [0]
+
+        for phrase, event in phrases.items():
+            state = 0
+            for word in _split_words(phrase.lower()):
+                word_id = self._add_word(word)
+                nxt = self._goto[state].get(word_id)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][word_id] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    self._depth.append(self._depth[state] + 1)
+                state = nxt
+            if state and event not in self._out[state]:
+                self._out[state] += (event,)
+
+        # cue bits per word id; cue words get ids but no automaton edges
+        cue_words = (
+            (NEGATION_CUES, _NEGATION),
+            (QUESTION_OPENERS, _OPENER),
+            (NEGATED_DETERMINERS, _DETERMINER),
+            (CLAUSE_CONNECTORS, _CONNECTOR),
+        )
+        if context_window:
+            for words, _ in cue_words:
+                for cue in words:
+                    self._add_word(cue)
+        self._cues = [0] * len(self._words)
+        if context_window:
+            for words, bit in cue_words:
+                for cue in words:
+                    self._cues[self._words[cue]] |= bit
+        # history bits of the window of words before each state's phrase
+        window = (1 << 2 * context_window) - 1
+        self._windows = [(window << 2 * depth) & _HISTORY_MASK for depth in self._depth]
+
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word_id, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and word_id not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(word_id, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                inherited = [e for e in self._out[self._fail[nxt]] if e not in self._out[nxt]]
+                if inherited:
+                    self._out[nxt] += tuple(inherited)
+
+    def _add_word(self, word: str) -> int:
+        word_id = self._words.get(word)
+        if word_id is not None:
+            return word_id
+        word_id = self._words[word] = len(self._words)
+        self._names.append(word)
+        node = 0
+        for ch in word:
+            nxt = self._chars[node].get(ch)
+            if nxt is None:
+                nxt = len(self._chars)
+                self._chars.append({})
+                self._word_ids.append(_UNKNOWN)
+                for variant in {ch, ch.upper()}:
+                    if len(variant) == 1:
+                        self._chars[node][variant] = nxt
+            node = nxt
+        self._word_ids[node] = word_id
+        return word_id
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def event_names(self) -> set[str]:
+        return {event for events in self._out for event in events}
+
+    def words(self) -> list[str]:
+        """Phrase and cue words, indexed by word id."""
+        return self._names
+
+    def tokens(self, text: str) -> list[tuple[int, str]]:
+        """Words and clause punctuation of `text` as (word id, lowercase token).
+
+        Words are split and identified by the same character trie as in
+        `scan`; only words that are not phrase or cue words are lowercased.
+        Punctuation and unknown words have the unknown word id.
+        """
+        tokens: list[tuple[int, str]] = []
+        chars = self._chars
+        word_ids = self._word_ids
+        names = self._names
+        word = start = 0
+        for i, ch in enumerate(text):
+            if word >= 0:
+                nxt = chars[word].get(ch)
+                if nxt is not None:
+                    if not word:
+                        start = i
+                    word = nxt
+                    continue
+            if ch.isalnum() or ch == "'":
+                if not word:
+                    start = i
+                word = -1
+                continue
+            if word:
+                word_id = word_ids[word] if word > 0 else _UNKNOWN
+                tokens.append((word_id, names[word_id] if word_id >= 0 else text[start:i].lower()))
+                word = 0
+            if ch in _BREAKS:
+                tokens.append((_UNKNOWN, ch))
+        if word:
+            word_id = word_ids[word] if word > 0 else _UNKNOWN
+            tokens.append((word_id, names[word_id] if word_id >= 0 else text[start:].lower()))
+        return tokens
+
+    def step(self, state: int, word_id: int) -> int:
+        if word_id == _UNKNOWN:
+            return 0
+        goto = self._goto
+        while True:
+            nxt = goto[state].get(word_id)
+            if nxt is not None:
+                return nxt
+            if state == 0:
+                return 0
+            state = self._fail[state]
+
+    def scan(
+        self,
+        text: str,
+        position: ScanPosition,
+        found: set[str],
+        suppressed: set[str] | None = None,
+    ) -> ScanPosition:
+        """Advance over `text` from `position`, adding events to `found`.
+
+        Suppressed matches go to `suppressed` instead. A word at the end of
+        `text` stays pending in the returned position.
+        """
+        word, state, history, clause, scope = position
+        chars = self._chars
+        word_ids = self._word_ids
+        cues = self._cues
+        out = self._out
+        for ch in text:
+            if word >= 0:
+                nxt = chars[word].get(ch)
+                if nxt is not None:
+                    word = nxt
+                    continue
+            if ch.isalnum() or ch == "'":
+                word = -1
+                continue
+            if word:
+                word_id = word_ids[word] if word > 0 else _UNKNOWN
+                state = self.step(state, word_id)
+                cue = cues[word_id] if word_id >= 0 else 0
+                if cue or scope:
+                    history, clause, scope = self._push(cue, state, history, clause, scope)
+                else:
+                    history = (history << 2) & _HISTORY_MASK
+                    clause += 1
+                if out[state]:
+                    self._emit(state, history, ch == "?", found, suppressed)
+                word = 0
+            if ch in _BREAKS:
+                state = history = clause = scope = 0
+        return word, state, history, clause, scope
+
+    def end_word(
+        self,
+        position: ScanPosition,
+        found: set[str],
+        suppressed: set[str] | None = None,
+    ) -> ScanPosition:
+        """Complete the pending word of `position`."""
+        word, state, history, clause, scope = position
+        if not word:
+            return position
+        word_id = self._word_ids[word] if word > 0 else _UNKNOWN
+        state = self.step(state, word_id)
+        cue = self._cues[word_id] if word_id >= 0 else 0
+        history, clause, scope = self._push(cue, state, history, clause, scope)
+        if self._out[state]:
+            self._emit(state, history, False, found, suppressed)
+        return 0, state, history, clause, scope
+
+    @staticmethod
+    def _push(cue: int, state: int, history: int, clause: int, scope: int) -> tuple[int, int, int]:
+        """Cue history, clause length and negation scope after a word with `cue`."""
+        if cue & _CONNECTOR:
+            return 0, 0, _SCOPE_NONE
+        if cue & _NEGATION:
+            scope = _SCOPE_NEGATION
+        elif cue & _DETERMINER and scope:
+            scope = _SCOPE_DETERMINER
+        else:
+            if scope == _SCOPE_DETERMINER and state == 0:
+                # the negated noun phrase is over ("not a drill")
+                history &= ~_NEGATION_HISTORY
+            scope = _SCOPE_NONE
+        if clause:
+            cue &= _NEGATION
+        return ((history << 2) | (cue & _CUE_BITS)) & _HISTORY_MASK, clause + 1, scope
+
+    def _emit(
+        self,
+        state: int,
+        history: int,
+        question: bool,
+        found: set[str],
+        suppressed: set[str] | None,
+    ) -> None:
+        if self.context_window and (question or history & self._windows[state]):
+            if suppressed is not None:
+                suppressed.update(self._out[state])
+        else:
+            found.update(self._out[state])
+
+    def events(self, text: str) -> set[str]:
+        found: set[str] = set()
+        self.end_word(self.scan(text, START, found), found)
+        return found
+
+
+class StreamingMatcher:
+    """Runs a `TokenMatcher` over text that arrives in pieces.
+
+    Tokenizer and automaton state are carried across `feed()` calls, so a
+    word or phrase split between two chunks is still found; a word at the
+    end of a chunk is only matched once the next chunk shows it is complete,
+    or on `flush()`. Each event is reported at most once until `reset()`,
+    and events whose matches were all suppressed by cues collect in
+    `suppressed`. With a `fuzzy` matcher, `finish()` also runs a tolerant
+    pass over the complete text for events the exact pass missed; those
+    collect in `fuzzy_fired`.
+    """
+
+    def __init__(self, matcher: TokenMatcher, fuzzy: FuzzyMatcher | None = None) -> None:
+        self._matcher = matcher
+        self._fuzzy = fuzzy
+        self._position = START
+        self.fired: set[str] = set()
+        self.suppressed: set[str] = set()
+        self.fuzzy_fired: set[str] = set()
+
+    @property
+    def matcher(self) -> TokenMatcher:
+        return self._matcher
+
+    def _new(self, found: set[str]) -> set[str]:
+        found -= self.fired
+        self.fired |= found
+        return found
+
+    def feed(self, chunk: str) -> set[str]:
+        found: set[str] = set()
+        self._position = self._matcher.scan(chunk, self._position, found, self.suppressed)
+        return self._new(found)
+
+    def flush(self) -> set[str]:
+        found: set[str] = set()
+        self._position = self._matcher.end_word(self._position, found, self.suppressed)
+        return self._new(found)
+
+    def finish(self, text: str) -> set[str]:
+        found = self.flush()
+        if self._fuzzy is not None:
+            # the exact pass already decided on the phrases it suppressed
+            fuzzy = self._new(self._fuzzy.events(text) - self.suppressed)
+            self.fuzzy_fired |= fuzzy
+            found |= fuzzy
+        return found
+
+    def restart(self) -> None:
+        """Forget the tokenizer and automaton position but keep the events already fired."""
+        self._position = START
+
+    def reset(self) -> None:
+        self.restart()
+        self.fired.clear()
+        self.suppressed.clear()
+        self.fuzzy_fired.clear()
+
+
+class TranscriptMatcher:
+    """Per-speaker streaming matcher for interim and final transcripts.
+
+    Interim transcripts are cumulative for the current turn, so only the text
+    appended since the previous update is scanned. The last word of an
+    interim transcript may still grow ("man down" -> "man downstairs") or
+    be followed by a "?", so interims are only scanned up to the start of
+    their last word: a phrase fires from an interim once a later word
+    confirms where it ends, and otherwise from the final transcript, which
+    only reports events that were not already fired.
+
+    With a `fuzzy` matcher the final transcript also gets a tolerant pass.
+    Assigning `matcher` and `fuzzy` takes effect for turns that start
+    afterwards; turns in progress finish on the matchers they started with,
+    and `version` is the version of the matcher used by the last `update()`.
+    `suppressed` holds the events of a finished turn that only matched with
+    negation or question cues, and `fuzzy_fired` those only the tolerant
+    pass found.
+
+    `turn` identifies the speaker's turn. An update for another turn starts
+    from scratch, so a turn that never got its final transcript does not
+    hold back the same events in the next one; within a turn, events fired
+    from interims are kept through revisions and the final.
+    """
+
+    def __init__(self, matcher: TokenMatcher, fuzzy: FuzzyMatcher | None = None) -> None:
+        self.matcher = matcher
+        self.fuzzy = fuzzy
+        self.version = matcher.version
+        self.suppressed: set[str] = set()
+        self.fuzzy_fired: set[str] = set()
+        self._turns: dict[str | None, tuple[StreamingMatcher, str, int | None]] = {}
+
+    def update(
+        self,
+        speaker_id: str | None,
+        text: str,
+        is_final: bool,
+        turn: int | None = None,
+    ) -> set[str]:
+        current = self._turns.get(speaker_id)
+        if current is None or current[2] != turn:
+            current = (StreamingMatcher(self.matcher, self.fuzzy), "", turn)
+        stream, consumed, _ = current
+        self.version = stream.matcher.version
+        if not is_final:
+            text = _before_last_word(text)
+        if text.startswith(consumed):
+            matched = stream.feed(text[len(consumed) :])
+        else:
+            # the recognizer revised earlier words, rescan the whole turn
+            stream.restart()
+            matched = stream.feed(text)
+
+        if is_final:
+            matched |= stream.finish(text)
+            self.suppressed = stream.suppressed - stream.fired
+            self.fuzzy_fired = stream.fuzzy_fired
+            self._turns.pop(speaker_id, None)
+        else:
+            self.fuzzy_fired = set()
+            self._turns[speaker_id] = (stream, text, turn)
+        return matched
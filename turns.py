@@ -0,0 +1,169 @@
+"""Per-room tuning of the realtime model's server VAD.
+
+A fixed `TurnDetection` is a compromise: in loud street scenes the server
+VAD hears speech in the noise and turns never close, and in quiet rooms
+500 ms of trailing silence is latency every alert pays. `TurnTuner`
+watches one room's audio through the speech gate's classifier and the
+session's turns, and derives:
+
+- `threshold` from the room's noise floor, raised further while turns run
+  longer than `TURN_MAX_SECONDS`;
+- `silence_duration_ms` from the pauses inside the room's speech, so a
+  turn closes after a silence longer than most of them.
+
+Both stay within the configured bounds, and small changes are not pushed.
+Behind the speech gate the silence also stays below `VAD_HANGOVER_MS`, the
+longest silence the gate forwards. Tuning is off unless `TURN_ADAPTIVE=1`.
+"""
+
+import logging
+import os
+import statistics
+from collections import deque
+from dataclasses import dataclass
+
+from openai.types.beta.realtime.session import TurnDetection
+
+logger = logging.getLogger("voice-transcriber")
+
+TURN_ADAPTIVE = os.getenv("TURN_ADAPTIVE", "0") == "1"
+TURN_THRESHOLD = float(os.getenv("TURN_THRESHOLD", "0.5"))
+TURN_THRESHOLD_MIN = float(os.getenv("TURN_THRESHOLD_MIN", "0.4"))
+TURN_THRESHOLD_MAX = float(os.getenv("TURN_THRESHOLD_MAX", "0.8"))
+TURN_PREFIX_PADDING_MS = int(os.getenv("TURN_PREFIX_PADDING_MS", "300"))
+TURN_SILENCE_MS = int(os.getenv("TURN_SILENCE_MS", "500"))
+TURN_SILENCE_MIN_MS = int(os.getenv("TURN_SILENCE_MIN_MS", "250"))
+TURN_SILENCE_MAX_MS = int(os.getenv("TURN_SILENCE_MAX_MS", "1200"))
+# seconds between adaptations
+TURN_ADAPT_INTERVAL = float(os.getenv("TURN_ADAPT_INTERVAL", "15"))
+# a turn longer than this is taken as one the server VAD failed to close
+TURN_MAX_SECONDS = float(os.getenv("TURN_MAX_SECONDS", "20"))
+
+# voice band noise floor at which the base threshold applies, and the
+# threshold added per 10 dB above it
+_QUIET_FLOOR_DB = -60.0
+_THRESHOLD_PER_10DB = 0.05
+# added while turns run over TURN_MAX_SECONDS, and given back otherwise
+_LONG_TURN_STEP = 0.05
+_LONG_TURN_DECAY = 0.01
+# silence kept on top of the 90th percentile pause
+_PAUSE_MARGIN_MS = 100
+# shorter gaps are the classifier flickering between syllables, not pauses
+_MIN_PAUSE_MS = 150
+# pauses needed before silence_duration_ms is derived from them
+_MIN_PAUSES = 8
+# silence kept below the speech gate's hangover, so the gate still
+# forwards the silence that ends a turn
+_HANGOVER_MARGIN_MS = 100
+# changes smaller than these are not pushed to the session
+_THRESHOLD_STEP = 0.05
+_SILENCE_STEP_MS = 50
+
+
+@dataclass(frozen=True, slots=True)
+class TurnSettings:
+    threshold: float = TURN_THRESHOLD
+    silence_duration_ms: int = TURN_SILENCE_MS
+
+    def turn_detection(self) -> TurnDetection:
+        return TurnDetection(
+            type="server_vad",
+            threshold=self.threshold,
+            prefix_padding_ms=TURN_PREFIX_PADDING_MS,
+            silence_duration_ms=self.silence_duration_ms,
+            create_response=True,
+            interrupt_response=False,
+        )
+
+
+class TurnTuner:
+    """Derives server VAD settings for one room from its audio and turns.
+
+    Feed it every audio frame's speech decision with `observe()`, user
+    turn lengths with `turn()` and final transcript delays with
+    `time_to_final()`; `adapt()` returns new settings when they moved by
+    more than a step, or None. With `hangover_ms`, the speech gate's
+    hangover when gating is on, the silence stays below it.
+    """
+
+    def __init__(
+        self,
+        settings: TurnSettings | None = None,
+        *,
+        history: int = 200,
+        hangover_ms: float | None = None,
+    ) -> None:
+        self.settings = settings or TurnSettings()
+        self._silence_max_ms = TURN_SILENCE_MAX_MS
+        if hangover_ms is not None:
+            self._silence_max_ms = min(self._silence_max_ms, int(hangover_ms) - _HANGOVER_MARGIN_MS)
+        self.noise_floor_db: float | None = None
+        self._pauses: deque[float] = deque(maxlen=history)
+        self._turns: deque[float] = deque(maxlen=history)
+        self._to_final: deque[float] = deque(maxlen=history)
+        self._long_turns = 0
+        self._long_offset = 0.0
+        self._in_speech = False
+        self._pause_ms = 0.0
+
+    def observe(self, speech: bool, duration_ms: float, noise_floor_db: float | None) -> None:
+        self.noise_floor_db = noise_floor_db
+        if speech:
+            # a pause short enough to be inside a turn
+            if self._in_speech and _MIN_PAUSE_MS <= self._pause_ms <= self._silence_max_ms:
+                self._pauses.append(self._pause_ms)
+            self._in_speech = True
+            self._pause_ms = 0.0
+        elif self._in_speech:
+            self._pause_ms += duration_ms
+            if self._pause_ms > self._silence_max_ms:
+                self._in_speech = False
+
+    def turn(self, seconds: float) -> None:
+        self._turns.append(seconds)
+        if seconds > TURN_MAX_SECONDS:
+            self._long_turns += 1
+
+    def time_to_final(self, seconds: float) -> None:
+        self._to_final.append(seconds)
+
+    def stats(self) -> dict[str, float | int | None]:
+        pauses = sorted(self._pauses)
+        return {
+            "noise_floor_db": self.noise_floor_db,
+            "pause_p90_ms": pauses[int(len(pauses) * 0.9)] if pauses else None,
+            "turns": len(self._turns),
+            "turn_p50_s": statistics.median(self._turns) if self._turns else None,
+            "time_to_final_p50_s": statistics.median(self._to_final) if self._to_final else None,
+        }
+
+    def target(self) -> TurnSettings:
+        """Settings for the room as observed so far, before hysteresis."""
+        if self._long_turns:
+            self._long_offset += _LONG_TURN_STEP
+            self._long_turns = 0
+        else:
+            self._long_offset = max(0.0, self._long_offset - _LONG_TURN_DECAY)
+
+        threshold = TURN_THRESHOLD + self._long_offset
+        if self.noise_floor_db is not None:
+            threshold += _THRESHOLD_PER_10DB * (self.noise_floor_db - _QUIET_FLOOR_DB) / 10
+        threshold = min(max(threshold, TURN_THRESHOLD_MIN), TURN_THRESHOLD_MAX)
+
+        silence = self.settings.silence_duration_ms
+        if len(self._pauses) >= _MIN_PAUSES:
+            pauses = sorted(self._pauses)
+            silence = int(pauses[int(len(pauses) * 0.9)] + _PAUSE_MARGIN_MS)
+        silence = min(max(silence, TURN_SILENCE_MIN_MS), self._silence_max_ms)
+        return TurnSettings(round(threshold, 2), silence)
+
+    def adapt(self) -> TurnSettings | None:
+        target = self.target()
+        current = self.settings
+        if (
+            abs(target.threshold - current.threshold) < _THRESHOLD_STEP
+            and abs(target.silence_duration_ms - current.silence_duration_ms) < _SILENCE_STEP_MS
+        ):
+            return None
+        self.settings = target
+        return target
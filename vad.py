@@ -0,0 +1,197 @@
+"""Client-side speech gate in front of the realtime model.
+
+Body-cam rooms are mostly silence or street noise, and every frame of it is
+streamed to the realtime model. `SpeechGate` classifies each frame from its
+energy in the voice band against a running noise floor of that band, so
+traffic rumble and hiss outside it do not open the gate, and only lets
+speech through, plus `VAD_PADDING_MS` of audio
+before it and `VAD_HANGOVER_MS` after it. The hangover has to be longer
+than the server VAD's `silence_duration_ms`, otherwise the model never
+hears the silence that ends a turn.
+
+`GatedAudioInput` applies a gate to the session's audio input; it is off
+unless `VAD_GATE=1`. With `passthrough=True` it only classifies frames, for
+callers that need the speech decisions but not the gating.
+"""
+
+import logging
+import math
+import os
+from collections import deque
+from collections.abc import Callable
+
+import numpy as np
+from livekit import rtc
+from livekit.agents.voice import io
+
+import metrics
+
+logger = logging.getLogger("voice-transcriber")
+
+VAD_GATE = os.getenv("VAD_GATE", "0") == "1"
+# audio forwarded before the first speech frame, like prefix_padding_ms
+VAD_PADDING_MS = float(os.getenv("VAD_PADDING_MS", "300"))
+# audio forwarded after the last speech frame
+VAD_HANGOVER_MS = float(os.getenv("VAD_HANGOVER_MS", "1000"))
+# dB above the noise floor a frame needs to count as speech
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "9"))
+# speech the gate needs before it opens
+VAD_MIN_SPEECH_MS = float(os.getenv("VAD_MIN_SPEECH_MS", "40"))
+
+# frequencies whose energy decides whether a frame is speech
+_VOICE_BAND = (250.0, 3500.0)
+# noise floor tracking: falls quickly, rises slowly, and barely moves
+# during speech so a long loud scene still raises it
+_FLOOR_FALL = 0.3
+_FLOOR_RISE = 0.02
+_FLOOR_RISE_SPEECH = 0.001
+_SILENCE_DB = -90.0
+
+
+class SpeechGate:
+    """Energy and voice-band speech detector with padding for one audio input.
+
+    `push()` takes frames in arrival order and returns the frames to
+    forward. While the gate is closed the last `padding_ms` of audio is
+    held back and released in front of the first speech frames, so the
+    model still hears the start of the turn; the held audio is what the
+    gate adds to detection latency, and `onset_delays` records it per turn.
+    """
+
+    def __init__(
+        self,
+        *,
+        padding_ms: float = VAD_PADDING_MS,
+        hangover_ms: float = VAD_HANGOVER_MS,
+        margin_db: float = VAD_MARGIN_DB,
+        min_speech_ms: float = VAD_MIN_SPEECH_MS,
+    ) -> None:
+        self._padding_ms = padding_ms
+        self._hangover_ms = hangover_ms
+        self._margin_db = margin_db
+        self._min_speech_ms = min_speech_ms
+        self.open = False
+        # classification of the last frame
+        self.speech = False
+        self.noise_floor_db: float | None = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # seconds from the first speech frame to the gate opening, per turn
+        self.onset_delays: list[float] = []
+        self._held: deque[tuple[rtc.AudioFrame, float]] = deque()
+        self._held_ms = 0.0
+        self._speech_ms = 0.0
+        self._silence_ms = 0.0
+        # (samples, sample rate) -> voice band mask of the rfft bins
+        self._bands: dict[tuple[int, int], np.ndarray] = {}
+
+    @property
+    def saved(self) -> float:
+        """Share of the input bytes that were not forwarded."""
+        return 1.0 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0
+
+    def level(self, frame: rtc.AudioFrame) -> float:
+        """Voice band level of `frame` in dBFS."""
+        samples = np.frombuffer(frame.data, dtype=np.int16).astype(np.float32)
+        if frame.num_channels > 1:
+            samples = samples.reshape(-1, frame.num_channels).mean(axis=1)
+        if not samples.size:
+            return _SILENCE_DB
+        power = np.abs(np.fft.rfft(samples / 32768.0)) ** 2
+        key = (samples.size, frame.sample_rate)
+        band = self._bands.get(key)
+        if band is None:
+            freqs = np.fft.rfftfreq(samples.size, 1.0 / frame.sample_rate)
+            band = self._bands[key] = (freqs >= _VOICE_BAND[0]) & (freqs <= _VOICE_BAND[1])
+        # Parseval: mean square of the band-limited signal
+        energy = 2.0 * float(power[band].sum()) / samples.size**2
+        return max(10.0 * math.log10(energy), _SILENCE_DB) if energy > 0.0 else _SILENCE_DB
+
+    def is_speech(self, frame: rtc.AudioFrame) -> bool:
+        db = self.level(frame)
+        floor = self.noise_floor_db
+        if floor is None:
+            self.noise_floor_db = db
+            return False
+        speech = db >= floor + self._margin_db
+        if db < floor:
+            rate = _FLOOR_FALL
+        else:
+            rate = _FLOOR_RISE_SPEECH if speech else _FLOOR_RISE
+        self.noise_floor_db = floor + rate * (db - floor)
+        self.speech = speech
+        return speech
+
+    def push(self, frame: rtc.AudioFrame) -> list[rtc.AudioFrame]:
+        duration_ms = frame.samples_per_channel * 1000 / frame.sample_rate
+        size = frame.data.nbytes
+        self.bytes_in += size
+        speech = self.is_speech(frame)
+
+        if self.open:
+            self._silence_ms = 0.0 if speech else self._silence_ms + duration_ms
+            if self._silence_ms >= self._hangover_ms:
+                self.open = False
+                self._speech_ms = 0.0
+            metrics.AUDIO_BYTES_FORWARDED.inc(size)
+            self.bytes_out += size
+            return [frame]
+
+        self._held.append((frame, duration_ms))
+        self._held_ms += duration_ms
+        self._speech_ms = self._speech_ms + duration_ms if speech else 0.0
+        if self._speech_ms >= self._min_speech_ms:
+            self.open = True
+            self._silence_ms = 0.0
+            # the first speech frame arrived this long before the gate opened
+            delay = (self._speech_ms - duration_ms) / 1000
+            self.onset_delays.append(delay)
+            metrics.VAD_ONSET_DELAY.observe(delay)
+            frames = [held for held, _ in self._held]
+            released = sum(held.data.nbytes for held in frames)
+            self._held.clear()
+            self._held_ms = 0.0
+            metrics.AUDIO_BYTES_FORWARDED.inc(released)
+            self.bytes_out += released
+            return frames
+
+        # keep the padding plus the speech seen so far
+        keep_ms = self._padding_ms + self._speech_ms
+        while self._held and self._held_ms - self._held[0][1] >= keep_ms:
+            dropped, dropped_ms = self._held.popleft()
+            self._held_ms -= dropped_ms
+            metrics.AUDIO_BYTES_DROPPED.inc(dropped.data.nbytes)
+        return []
+
+
+class GatedAudioInput(io.AudioInput):
+    """Session audio input that only yields the frames its gate lets through.
+
+    `on_frame` is called with the gate after every input frame is classified.
+    """
+
+    def __init__(
+        self,
+        source: io.AudioInput,
+        gate: SpeechGate | None = None,
+        *,
+        passthrough: bool = False,
+        on_frame: Callable[[SpeechGate, float], None] | None = None,
+    ) -> None:
+        super().__init__(label="SpeechGate", source=source)
+        self.gate = gate or SpeechGate()
+        self._passthrough = passthrough
+        self._on_frame = on_frame
+        self._ready: deque[rtc.AudioFrame] = deque()
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        while not self._ready:
+            frame = await super().__anext__()
+            if self._passthrough:
+                self.gate.is_speech(frame)
+                self._ready.append(frame)
+            else:
+                self._ready.extend(self.gate.push(frame))
+            if self._on_frame is not None:
+                self._on_frame(self.gate, frame.samples_per_channel * 1000 / frame.sample_rate)
+        return self._ready.popleft()